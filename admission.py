@@ -0,0 +1,137 @@
+"""Admission control for the webhook server.
+
+Every request passes a few cheap checks before any handler work, and a
+request that fails one is answered right away with 413 or 429 and never
+queued:
+
+- a token bucket per source address
+- a body size limit per route, from Content-Length, or enforced while
+  reading a chunked body
+- a cap on requests in flight.  Read traffic only gets `read_share` of
+  it and is also shed while the event loop lags, so priority routes (VP
+  spends) keep headroom when checks pile up
+- a token bucket per GrowID on routes that act on one (link codes, spends)
+- a cap on open long-lived connections (change streams, sockets)
+
+Bodies are read here, inside the concurrency slot, and handlers get them
+from aiohttp's cache, so a slow upload counts against the cap too.
+"""
+import math
+
+from aiohttp import web
+
+from growids import fold
+from ratelimit import BucketTable
+from runtime import loads
+
+
+class Admission:
+    def __init__(self, source_rate, max_inflight, max_body, body_limits=None, growid_rates=None,
+                 priority=(), read_share=0.75, overloaded=None, trusted=(), trust_proxy=False,
+                 max_connections=256):
+        self.sources = BucketTable(*source_rate)  # source address -> bucket
+        self.max_inflight = max_inflight
+        self.read_limit = max(1, int(max_inflight * read_share))
+        self.max_body = max_body
+        self.body_limits = body_limits or {}  # path -> bytes, overrides max_body
+        self.growids = {path: BucketTable(*rate) for path, rate in (growid_rates or {}).items()}
+        self.priority = frozenset(priority)
+        self.overloaded = overloaded  # optional callable, True sheds read traffic
+        self.trusted = frozenset(trusted)  # sources exempt from the per-source bucket
+        self.trust_proxy = trust_proxy  # client address from the proxy's X-Forwarded-For entry
+        self.max_connections = max_connections
+        self.inflight = 0
+        self.connections = 0  # open long-lived connections
+        self.rejected = dict.fromkeys(('source', 'growid', 'body', 'busy', 'connections'), 0)
+
+    def source(self, request):
+        if self.trust_proxy:
+            forwarded = request.headers.get('X-Forwarded-For')
+            if forwarded:
+                # The last entry is the one our proxy appended, earlier ones are client supplied
+                return forwarded.rpartition(',')[2].strip()
+        return request.remote
+
+    def reject(self, reason, status, error, retry_after=None):
+        self.rejected[reason] += 1
+        headers = {'Retry-After': str(max(1, math.ceil(retry_after)))} if retry_after else None
+        return web.json_response({'success': False, 'error': error}, status=status, headers=headers)
+
+    def take_growid(self, path, growid):
+        """Seconds `growid` must wait before using `path` again, 0 if it may now.
+        Shared with the socket channel, so both routes draw on one bucket.
+        """
+        growids = self.growids.get(path)
+        if growids is None:
+            return 0
+        wait = growids.take(fold(growid))
+        if wait:
+            self.rejected['growid'] += 1
+        return wait
+
+    def middleware(self, exempt=(), untracked=()):
+        """Paths in `exempt` skip every check (health checks, metrics).
+        Paths in `untracked` are long-lived, they are rate limited when they
+        connect and hold one of `max_connections` slots instead of an
+        in-flight slot until they close.
+        """
+        @web.middleware
+        async def admit(request, handler):
+            path = request.path
+            if path in exempt:
+                return await handler(request)
+
+            source = self.source(request)
+            if source not in self.trusted:
+                wait = self.sources.take(source)
+                if wait:
+                    return self.reject('source', 429, 'Rate limited', wait)
+
+            limit = self.body_limits.get(path, self.max_body)
+            length = request.content_length
+            if length is not None and length > limit:
+                return self.reject('body', 413, 'Request body too large')
+            if path in untracked:
+                if self.connections >= self.max_connections:
+                    return self.reject('connections', 429, 'Too many connections', 1)
+                self.connections += 1
+                try:
+                    return await handler(request)
+                finally:
+                    self.connections -= 1
+
+            priority = path in self.priority
+            if self.inflight >= (self.max_inflight if priority else self.read_limit) or (
+                    not priority and self.overloaded is not None and self.overloaded()):
+                return self.reject('busy', 429, 'Server busy', 1)
+
+            self.inflight += 1
+            try:
+                if request.body_exists:
+                    if length is None:
+                        request = request.clone(client_max_size=limit)  # chunked, cap while reading
+                    try:
+                        body = await request.read()
+                    except web.HTTPRequestEntityTooLarge:
+                        return self.reject('body', 413, 'Request body too large')
+
+                    growids = self.growids.get(path)
+                    if growids is not None:
+                        wait = growids.take(growid_of(body))
+                        if wait:
+                            return self.reject('growid', 429, 'Rate limited', wait)
+
+                return await handler(request)
+            finally:
+                self.inflight -= 1
+
+        return admit
+
+
+def growid_of(body):
+    """Folded `growid` of a JSON body, None if there isn't one"""
+    try:
+        data = loads(body)
+    except ValueError:
+        return None
+    return fold(data.get('growid')) if isinstance(data, dict) else None
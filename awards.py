@@ -0,0 +1,241 @@
+"""Voice sessions and VP accrual.
+
+Join/leave/move events are recorded with monotonic timestamps and fold
+into one Session per user.  Credit is never counted per tick: a session
+owes `floor((now - anchor) / interval)` periods, and settling it advances
+`anchor` by exactly that many intervals, so loop jitter can't leak time.
+Sessions are settled lazily when a balance is read, or in bulk by a coarse
+flush that pops due sessions from a min-heap.
+
+A session can be paused while its member isn't eligible (muted, deafened,
+alone in the channel): the unpaid part of the current period is banked and
+the session drops out of the heap until it resumes.  `Eligibility` caches
+what decides that from voice events, so ticks never look at Discord state.
+"""
+import heapq
+import math
+from collections import deque
+
+EVENT_HISTORY = 10_000
+
+
+class Session:
+    __slots__ = ('channel_id', 'joined', 'anchor', 'due', 'eligible', 'banked')
+
+    def __init__(self, channel_id, now, interval):
+        self.channel_id = channel_id
+        self.joined = now  # monotonic join time
+        self.anchor = now  # start of the first unpaid period
+        self.due = now + interval
+        self.eligible = True  # False while paused
+        self.banked = 0.0  # unpaid seconds of the current period while paused
+
+
+class SessionTracker:
+    def __init__(self, interval):
+        self.interval = interval
+        self.sessions = {}  # discord_id -> Session
+        self.events = deque(maxlen=EVENT_HISTORY)  # (monotonic ts, kind, discord_id, channel_id)
+        self._heap = []  # (due, discord_id), stale entries skipped lazily
+        self.paused = 0
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __contains__(self, discord_id):
+        return discord_id in self.sessions
+
+    # ============= EVENTS =============
+    def join(self, discord_id, channel_id, now):
+        """Start a session, or record a move if one is already running"""
+        session = self.sessions.get(discord_id)
+        if session is not None:
+            if session.channel_id != channel_id:
+                self.events.append((now, 'move', discord_id, channel_id))
+                session.channel_id = channel_id
+            return session
+
+        self.events.append((now, 'join', discord_id, channel_id))
+        session = self.sessions[discord_id] = Session(channel_id, now, self.interval)
+        heapq.heappush(self._heap, (session.due, discord_id))
+        return session
+
+    def leave(self, discord_id, now):
+        """End a session, returns unpaid whole periods it still owed"""
+        session = self.sessions.pop(discord_id, None)
+        if session is None:
+            return 0
+        self.events.append((now, 'leave', discord_id, session.channel_id))
+        if not session.eligible:
+            self.paused -= 1
+            return 0
+        return int((now - session.anchor) // self.interval)
+
+    def set_eligible(self, discord_id, eligible, now):
+        """Pause or resume accrual, returns whole periods owed when pausing"""
+        session = self.sessions.get(discord_id)
+        if session is None or session.eligible == eligible:
+            return 0
+        session.eligible = eligible
+        if eligible:
+            self.paused -= 1
+            self.events.append((now, 'resume', discord_id, session.channel_id))
+            session.anchor = now - session.banked
+            session.banked = 0.0
+            self._reschedule(discord_id, session)
+            return 0
+
+        self.paused += 1
+        self.events.append((now, 'pause', discord_id, session.channel_id))
+        periods = int((now - session.anchor) // self.interval)
+        session.anchor += periods * self.interval
+        session.banked = now - session.anchor
+        session.due = math.inf  # its heap entries are stale now
+        return periods
+
+    def reconcile(self, present, now):
+        """Match sessions to {discord_id: channel_id} actually in voice
+
+        Used after (re)connecting, when voice updates may have been missed.
+        Returns (started, ended) where ended maps discord_id -> owed periods.
+        """
+        ended = {}
+        for discord_id in [d for d in self.sessions if d not in present]:
+            ended[discord_id] = self.leave(discord_id, now)
+        started = [d for d in present if d not in self.sessions]
+        for discord_id, channel_id in present.items():
+            self.join(discord_id, channel_id, now)
+        return started, ended
+
+    # ============= ACCRUAL =============
+    def accrued(self, discord_id, now):
+        """Whole periods owed right now, without settling them"""
+        session = self.sessions.get(discord_id)
+        if session is None or not session.eligible:
+            return 0
+        return int((now - session.anchor) // self.interval)
+
+    def settle(self, discord_id, now):
+        """Claim the periods owed so far, returns how many"""
+        session = self.sessions.get(discord_id)
+        if session is None or not session.eligible:
+            return 0
+        periods = int((now - session.anchor) // self.interval)
+        if periods:
+            session.anchor += periods * self.interval
+            self._reschedule(discord_id, session)
+        return periods
+
+    def pop_due(self, now):
+        """Settle every session that owes at least one period
+
+        Returns [(discord_id, periods)].
+        """
+        heap = self._heap
+        sessions = self.sessions
+        settled = []
+
+        while heap and heap[0][0] <= now:
+            due, discord_id = heapq.heappop(heap)
+            session = sessions.get(discord_id)
+            if session is None or session.due != due:
+                continue  # left, rejoined, paused or settled since this entry was pushed
+
+            # due <= now means at least one period, even if float rounding disagrees
+            periods = max(1, int((now - session.anchor) // self.interval))
+            session.anchor += periods * self.interval
+            settled.append((discord_id, periods))
+            self._reschedule(discord_id, session)
+
+        return settled
+
+    # ============= HANDOFF =============
+    def export(self, now):
+        """{discord_id: (channel_id, unpaid seconds)} for the next process"""
+        return {
+            discord_id: (session.channel_id, now - session.anchor if session.eligible else session.banked)
+            for discord_id, session in self.sessions.items()
+        }
+
+    def restore(self, state, now):
+        """Resume exported sessions, downtime isn't counted"""
+        for discord_id, (channel_id, unpaid) in state.items():
+            session = self.join(discord_id, channel_id, now)
+            session.anchor = now - unpaid
+            self._reschedule(discord_id, session)
+
+    def _reschedule(self, discord_id, session):
+        session.due = session.anchor + self.interval
+        heapq.heappush(self._heap, (session.due, discord_id))
+
+
+class Eligibility:
+    """Who may accrue: their own voice flags, and company in the channel
+
+    Kept up to date from voice events.  `update()` and `remove()` return
+    (discord_id, eligible) for every member whose eligibility may have
+    changed, including everyone in a channel that just gained or lost
+    enough company.
+    """
+
+    def __init__(self, min_humans=2):
+        self.min_humans = min_humans
+        self._channels = {}  # channel_id -> {discord_id: own flags allow accrual}
+        self._where = {}  # discord_id -> channel_id
+
+    def __len__(self):
+        return len(self._where)
+
+    def eligible(self, discord_id):
+        channel_id = self._where.get(discord_id)
+        if channel_id is None:
+            return False
+        members = self._channels[channel_id]
+        return members[discord_id] and len(members) >= self.min_humans
+
+    def update(self, discord_id, channel_id, active):
+        """Record a member's channel and whether their flags allow accrual"""
+        changed = []
+        if self._where.get(discord_id, channel_id) != channel_id:
+            changed = self.remove(discord_id)
+
+        members = self._channels.setdefault(channel_id, {})
+        company = discord_id not in members and len(members) + 1 == self.min_humans
+        members[discord_id] = active
+        self._where[discord_id] = channel_id
+        if company:
+            changed.extend((d, self.eligible(d)) for d in members)
+        else:
+            changed.append((discord_id, self.eligible(discord_id)))
+        return changed
+
+    def remove(self, discord_id):
+        channel_id = self._where.pop(discord_id, None)
+        if channel_id is None:
+            return []
+        members = self._channels[channel_id]
+        del members[discord_id]
+        if not members:
+            del self._channels[channel_id]
+        elif len(members) == self.min_humans - 1:
+            return [(d, False) for d in members]
+        return []
+
+    def clear(self):
+        self._channels.clear()
+        self._where.clear()
+
+
+def voice_active(state):
+    """Voice flags that allow accrual: not muted, deafened, suppressed or AFK"""
+    return not (state.self_deaf or state.self_mute or state.afk or state.suppress)
+
+
+class VoiceState:
+    """Per-user voice flags outside of VP sessions"""
+
+    __slots__ = ('gems_active', 'multiplier')
+
+    def __init__(self):
+        self.gems_active = False
+        self.multiplier = 1.0  # channel and role gems multiplier, events stack on at lookup
@@ -0,0 +1,111 @@
+"""Legitimate webhook latency while another source floods the server.
+
+A flooder process hammers /webhook/link with fresh GrowIDs from one
+address while a well behaved game server polls /webhook/vp/check from
+another.  Runs once with admission control and once with the per-source
+limit lifted, and reports the game server's latency and what the flood
+got through.  Addresses come from X-Forwarded-For, as behind a proxy.
+
+    python benchmarks/bench_admission.py [seconds]
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+import harness
+os.environ['TRUST_PROXY'] = '1'
+os.environ['TRUSTED_SOURCES'] = ''
+
+from aiohttp import ClientSession
+from aiohttp.test_utils import TestServer
+
+import discord_bot
+from ratelimit import BucketTable
+
+FLOOD_CONCURRENCY = 64
+
+
+def flood(url, seconds, counts):
+    async def run():
+        deadline = time.perf_counter() + seconds
+        headers = {'X-Forwarded-For': '203.0.113.66'}
+
+        async def worker(n):
+            i = 0
+            async with ClientSession() as session:
+                while time.perf_counter() < deadline:
+                    i += 1
+                    body = {'growid': f'Spam{n}x{i}', 'code': f'{n:02X}{i % 0x10000:04X}'}
+                    try:
+                        async with session.post(url, json=body, headers=headers) as resp:
+                            await resp.read()
+                            counts[resp.status] = counts.get(resp.status, 0) + 1
+                    except Exception:
+                        counts[0] = counts.get(0, 0) + 1
+
+        await asyncio.gather(*(worker(n) for n in range(FLOOD_CONCURRENCY)))
+
+    asyncio.run(run())
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def measure(seconds, limited):
+    discord_bot.admission.sources = BucketTable(*(discord_bot.SOURCE_RATE if limited else (10**9, 1.0)))
+    server = TestServer(discord_bot.create_webhook_app(), port=0)
+    await server.start_server()
+
+    manager = multiprocessing.Manager()
+    counts = manager.dict()
+    flooder = multiprocessing.Process(target=flood, args=(str(server.make_url('/webhook/link')), seconds, counts))
+    flooder.start()
+    await asyncio.sleep(0.5)
+
+    latencies = []
+    headers = {'X-Forwarded-For': '198.51.100.7'}
+    url = server.make_url('/webhook/vp/check')
+    async with ClientSession() as session:
+        deadline = time.perf_counter() + seconds - 1
+        i = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            async with session.post(url, json={'growid': f'Player{i % 1000}'}, headers=headers) as resp:
+                await resp.json()
+                assert resp.status == 200, resp.status
+            latencies.append(time.perf_counter() - started)
+            i += 1
+            await asyncio.sleep(0.005)
+
+    await asyncio.to_thread(flooder.join)
+    await server.close()
+    flood_counts = dict(counts)
+    manager.shutdown()
+
+    label = 'admission on ' if limited else 'admission off'
+    print(f"{label}  game p50 {percentile(latencies, 0.5) * 1e3:7.2f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1e3:7.2f} ms  "
+          f"max {max(latencies) * 1e3:7.2f} ms   flood statuses {flood_counts}   "
+          f"pending codes {len(discord_bot.pending_links)}")
+
+
+async def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 6
+    ledger = await harness.start(players=1000)
+    discord_bot.loop_lag.start()
+
+    await measure(seconds, limited=False)
+    discord_bot.pending_links = discord_bot.ExpiringStore(
+        discord_bot.LINK_CODE_TTL, discord_bot.MAX_CODES_PER_GROWID, discord_bot.MAX_PENDING_CODES)
+    await measure(seconds, limited=True)
+
+    await discord_bot.loop_lag.stop()
+    await ledger.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
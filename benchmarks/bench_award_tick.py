@@ -0,0 +1,98 @@
+"""Award tick cost at 10k simulated voice members.
+
+Compares the old per-tick channel scan over in-memory dicts with the
+SessionTracker flushing due sessions from its heap in one batched ledger
+update.
+
+    python benchmarks/bench_award_tick.py [members]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from awards import SessionTracker
+from ledger import Ledger
+
+VP_AMOUNT = 10
+VP_INTERVAL = 180
+TICKS = 200
+
+
+def make_ledger(data_dir, members):
+    ledger = Ledger(data_dir)
+    ledger.load()
+    for i in range(members):
+        ledger.link(10**17 + i, f'Grow{i}')
+    return ledger
+
+
+def bench_scan(members):
+    """Old vp_task: walk every channel member on every tick"""
+    ids = [10**17 + i for i in range(members)]
+    base = datetime.now()
+    accounts = {str(m): {'growid': f'Grow{m}', 'total_vp': 0, 'last_vp_time': None} for m in ids}
+    # Stagger joins over one interval so every tick has some due users
+    voice = {str(m): {'vp_start': base - timedelta(seconds=i % VP_INTERVAL)}
+             for i, m in enumerate(ids)}
+
+    samples = []
+    for tick in range(TICKS):
+        now = base + timedelta(seconds=tick)
+        started = time.perf_counter()
+        for member_id in ids:
+            discord_id = str(member_id)
+            if discord_id not in accounts:
+                continue
+            start_time = voice[discord_id]['vp_start']
+            if (now - start_time).total_seconds() >= VP_INTERVAL:
+                account = accounts[discord_id]
+                account['total_vp'] += VP_AMOUNT
+                account['last_vp_time'] = now
+                voice[discord_id]['vp_start'] = now
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def bench_sessions(ledger, members):
+    """New vp_task: pop due sessions from the heap, credit in one batch"""
+    tracker = SessionTracker(VP_INTERVAL)
+    base = 1000.0
+    for i in range(members):
+        tracker.join(10**17 + i, 1, base - (i % VP_INTERVAL))
+
+    samples = []
+    for tick in range(TICKS):
+        started = time.perf_counter()
+        settled = tracker.pop_due(base + tick)
+        if settled:
+            ledger.award_many([discord_id for discord_id, _ in settled], VP_AMOUNT)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    mean = sum(samples) / len(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{name:<12} mean {mean * 1000:8.3f} ms   p99 {p99 * 1000:8.3f} ms")
+
+
+async def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    print(f"{members} members, {TICKS} ticks, interval {VP_INTERVAL}s\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report('scan', bench_scan(members))
+
+        ledger = make_ledger(os.path.join(tmp, 'heap'), members)
+        report('heap+batch', bench_sessions(ledger, members))
+        await ledger.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
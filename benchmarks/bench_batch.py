@@ -0,0 +1,81 @@
+"""Throughput of N single check requests versus one batch request.
+
+    python benchmarks/bench_batch.py [players]
+"""
+import asyncio
+import sys
+import time
+
+import harness
+
+from aiohttp import ClientSession, TCPConnector
+from aiohttp.test_utils import TestServer
+
+import discord_bot
+
+CONCURRENCY = 32
+
+
+async def singles(session, url, payloads):
+    queue = list(payloads)
+
+    async def worker():
+        while queue:
+            async with session.post(url, json=queue.pop()) as resp:
+                await resp.read()
+
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+
+
+async def batch(session, url, body, stream=False):
+    params = {'stream': '1'} if stream else None
+    async with session.post(url, json=body, params=params) as resp:
+        await resp.read()
+
+
+async def timed(label, players, coro):
+    started = time.perf_counter()
+    await coro
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms  {players / elapsed:12,.0f} lookups/s")
+
+
+async def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    ledger = harness.setup()
+    growids = [f'Player{i}' for i in range(players)]
+    # Half the world is linked, a quarter of those are boosting
+    for i, growid in enumerate(growids[::2]):
+        discord_id = harness.BASE_ID + i
+        ledger.link(discord_id, growid)
+        if i % 4 == 0:
+            voice = discord_bot.user_voice_data[discord_id] = discord_bot.VoiceState()
+            voice.gems_active = True
+            voice.multiplier = discord_bot.GEMS_MULTIPLIER
+
+    server = TestServer(discord_bot.create_webhook_app())
+    await server.start_server()
+    vp_url = str(server.make_url('/webhook/vp/check'))
+    gems_url = str(server.make_url('/webhook/gems/check'))
+
+    print(f"{players} players, {CONCURRENCY} concurrent single requests\n")
+    async with ClientSession(connector=TCPConnector(limit=CONCURRENCY)) as session:
+        await timed('vp/check x N', players,
+                    singles(session, vp_url, [{'growid': g} for g in growids]))
+        await timed('vp/check/batch', players,
+                    batch(session, vp_url + '/batch', {'growids': growids}))
+        await timed('vp/check/batch (ndjson)', players,
+                    batch(session, vp_url + '/batch', {'growids': growids}, stream=True))
+        await timed('gems/check x N', players,
+                    singles(session, gems_url, [{'growid': g, 'amount': 100} for g in growids]))
+        await timed('gems/check/batch', players,
+                    batch(session, gems_url + '/batch', {'growids': growids, 'amount': 100}))
+        await timed('gems/check/batch (ndjson)', players,
+                    batch(session, gems_url + '/batch', {'growids': growids, 'amount': 100}, stream=True))
+
+    await server.close()
+    await ledger.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""/profile, /rewards and /help embeds: built per call versus cached.
+
+Simulates a spike of users spamming the commands and times building and
+serializing the embed (what discord.py does before sending), plus the old
+"Earning VP" check that scanned the voice channel's member list.
+
+    python benchmarks/bench_embeds.py [calls] [users] [members in voice]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='vpbot-bench-')
+
+import discord_bot
+from ledger import Account
+
+
+class Avatar:
+    url = 'https://cdn.discordapp.com/embed/avatars/0.png'
+
+
+class User:
+    display_avatar = Avatar
+
+    def __init__(self, discord_id):
+        self.id = discord_id
+        self.mention = f'<@{discord_id}>'
+
+
+def uncached_profile(user, account, members):
+    """Rebuild the profile embed and scan the channel members like before"""
+    earning = any(member.id == user.id for member in members)
+    embed = discord_bot.discord.Embed(title="📊 Your Profile", description=f"Stats for {user.mention}")
+    embed.set_thumbnail(url=user.display_avatar.url)
+    embed.add_field(name="GrowID", value=f"`{account.growid}`", inline=False)
+    embed.add_field(name="Total VP", value=f"**{account.total_vp:,} VP**", inline=True)
+    embed.add_field(name="Linked Since", value=f"<t:{int(account.linked_at)}:R>", inline=True)
+    embed.add_field(name="VP Status", value="✅ Earning VP" if earning else "❌ Not in channel", inline=True)
+    embed.add_field(name="Gems Boost", value="❌ Not active", inline=True)
+    embed.set_footer(text="Use VP with /vp command in-game")
+    return embed
+
+
+def timed(name, calls, fn):
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(i).to_dict()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<22} {calls / elapsed:12,.0f} calls/s   {elapsed / calls * 1e6:8.2f} µs/call")
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    in_voice = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+
+    people = [User(10**17 + i) for i in range(users)]
+    accounts = [Account(f'Player{i}', i * 10, time.time(), time.time()) for i in range(users)]
+    members = [User(2 * 10**17 + i) for i in range(in_voice)] + people[::2]
+    for member in members:
+        discord_bot.sessions.join(member.id, 1, time.monotonic())
+
+    print(f"{calls:,} calls from {users} users, {len(members):,} members in voice\n")
+    timed('profile rebuilt', calls, lambda i: uncached_profile(people[i % users], accounts[i % users], members))
+    timed('profile cached', calls, lambda i: discord_bot.profile_embed(people[i % users], accounts[i % users]))
+    timed('rewards rebuilt', calls, lambda i: discord_bot.build_rewards_embed())
+    timed('rewards cached', calls, lambda i: discord_bot.static_embed(discord_bot.build_rewards_embed))
+
+
+if __name__ == '__main__':
+    main()
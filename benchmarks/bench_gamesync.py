@@ -0,0 +1,89 @@
+"""Game API write-back against the mock API, with failures and a restart.
+
+Records balance changes for N GrowIDs while the mock fails a share of
+requests, stops the worker halfway (as on SIGTERM), starts a new one on the
+same outbox, then checks that the mock's summed deltas and balances match
+what was recorded exactly.  Reports record cost, push throughput and how
+many connections the pooled session opened.
+
+    python benchmarks/bench_gamesync.py [changes] [growids] [fail rate]
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from aiohttp.test_utils import TestServer
+
+from gamesync import GameSync
+from mock_game_api import MockGameApi
+
+
+async def record(sync, rng, growids, expected, balances, changes):
+    started = time.perf_counter()
+    for i in range(changes):
+        growid = rng.choice(growids)
+        delta = 10 if rng.random() < 0.8 else -rng.randrange(1, 20)
+        balances[growid] += delta
+        expected[growid] += delta
+        sync.record(growid, delta, balances[growid])
+        if i % 1000 == 0:
+            await asyncio.sleep(0)  # let the worker run, as the bot's loop would
+    return time.perf_counter() - started
+
+
+async def main():
+    logging.getLogger('vpbot').setLevel(logging.ERROR)  # retries are expected here
+    changes = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    fail_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+
+    rng = random.Random(1)
+    growids = [f'Player{i}' for i in range(count)]
+    expected = dict.fromkeys(growids, 0)
+    balances = dict.fromkeys(growids, 1000)
+
+    api = MockGameApi(fail_rate, latency=0.002, seed=2)
+    server = TestServer(api.app(), port=0)
+    await server.start_server()
+    outbox = os.path.join(tempfile.mkdtemp(prefix='vpbot-sync-'), 'game_outbox.ndjson')
+
+    def worker():
+        return GameSync(str(server.make_url('')), '/vp/sync', outbox, interval=0.2, max_backoff=0.5)
+
+    started = time.perf_counter()
+    first = worker()
+    await first.start()
+    spent = await record(first, rng, growids, expected, balances, changes // 2)
+    await first.stop(timeout=0)  # restart with batches still unsent
+    left = first.depth
+    print(f"stopped with {left} batches in the outbox, {api.requests} requests so far")
+
+    second = worker()
+    await second.start()
+    spent += await record(second, rng, growids, expected, balances, changes - changes // 2)
+    while second.depth or second._deltas:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    await second.stop()
+    await server.close()
+
+    pushed = first.metrics['updates_pushed'] + second.metrics['updates_pushed']
+    print(f"record          {changes / spent:12,.0f} changes/s   {spent / changes * 1e6:8.2f} µs")
+    print(f"push            {pushed / elapsed:12,.0f} updates/s  {pushed:,} updates from {changes:,} changes")
+    print(f"requests        {api.requests:,} ({api.failed:,} failed with 503, {api.replays} replays)")
+    print(f"connections     {len(api.connections)}")
+
+    wrong = [g for g in growids if api.balances.get(g, 0) != expected[g]
+             or (expected[g] and api.totals[g] != balances[g])]
+    print(f"mismatched      {len(wrong)} of {count:,} GrowIDs")
+    assert not wrong, wrong[:5]
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""Gems boost lookups: /webhook/gems/check over HTTP versus the shared table.
+
+Also runs a writer process that keeps rewriting boosts while this process
+reads them, and checks no torn slot (multiplier and expiry from different
+writes) is ever returned.
+
+    python benchmarks/bench_gems_shm.py [lookups]
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+import harness
+os.environ['GEMS_SHM_PATH'] = os.path.join(harness.DATA_DIR, 'gems')
+
+from aiohttp import ClientSession
+from aiohttp.test_utils import TestServer
+
+import discord_bot
+from gemstable import GemsTable
+
+PLAYERS = 1000
+
+
+def churn(path, stop):
+    """Rewrite every boost over and over with multiplier == expires"""
+    writer = GemsTable(path + '.churn', 1024)
+    value = 1.0
+    while not stop.is_set():
+        value += 1
+        for i in range(PLAYERS):
+            writer.publish(f'Player{i}', value, value)
+    writer.close()
+
+
+async def http_lookups(lookups):
+    server = TestServer(discord_bot.create_webhook_app())
+    await server.start_server()
+    url = server.make_url('/webhook/gems/check')
+    async with ClientSession() as session:
+        started = time.perf_counter()
+        for i in range(lookups):
+            async with session.post(url, json={'growid': f'Player{i % PLAYERS}', 'amount': 100}) as resp:
+                await resp.json()
+        elapsed = time.perf_counter() - started
+    await server.close()
+    return elapsed
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    harness.setup(players=PLAYERS)
+    for i in range(PLAYERS):
+        discord_id = harness.BASE_ID + i
+        discord_bot.user_voice_data[discord_id] = discord_bot.VoiceState()
+        discord_bot.user_voice_data[discord_id].gems_active = True
+        discord_bot.user_voice_data[discord_id].multiplier = discord_bot.GEMS_MULTIPLIER
+        discord_bot.publish_boost(discord_id, True)
+
+    elapsed = asyncio.run(http_lookups(lookups))
+    print(f"http /gems/check   {lookups / elapsed:12,.0f} lookups/s   {elapsed / lookups * 1e6:8.2f} µs")
+
+    reader = GemsTable.open(discord_bot.GEMS_SHM_PATH)
+    now = time.time()
+    shm_lookups = lookups * 100
+    started = time.perf_counter()
+    for i in range(shm_lookups):
+        assert reader.lookup(f'Player{i % PLAYERS}', now) == discord_bot.GEMS_MULTIPLIER
+    elapsed = time.perf_counter() - started
+    print(f"shared table (py)  {shm_lookups / elapsed:12,.0f} lookups/s   {elapsed / shm_lookups * 1e6:8.2f} µs")
+
+    # Torn read check against a concurrently writing process
+    path = discord_bot.GEMS_SHM_PATH
+    stop = multiprocessing.Event()
+    writer = multiprocessing.Process(target=churn, args=(path, stop))
+    writer.start()
+    while not os.path.exists(path + '.churn'):
+        time.sleep(0.01)
+    time.sleep(0.1)
+    table = GemsTable.open(path + '.churn')
+    reads = torn = 0
+    deadline = time.perf_counter() + 2
+    while time.perf_counter() < deadline:
+        for i in range(PLAYERS):
+            entry = table.entry(f'Player{i}')
+            if entry is not None:
+                torn += entry[0] != entry[1]
+                reads += 1
+    stop.set()
+    writer.join()
+    print(f"concurrent reads   {reads:12,}   torn {torn}")
+
+    discord_bot.gems_table.close()
+
+
+if __name__ == '__main__':
+    main()
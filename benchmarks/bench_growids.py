@@ -0,0 +1,95 @@
+"""GrowID lookups: the index versus the old inline lookup and a Bloom filter.
+
+Times hits, misses (unlinked GrowIDs, most gems checks) and oversized junk
+through `GrowIDIndex.lookup`, the old `reverse.get(growid.lower())`, and a
+Bloom filter in front of the dict.  Then compares the memory of a dict of
+lowercased copies with the index, whose lowercase GrowIDs share the
+account's string.
+
+    python benchmarks/bench_growids.py [accounts]
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from growids import GrowIDIndex
+
+BLOOM_BITS = 10  # per entry, about 1% false positives with 3 probes
+
+
+class Bloom:
+    def __init__(self, keys):
+        self.size = max(8, len(keys) * BLOOM_BITS)
+        self.bits = bytearray(self.size // 8 + 1)
+        for key in keys:
+            for bit in self.probes(key):
+                self.bits[bit >> 3] |= 1 << (bit & 7)
+
+    def probes(self, key):
+        h = hash(key)
+        return h % self.size, (h >> 21) % self.size, (h >> 42) % self.size
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[bit >> 3] & (1 << (bit & 7)) for bit in self.probes(key))
+
+
+def timed(label, queries, fn):
+    started = time.perf_counter()
+    for growid in queries:
+        fn(growid)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28}{elapsed / len(queries) * 1e9:10.0f} ns")
+
+
+def growid_for(i, rng):
+    name = f'player{i}'
+    return name if rng.random() < 0.5 else name.capitalize()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(1)
+    growids = [growid_for(i, rng) for i in range(count)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    copies = {growid.lower(): 10**17 + i for i, growid in enumerate(growids)}
+    middle = tracemalloc.get_traced_memory()[0]
+    index = GrowIDIndex()
+    for i, growid in enumerate(growids):
+        index.add(growid, 10**17 + i)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"dict of lowercased copies   {(middle - before) / 1e6:10.1f} MB")
+    print(f"index                       {(after - middle) / 1e6:10.1f} MB   "
+          f"{index.shared:,} shared keys, stats {index.stats()}")
+
+    bloom = Bloom(copies)
+    get = copies.get
+
+    def old(growid):
+        return get(growid.lower() if isinstance(growid, str) else None)
+
+    def filtered(growid):
+        if not isinstance(growid, str):
+            return None
+        key = growid.lower()
+        return get(key) if key in bloom else None
+
+    queries = 200_000
+    hits = [growids[rng.randrange(count)].upper() for _ in range(queries)]
+    misses = [f'Stranger{i}' for i in range(queries)]
+    junk = ['X' * 16_000] * (queries // 10)
+    for label, batch in (('hit', hits), ('miss', misses), ('16 KB junk', junk)):
+        timed(f"{label:<11}old inline", batch, old)
+        timed(f"{label:<11}index", batch, index.lookup)
+        timed(f"{label:<11}bloom + dict", batch, filtered)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Leaderboard at scale: incremental rank index versus sorting the accounts.
+
+Builds the index over N accounts, then times balance updates (one remove
+plus one insert), rank lookups and top-10 pages, and compares a rank
+lookup and a top-10 page against sorting `linked_accounts` each time.
+
+    python benchmarks/bench_leaderboard.py [accounts]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from leaderboard import Leaderboard, RollingEarnings
+
+
+class Account:
+    __slots__ = ('total_vp',)
+
+    def __init__(self, total_vp):
+        self.total_vp = total_vp
+
+
+def timed(label, ops, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22}{ops / elapsed:14,.0f} ops/s   {elapsed / ops * 1e6:10.2f} µs")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(1)
+    accounts = {10**17 + i: Account(rng.randrange(100_000)) for i in range(count)}
+    ids = list(accounts)
+
+    board = Leaderboard()
+    started = time.perf_counter()
+    board.build(accounts)
+    print(f"build {count:,} accounts   {time.perf_counter() - started:.2f} s")
+
+    ops = 200_000
+
+    def awards():
+        for _ in range(ops):
+            discord_id = rng.choice(ids)
+            account = accounts[discord_id]
+            account.total_vp += 10
+            board.update(discord_id, account.total_vp - 10, account.total_vp)
+
+    def ranks():
+        for _ in range(ops):
+            board.rank(accounts[rng.choice(ids)].total_vp)
+
+    def pages():
+        for page in range(ops // 10):
+            board.top(10, page % 100 * 10)
+
+    timed("award update", ops, awards)
+    timed("rank lookup", ops, ranks)
+    timed("top-10 page", ops // 10, pages)
+
+    def sorted_rank():
+        vp = accounts[ids[0]].total_vp
+        sum(1 for a in accounts.values() if a.total_vp > vp)
+
+    def sorted_top():
+        sorted(accounts.items(), key=lambda item: item[1].total_vp, reverse=True)[:10]
+
+    timed("rank by scan", 5, lambda: [sorted_rank() for _ in range(5)])
+    timed("top-10 by sort", 5, lambda: [sorted_top() for _ in range(5)])
+
+    # Rolling counters, one hour of credits spread across players
+    earnings = RollingEarnings()
+    now = time.time()
+
+    def credits():
+        for i in range(ops):
+            earnings.add(ids[i % 50_000], 10, now + i * 3600 * 24 * 7 / ops)
+
+    timed("rolling earn add", ops, credits)
+    print(f"minted {earnings.minted}")
+
+
+if __name__ == '__main__':
+    main()
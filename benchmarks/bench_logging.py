@@ -0,0 +1,98 @@
+"""Webhook throughput with logging off, synchronous and queued.
+
+Uses the bench_protocol request mix, where every spend logs twice.  The
+synchronous run writes each record
+straight to a slow stream from the event loop (like print to a congested
+pipe); the queued run uses logs.setup_logging, which hands records to a
+writer thread.
+
+    python benchmarks/bench_logging.py [requests] [write delay µs]
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from aiohttp.test_utils import TestServer
+
+from bench_protocol import IN_FLIGHT, PLAYERS, report, run_socket, workload
+
+import discord_bot
+import harness
+import logs
+import protocol
+
+
+class SlowStream:
+    """Stream whose writes block like a full stdout pipe"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.lines = 0
+
+    def write(self, text):
+        time.sleep(self.delay)
+        self.lines += text.count('\n')
+
+    def flush(self):
+        pass
+
+
+def sync_logging(stream):
+    root = logging.getLogger(logs.ROOT)
+    root.handlers.clear()
+    root.setLevel(logging.INFO)
+    root.propagate = False
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logs.JsonFormatter())
+    root.addHandler(handler)
+
+
+def no_logging(stream=None):
+    logs.stop_logging()
+    root = logging.getLogger(logs.ROOT)
+    root.handlers.clear()
+    root.setLevel(logging.CRITICAL)
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    delay = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1e6
+    ledger = await harness.start(players=PLAYERS, vp=10_000)
+
+    server = TestServer(discord_bot.create_webhook_app())
+    await server.start_server()
+    subprotocol = protocol.PROTOCOLS[0]
+
+    print(f"{requests} requests over {subprotocol}, {IN_FLIGHT} in flight, "
+          f"{delay * 1e6:.0f} µs per write\n")
+    modes = [
+        ('off', no_logging),
+        ('sync', sync_logging),
+        ('queued', lambda stream: logs.setup_logging('INFO', stream=stream)),
+    ]
+    for name, install in modes:
+        stream = SlowStream(delay)
+        install(stream)
+        ops = workload(requests)
+        for _, _, args in ops:
+            if 'idempotency_key' in args:
+                args['idempotency_key'] += name
+        started = time.perf_counter()
+        latencies = await run_socket(server, ops, subprotocol)
+        elapsed = time.perf_counter() - started
+        report(name, elapsed, latencies)
+        logs.stop_logging()
+        if name != 'off':
+            print(f"{'':<18} {stream.lines:,} lines written")
+        no_logging()
+
+    await server.close()
+    await ledger.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
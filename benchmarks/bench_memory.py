@@ -0,0 +1,77 @@
+"""Memory of linked accounts: old dict layout versus slotted Account records.
+
+    python benchmarks/bench_memory.py [accounts]
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from awards import VoiceState
+from ledger import Account
+
+
+def old_layout(n):
+    """str snowflake keys, dict per account, datetime timestamps"""
+    accounts = {}
+    reverse = {}
+    voice = {}
+    now = datetime.now()
+    for i in range(n):
+        discord_id = str(10**17 + i)
+        growid = f'Player{i}'
+        accounts[discord_id] = {
+            'growid': growid,
+            'total_vp': i,
+            'linked_at': now,
+            'last_vp_time': datetime.now()
+        }
+        reverse[growid.lower()] = discord_id
+        if i % 100 == 0:
+            voice[discord_id] = {'vp_start': datetime.now(), 'gems_active': False}
+    return accounts, reverse, voice
+
+
+def new_layout(n):
+    """int snowflake keys, slotted records, float timestamps"""
+    accounts = {}
+    reverse = {}
+    voice = {}
+    now = time.time()
+    for i in range(n):
+        discord_id = 10**17 + i
+        growid = f'Player{i}'
+        accounts[discord_id] = Account(growid, i, now, time.time())
+        reverse[growid.lower()] = discord_id
+        if i % 100 == 0:
+            voice[discord_id] = VoiceState()
+    return accounts, reverse, voice
+
+
+def measure(build, n):
+    gc.collect()
+    tracemalloc.start()
+    state = build(n)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+    gc.collect()
+    return current
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"{n:,} linked accounts, 1% in voice\n")
+    old = measure(old_layout, n)
+    new = measure(new_layout, n)
+    print(f"dict + datetime   {old / 2**20:8.1f} MiB   {old / n:6.1f} B/account")
+    print(f"slots + float     {new / 2**20:8.1f} MiB   {new / n:6.1f} B/account")
+    print(f"saved             {(old - new) / 2**20:8.1f} MiB   ({(1 - new / old) * 100:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""JSON HTTP routes versus the pipelined binary socket.
+
+Runs the same mix of vp/check, gems/check and vp/spend requests over both
+transports and reports requests/sec and latency percentiles.
+
+    python benchmarks/bench_protocol.py [requests]
+"""
+import asyncio
+import itertools
+import sys
+import time
+
+import harness
+
+from aiohttp import ClientSession, TCPConnector
+from aiohttp.test_utils import TestServer
+
+import discord_bot
+import protocol
+
+PLAYERS = 1000
+IN_FLIGHT = 64
+
+
+def workload(requests):
+    """(op, path, args) mix: mostly gems checks, some VP checks and spends"""
+    ops = []
+    for i in range(requests):
+        growid = f'Player{i % PLAYERS}'
+        if i % 10 == 0:
+            ops.append((protocol.OP_VP_SPEND, '/webhook/vp/spend',
+                        {'growid': growid, 'amount': 1, 'idempotency_key': f'k{i}'}))
+        elif i % 10 < 4:
+            ops.append((protocol.OP_VP_CHECK, '/webhook/vp/check', {'growid': growid}))
+        else:
+            ops.append((protocol.OP_GEMS_CHECK, '/webhook/gems/check', {'growid': growid, 'amount': 50}))
+    return ops
+
+
+async def run_http(server, ops):
+    latencies = []
+    queue = list(reversed(ops))
+
+    async def worker(session):
+        while queue:
+            _, path, args = queue.pop()
+            started = time.perf_counter()
+            async with session.post(server.make_url(path), json=args) as resp:
+                await resp.json()
+            latencies.append(time.perf_counter() - started)
+
+    async with ClientSession(connector=TCPConnector(limit=IN_FLIGHT)) as session:
+        await asyncio.gather(*(worker(session) for _ in range(IN_FLIGHT)))
+    return latencies
+
+
+async def run_socket(server, ops, subprotocol):
+    encode, decode = protocol.codec_for(subprotocol)
+    latencies = []
+    sent_at = {}
+    window = asyncio.Semaphore(IN_FLIGHT)
+    done = asyncio.Event()
+    ids = itertools.count(1)
+
+    async with ClientSession() as session:
+        async with session.ws_connect(server.make_url('/webhook/ws'), protocols=(subprotocol,)) as ws:
+            async def reader():
+                received = 0
+                async for msg in ws:
+                    request_id, status, result = decode(msg.data)
+                    latencies.append(time.perf_counter() - sent_at.pop(request_id))
+                    window.release()
+                    received += 1
+                    if received == len(ops):
+                        done.set()
+                        return
+
+            reader_task = asyncio.create_task(reader())
+            for op, _, args in ops:
+                await window.acquire()
+                request_id = next(ids)
+                sent_at[request_id] = time.perf_counter()
+                await ws.send_bytes(encode([request_id, op, args]))
+            await done.wait()
+            await reader_task
+    return latencies
+
+
+def report(name, elapsed, latencies):
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<18} {len(latencies) / elapsed:10,.0f} req/s   "
+          f"p50 {p50 * 1000:7.2f} ms   p99 {p99 * 1000:7.2f} ms")
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    ledger = await harness.start(players=PLAYERS, vp=10_000)
+
+    server = TestServer(discord_bot.create_webhook_app())
+    await server.start_server()
+
+    print(f"{requests} requests, {IN_FLIGHT} in flight\n")
+    runs = [('http+json', lambda ops: run_http(server, ops))]
+    runs += [(name, lambda ops, name=name: run_socket(server, ops, name)) for name in protocol.PROTOCOLS]
+    for name, run in runs:
+        # Fresh idempotency keys per run so spends really debit
+        ops = workload(requests)
+        for _, _, args in ops:
+            if 'idempotency_key' in args:
+                args['idempotency_key'] += name
+        started = time.perf_counter()
+        latencies = await run(ops)
+        report(name, time.perf_counter() - started, latencies)
+
+    await server.close()
+    await ledger.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
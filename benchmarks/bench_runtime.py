@@ -0,0 +1,112 @@
+"""Spend latency and event loop lag while large batch checks run.
+
+Two clients post 50,000-GrowID /webhook/vp/check/batch requests back to
+back while a game server sends spends one at a time.  A LoopLagMonitor
+sampling every 5 ms records how late the loop runs.  Each runtime mode runs
+in its own process:
+
+    inline    RUNTIME=stdlib, OFFLOAD_BATCH=0 (batches built on the loop)
+    offload   RUNTIME=stdlib, batches built in the CPU pool
+    auto      RUNTIME=auto, plus orjson and uvloop when installed
+
+    python benchmarks/bench_runtime.py [seconds]
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    'inline': {'RUNTIME': 'stdlib', 'OFFLOAD_BATCH': '0'},
+    'offload': {'RUNTIME': 'stdlib', 'OFFLOAD_BATCH': '1000'},
+    'auto': {'RUNTIME': 'auto', 'OFFLOAD_BATCH': '1000'}
+}
+PLAYERS = 50_000
+BULK_CLIENTS = 2
+
+
+class Samples(list):
+    """Histogram stand-in that keeps every observation"""
+    observe = list.append
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def child(seconds):
+    from aiohttp import ClientSession
+    from aiohttp.test_utils import TestServer
+
+    import discord_bot
+    import harness
+    from metrics import LoopLagMonitor
+
+    ledger = await harness.start(players=PLAYERS, vp=1_000_000)
+    await ledger.snapshot()  # setup writes and their compaction aren't part of the measurement
+
+    lag = LoopLagMonitor(Samples(), interval=0.005)
+    server = TestServer(discord_bot.create_webhook_app(), port=0)
+    await server.start_server()
+    deadline = time.perf_counter() + seconds
+    batches = []
+
+    async def bulk(session):
+        body = json.dumps({'growids': [f'Player{i}' for i in range(PLAYERS)]}).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        while time.perf_counter() < deadline:
+            async with session.post(server.make_url('/webhook/vp/check/batch'), data=body, headers=headers) as resp:
+                assert resp.status == 200, resp.status
+                await resp.read()
+            batches.append(1)
+
+    async def spends(session):
+        latencies = []
+        i = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            body = {'growid': f'Player{i % PLAYERS}', 'amount': 1}
+            async with session.post(server.make_url('/webhook/vp/spend'), json=body) as resp:
+                assert resp.status == 200, resp.status
+                await resp.read()
+            latencies.append(time.perf_counter() - started)
+            i += 1
+            await asyncio.sleep(0.01)
+        return latencies
+
+    async with ClientSession() as session:
+        lag.start()
+        *_, latencies = await asyncio.gather(*(bulk(session) for _ in range(BULK_CLIENTS)), spends(session))
+        await lag.stop()
+
+    await server.close()
+    await ledger.close()
+    discord_bot.cpu_pool.shutdown()
+
+    samples = lag.histogram
+    print(f"{discord_bot.runtime.LOOP:<8}{discord_bot.runtime.JSON:<7}"
+          f"spend p50 {percentile(latencies, 0.5) * 1e3:7.2f} ms  p99 {percentile(latencies, 0.99) * 1e3:7.2f} ms  "
+          f"max {max(latencies) * 1e3:7.2f} ms   "
+          f"loop lag p99 {percentile(samples, 0.99) * 1e3:7.2f} ms  max {max(samples) * 1e3:7.2f} ms   "
+          f"batches {len(batches) / seconds:5.2f}/s")
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for mode, env in MODES.items():
+        env = dict(os.environ, **env, DATA_DIR=tempfile.mkdtemp(prefix='vpbot-bench-'), SPEND_RATE='1000000')
+        print(f"{mode:<9}", end='', flush=True)
+        subprocess.run([sys.executable, __file__, '--child', str(seconds)], env=env, check=True)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        import harness  # repo on sys.path, DATA_DIR comes from main()
+        import runtime
+        runtime.run(child(float(sys.argv[2])))
+    else:
+        main()
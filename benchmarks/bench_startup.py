@@ -0,0 +1,67 @@
+"""Time until the webhook port answers, and until requests are served.
+
+Builds a ledger with N accounts, then starts the webhook server the way
+main() does: bind first, load the ledger in a thread behind the readiness
+gate.  Before, the port only opened after the whole replay.
+
+    python benchmarks/bench_startup.py [accounts]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = tempfile.mkdtemp(prefix='vpbot-bench-')
+os.environ['DATA_DIR'] = DATA_DIR
+os.environ['WEBHOOK_PORT'] = '18765'
+
+from aiohttp import ClientSession
+
+from ledger import PartitionedLedger
+
+
+async def build(accounts):
+    ledger = PartitionedLedger(DATA_DIR)
+    ledger.load()
+    await ledger.start()
+    for i in range(accounts):
+        ledger.link(10**17 + i, f'Player{i}')
+        ledger.award(10**17 + i, 10)
+    await ledger.close()
+
+
+async def main():
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    await build(accounts)
+
+    import discord_bot
+    url = f'http://127.0.0.1:{discord_bot.WEBHOOK_PORT}'
+    started = time.perf_counter()
+    runner = await discord_bot.start_webhook_server()
+    async with ClientSession() as session:
+        async with session.get(f'{url}/health') as resp:
+            bound = time.perf_counter() - started
+            status = resp.status
+
+        async def load():
+            await asyncio.to_thread(discord_bot.ledger.load)
+            await discord_bot.ledger.start()
+            discord_bot.lifecycle.mark_ready()
+
+        loading = asyncio.create_task(load())
+        async with session.post(f'{url}/webhook/vp/check', json={'growid': 'Player1'}) as resp:
+            served = time.perf_counter() - started
+            result = await resp.json()
+        await loading
+
+    print(f"{accounts:,} accounts")
+    print(f"port answering   {bound * 1e3:8.1f} ms   (/health {status})")
+    print(f"first request    {served * 1e3:8.1f} ms   (queued behind the ledger load, {result['total_vp']} VP)")
+    await runner.cleanup()
+    await discord_bot.ledger.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""Change stream versus polling for a game server that caches balances.
+
+Publishes a burst of balance and boost events (as one VP flush would) and
+measures how long a /webhook/events subscriber takes to receive all of it,
+compared with re-polling /webhook/vp/check/batch for the same players.  Then
+checks that reconnecting with Last-Event-ID resumes without gaps.
+
+    python benchmarks/bench_stream.py [players]
+"""
+import asyncio
+import sys
+import time
+
+import harness
+
+from aiohttp import ClientSession
+from aiohttp.test_utils import TestServer
+
+import discord_bot
+
+
+async def read_events(resp, count):
+    """Parse SSE frames until `count` non-reset events arrived, returns [(id, event)]"""
+    received = []
+    frame = {}
+    while len(received) < count:
+        line = (await resp.content.readline()).decode('utf-8').rstrip('\n')
+        if line:
+            field, _, value = line.partition(': ')
+            frame[field] = value
+            continue
+        if frame.get('event') not in (None, 'reset'):
+            received.append((frame['id'], frame['event']))
+        frame = {}
+    return received
+
+
+async def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    ledger = await harness.start(players=players)
+    ids = [harness.BASE_ID + i for i in range(players)]
+    now = time.monotonic()
+    for discord_id in ids:
+        # credit_periods pays at the rate of the member's open session
+        discord_bot.sessions.join(discord_id, discord_bot.rules.vp_channels[0], now)
+
+    server = TestServer(discord_bot.create_webhook_app())
+    await server.start_server()
+    print(f"{players:,} players credited in one flush\n")
+
+    async with ClientSession() as session:
+        async with session.get(server.make_url('/webhook/events')) as resp:
+            started = time.perf_counter()
+            discord_bot.credit_periods([(d, 1) for d in ids], time.monotonic())
+            flushed = time.perf_counter() - started
+            events = await read_events(resp, players)
+            elapsed = time.perf_counter() - started
+            print(f"push  {len(events):>8,} events in {elapsed * 1e3:8.1f} ms "
+                  f"(flush {flushed * 1e3:.1f} ms, only players that changed)")
+            last_id = events[len(events) // 2][0]
+
+        started = time.perf_counter()
+        growids = [f'Player{i}' for i in range(players)]
+        async with session.post(server.make_url('/webhook/vp/check/batch'), json={'growids': growids}) as resp:
+            await resp.read()
+        elapsed = time.perf_counter() - started
+        print(f"poll  {players:>8,} players in {elapsed * 1e3:8.1f} ms (every poll, changed or not)")
+
+        # Resume from the middle of the burst
+        async with session.get(server.make_url('/webhook/events'), headers={'Last-Event-ID': last_id}) as resp:
+            resumed = await read_events(resp, players - players // 2 - 1)
+        seqs = [int(event_id.split(':')[1]) for event_id, _ in resumed]
+        gapless = seqs == list(range(int(last_id.split(':')[1]) + 1, seqs[-1] + 1))
+        print(f"resume after {last_id}: {len(resumed):,} events, gapless {gapless}")
+
+    await server.close()
+    await ledger.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
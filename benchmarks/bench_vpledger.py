@@ -0,0 +1,57 @@
+"""Bulk import and reconciliation throughput of vpledger.py.
+
+Generates a CSV of N accounts, imports it into an empty ledger, then
+reconciles a game export where 1% of the balances differ.
+
+    python benchmarks/bench_vpledger.py [rows] [workers]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import vpledger
+
+
+def generate(path, rows, skew=0):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('discord_id,growid,total_vp\n')
+        for i in range(rows):
+            vp = i % 5000 + (1 if skew and i % 100 == 0 else 0)
+            f.write(f'{10**17 + i},Player{i},{vp}\n')
+
+
+def timed(name, rows, argv):
+    started = time.perf_counter()
+    vpledger.main(argv)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<10} {rows / elapsed:12,.0f} rows/s   {elapsed:7.2f} s", file=sys.stderr)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    workers = sys.argv[2] if len(sys.argv) > 2 else str(os.cpu_count() or 1)
+    tmp = tempfile.mkdtemp(prefix='vpbot-bench-')
+    data_dir = os.path.join(tmp, 'data')
+    balances = os.path.join(tmp, 'balances.csv')
+    game = os.path.join(tmp, 'game.csv')
+    diff = os.path.join(tmp, 'diff.ndjson')
+    generate(balances, rows)
+    generate(game, rows, skew=1)
+
+    common = ['--data-dir', data_dir, '--workers', workers]
+    timed('import', rows, common + ['import', balances])
+    timed('reconcile', rows, common + ['reconcile', game, '--out', diff])
+    with open(diff, encoding='utf-8') as f:
+        kinds = {}
+        for line in f:
+            kind = json.loads(line)['kind']
+            kinds[kind] = kinds.get(kind, 0) + 1
+    print(f"diff       {kinds}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
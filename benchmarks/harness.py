@@ -0,0 +1,45 @@
+"""Shared setup for the benchmarks that run the bot in-process.
+
+Import it before discord_bot: it puts the repo on sys.path and points
+DATA_DIR at a fresh temporary directory, unless one is set already.
+Settings a benchmark needs go into os.environ between the two imports.
+
+    import harness
+    os.environ['SPEND_RATE'] = '1000000'
+
+    import discord_bot
+
+    ledger = await harness.start(players=1000, vp=10_000)
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='vpbot-bench-'))
+
+DATA_DIR = os.environ['DATA_DIR']
+BASE_ID = 10**17  # discord_id of Player0
+
+
+def setup(players=0, vp=0):
+    """Load the bot's ledger, open the startup gate and link `players`
+    accounts, BASE_ID + i as Player<i>, with `vp` each.  Returns the ledger."""
+    import discord_bot
+
+    ledger = discord_bot.ledger
+    ledger.load()
+    discord_bot.lifecycle.mark_ready()
+    ids = [BASE_ID + i for i in range(players)]
+    for i, discord_id in enumerate(ids):
+        ledger.link(discord_id, f'Player{i}')
+    if vp:
+        ledger.award_many(ids, vp)
+    return ledger
+
+
+async def start(players=0, vp=0):
+    """setup() with the ledger's flusher running"""
+    ledger = setup(players, vp)
+    await ledger.start()
+    return ledger
@@ -0,0 +1,74 @@
+"""Concurrent spend load test against a single account.
+
+Fires 1k concurrent /webhook/vp/spend requests, each idempotency key sent
+twice, and checks the account is never overdrawn or double-charged.
+
+    python benchmarks/load_spend.py [requests]
+"""
+import asyncio
+import os
+import sys
+import time
+
+import harness
+os.environ['SPEND_RATE'] = '1000000'  # one account on purpose, don't rate limit it
+
+from aiohttp import ClientSession
+from aiohttp.test_utils import TestServer
+
+import discord_bot
+
+DISCORD_ID = 100000000000000001
+GROWID = 'LoadTester'
+START_VP = 3000
+AMOUNT = 7
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    ledger = await harness.start()
+    ledger.link(DISCORD_ID, GROWID)
+    ledger.award(DISCORD_ID, START_VP)
+
+    server = TestServer(discord_bot.create_webhook_app())
+    await server.start_server()
+    url = str(server.make_url('/webhook/vp/spend'))
+
+    async def spend(session, key):
+        async with session.post(url, json={'growid': GROWID, 'amount': AMOUNT,
+                                           'idempotency_key': key}) as resp:
+            return key, await resp.json()
+
+    # Every key is sent twice, as a game server retrying on timeout would
+    keys = [f'spend-{i // 2}' for i in range(requests)]
+    started = time.perf_counter()
+    async with ClientSession() as session:
+        results = await asyncio.gather(*(spend(session, key) for key in keys))
+    elapsed = time.perf_counter() - started
+
+    await server.close()
+    await ledger.close()
+
+    charged = {}
+    for key, result in results:
+        if result['success']:
+            charged.setdefault(key, set()).add(result['remaining'])
+    double_charged = [key for key, remaining in charged.items() if len(remaining) > 1]
+
+    balance = ledger.accounts[DISCORD_ID].total_vp
+    expected = START_VP - len(charged) * AMOUNT
+    max_spends = START_VP // AMOUNT
+
+    print(f"{requests} requests in {elapsed:.2f}s ({requests / elapsed:.0f} req/s)")
+    print(f"distinct debits: {len(charged)} (max affordable {max_spends})")
+    print(f"final balance:   {balance} (expected {expected})")
+
+    assert balance >= 0, 'overdrawn'
+    assert balance == expected, 'balance does not match distinct debits'
+    assert not double_charged, f'double charged keys: {double_charged[:5]}'
+    assert len(charged) <= max_spends
+    print("OK: no overdraw, no double spend")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,192 @@
+"""Offline load test: fake Discord gateway plus a simulated game server.
+
+Runs the bot in-process without touching the network:
+
+  1. the fake gateway links N members and fires a voice_state_update storm
+     (joins, channel moves, gems boosts, leaves) straight into the handler
+  2. vp_task is driven by hand once sessions are due
+  3. a simulated game server hammers /webhook/link, /vp/check, /vp/spend
+     and /gems/check over HTTP with a fixed number of requests in flight
+
+Each phase reports throughput, p50/p99 latency and peak RSS.
+
+    python benchmarks/loadtest.py [members] [requests] [in flight]
+"""
+import asyncio
+import random
+import resource
+import sys
+import time
+
+import harness
+
+from aiohttp import ClientSession, TCPConnector
+from aiohttp.test_utils import TestServer
+
+import discord_bot
+from harness import BASE_ID
+
+
+# ============= FAKE GATEWAY =============
+class FakeChannel:
+    __slots__ = ('id',)
+
+    def __init__(self, channel_id):
+        self.id = channel_id
+
+
+class FakeVoiceState:
+    __slots__ = ('channel', 'self_mute', 'self_deaf', 'afk', 'suppress')
+
+    def __init__(self, channel=None, muted=False):
+        self.channel = channel
+        self.self_mute = muted
+        self.self_deaf = False
+        self.afk = False
+        self.suppress = False
+
+
+class FakeMember:
+    __slots__ = ('id', 'name', 'bot', 'roles')
+
+    def __init__(self, discord_id):
+        self.id = discord_id
+        self.name = f'member{discord_id - BASE_ID}'
+        self.bot = False
+        self.roles = ()
+
+
+class FakeGateway:
+    """Feeds synthetic voice events to the bot's handler"""
+
+    def __init__(self, members):
+        self.members = [FakeMember(BASE_ID + i) for i in range(members)]
+        self.where = {}  # discord_id -> FakeChannel or None
+        self.vp_channels = [FakeChannel(c) for c in discord_bot.rules.vp_channels]
+        self.gems_channels = [FakeChannel(c) for c in discord_bot.rules.gems_channels]
+        self.other_channel = FakeChannel(1)
+
+    async def move(self, member, channel, muted=False):
+        before = FakeVoiceState(self.where.get(member.id))
+        self.where[member.id] = channel
+        await discord_bot.on_voice_state_update(member, before, FakeVoiceState(channel, muted))
+
+    async def storm(self, rng):
+        """Everyone joins a VP channel, some move, some mute, some boost, some leave"""
+        latencies = []
+
+        async def emit(member, channel, muted=False):
+            started = time.perf_counter()
+            await self.move(member, channel, muted)
+            latencies.append(time.perf_counter() - started)
+
+        for member in self.members:
+            await emit(member, rng.choice(self.vp_channels))
+        for member in rng.sample(self.members, len(self.members) // 4):
+            await emit(member, rng.choice(self.vp_channels))
+        for member in rng.sample(self.members, len(self.members) // 10):
+            await emit(member, self.where[member.id], muted=True)
+        for member in rng.sample(self.members, len(self.members) // 10):
+            await emit(member, rng.choice(self.gems_channels))
+        for member in rng.sample(self.members, len(self.members) // 10):
+            await emit(member, self.other_channel)
+        return latencies
+
+
+# ============= GAME SERVER =============
+def game_requests(members, requests, rng):
+    """(path, body) mix of link codes, VP checks, spends and gems checks"""
+    ops = []
+    for i in range(requests):
+        growid = f'Player{rng.randrange(members)}'
+        roll = rng.random()
+        if roll < 0.05:
+            ops.append(('/webhook/link', {'growid': f'New{i}', 'code': f'C{i % 10**5:05d}'}))
+        elif roll < 0.35:
+            ops.append(('/webhook/vp/check', {'growid': growid}))
+        elif roll < 0.45:
+            ops.append(('/webhook/vp/spend', {'growid': growid, 'amount': 1, 'idempotency_key': f'k{i}'}))
+        else:
+            ops.append(('/webhook/gems/check', {'growid': growid, 'amount': 100}))
+    return ops
+
+
+async def hammer(server, ops, in_flight):
+    latencies = {}
+    statuses = {}
+    queue = list(reversed(ops))
+
+    async def client(session):
+        while queue:
+            path, body = queue.pop()
+            started = time.perf_counter()
+            async with session.post(server.make_url(path), json=body) as resp:
+                await resp.read()
+            latencies.setdefault(path, []).append(time.perf_counter() - started)
+            statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+    async with ClientSession(connector=TCPConnector(limit=in_flight)) as session:
+        await asyncio.gather(*(client(session) for _ in range(in_flight)))
+    return latencies, statuses
+
+
+# ============= REPORT =============
+def peak_rss():
+    """Peak resident set size in MiB (ru_maxrss is KiB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def report(name, elapsed, latencies):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    print(f"{name:<22} {len(latencies):>8,} ops {len(latencies) / elapsed:11,.0f} ops/s   "
+          f"p50 {p50 * 1e3:8.3f} ms   p99 {p99 * 1e3:8.3f} ms")
+
+
+async def main():
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    in_flight = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    rng = random.Random(1)
+
+    print(f"{members:,} members, {requests:,} game requests, {in_flight} in flight\n")
+    print(f"{'start':<22} peak RSS {peak_rss():8.1f} MiB")
+
+    # Link everyone, as if they had all run /linkvp
+    ledger = await harness.start(players=members, vp=1000)
+    gateway = FakeGateway(members)
+    await ledger.sync()
+
+    started = time.perf_counter()
+    latencies = await gateway.storm(rng)
+    report('voice events', time.perf_counter() - started, latencies)
+    print(f"{'':<22} {len(discord_bot.sessions):,} in VP channels ({discord_bot.sessions.paused:,} paused), "
+          f"{len(discord_bot.user_voice_data):,} boosting, peak RSS {peak_rss():.1f} MiB")
+
+    # Wait out one accrual interval, then run the flush by hand
+    await asyncio.sleep(discord_bot.sessions.interval)
+    awards = ledger.ops['award']
+    started = time.perf_counter()
+    await discord_bot.vp_task()
+    elapsed = time.perf_counter() - started
+    print(f"{'vp_task flush':<22} {ledger.ops['award'] - awards:>8,} credited in {elapsed * 1e3:.1f} ms, "
+          f"DM queue depth {discord_bot.notifier.depth:,}")
+
+    server = TestServer(discord_bot.create_webhook_app())
+    await server.start_server()
+    ops = game_requests(members, requests, rng)
+    started = time.perf_counter()
+    latencies, statuses = await hammer(server, ops, in_flight)
+    elapsed = time.perf_counter() - started
+    report('game requests', elapsed, [x for path in latencies.values() for x in path])
+    for path, path_latencies in sorted(latencies.items()):
+        report(f'  {path[len("/webhook"):]}', elapsed, path_latencies)
+    print(f"{'':<22} statuses {dict(sorted(statuses.items()))}, peak RSS {peak_rss():.1f} MiB")
+
+    await server.close()
+    await ledger.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""Stand-in for the game API's balance write-back endpoint.
+
+Applies each batch's deltas once per Idempotency-Key, and can fail a share
+of requests with 503 or add latency to exercise retries.
+
+    python benchmarks/mock_game_api.py [port] [fail rate] [latency ms]
+
+then run the bot with API_BASE_URL=http://127.0.0.1:<port> GAME_SYNC_PATH=/vp/sync.
+"""
+import asyncio
+import random
+import sys
+
+from aiohttp import web
+
+
+class MockGameApi:
+    def __init__(self, fail_rate=0.0, latency=0.0, seed=None):
+        self.fail_rate = fail_rate
+        self.latency = latency  # seconds
+        self.rng = random.Random(seed)
+        self.balances = {}  # growid -> summed deltas
+        self.totals = {}  # growid -> last total_vp seen
+        self.seen = set()  # applied batch ids
+        self.requests = 0
+        self.failed = 0
+        self.replays = 0
+        self.connections = set()  # peer addresses, one per pooled connection
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/vp/sync', self.sync)
+        return app
+
+    async def sync(self, request):
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info('peername'))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rng.random() < self.fail_rate:
+            self.failed += 1
+            return web.json_response({'success': False, 'error': 'Unavailable'}, status=503)
+
+        data = await request.json()
+        key = request.headers.get('Idempotency-Key')
+        if key != data.get('batch') or not isinstance(data.get('updates'), list):
+            return web.json_response({'success': False, 'error': 'Bad batch'}, status=400)
+        if key in self.seen:
+            self.replays += 1
+        else:
+            self.seen.add(key)
+            for update in data['updates']:
+                growid = update['growid']
+                self.balances[growid] = self.balances.get(growid, 0) + update['delta']
+                self.totals[growid] = update['total_vp']
+        return web.json_response({'success': True, 'applied': len(data['updates'])})
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    fail_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.0
+    web.run_app(MockGameApi(fail_rate, latency).app(), host='127.0.0.1', port=port)
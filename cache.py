@@ -0,0 +1,116 @@
+"""Small in-process caches."""
+import heapq
+import time
+from collections import OrderedDict, deque
+
+
+class TTLCache:
+    """Bounded mapping whose entries expire `ttl` seconds after being set"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value), oldest first
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        if entry[0] <= time.monotonic():
+            del self._data[key]
+            return default
+        return entry[1]
+
+    def set(self, key, value):
+        now = time.monotonic()
+        self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+
+        # Insertion order is expiry order, so expired entries sit at the front
+        data = self._data
+        while data:
+            oldest_key, (expires_at, _) = next(iter(data.items()))
+            if expires_at > now and len(data) <= self.maxsize:
+                break
+            del data[oldest_key]
+
+
+class ExpiringStore:
+    """Keys that expire exactly `ttl` seconds after insertion
+
+    Lookups check the deadline themselves, so an expired key is never
+    returned even if eviction hasn't run yet.  Deadlines sit in a min-heap
+    and `evict_expired()` only touches keys that actually expired.  Each key
+    belongs to a group (e.g. a GrowID) holding at most `max_per_group` keys;
+    adding another drops the group's oldest key.
+    """
+
+    def __init__(self, ttl, max_per_group, maxsize):
+        self.ttl = ttl
+        self.max_per_group = max_per_group
+        self.maxsize = maxsize
+        self._data = {}  # key -> (expires_at, group, value)
+        self._heap = []  # (expires_at, key), stale entries skipped lazily
+        self._groups = {}  # group -> deque of keys, oldest first
+
+    def __len__(self):
+        return len(self._data)
+
+    def put(self, key, value, group):
+        """Store a key, returns False if the store is full"""
+        if key in self._data:
+            self._remove(key)
+
+        keys = self._groups.get(group)
+        if keys is not None:
+            while len(keys) >= self.max_per_group:
+                self._remove(keys[0])
+
+        if len(self._data) >= self.maxsize:
+            self.evict_expired()
+            if len(self._data) >= self.maxsize:
+                return False
+
+        expires_at = time.monotonic() + self.ttl
+        self._data[key] = (expires_at, group, value)
+        heapq.heappush(self._heap, (expires_at, key))
+        self._groups.setdefault(group, deque()).append(key)
+        return True
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._remove(key)
+            return None
+        return entry[2]
+
+    def pop(self, key):
+        value = self.get(key)
+        if value is not None:
+            self._remove(key)
+        return value
+
+    def evict_expired(self):
+        """Drop every expired key, returns how many were removed"""
+        now = time.monotonic()
+        heap = self._heap
+        removed = 0
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == expires_at:
+                self._remove(key)
+                removed += 1
+        return removed
+
+    def _remove(self, key):
+        _, group, _ = self._data.pop(key)
+        keys = self._groups[group]
+        keys.remove(key)
+        if not keys:
+            del self._groups[group]
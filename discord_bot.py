@@ -3,28 +3,143 @@ from discord import app_commands
 from discord.ext import tasks
 import asyncio
 import os
-from datetime import datetime, timedelta
-from collections import defaultdict
-from aiohttp import web
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from aiohttp import WSCloseCode, web
 import json
 
+from admission import Admission
+from awards import Eligibility, SessionTracker, VoiceState, voice_active
+from cache import ExpiringStore, TTLCache
+from events import EventStream
+from gamesync import GameSync
+from gemstable import GemsTable
+from growids import fold, linkable
+from leaderboard import Leaderboard, RollingEarnings
+from ledger import PartitionedLedger
+from lifecycle import Lifecycle, commands_digest, read_marker, write_marker
+from logs import get_logger, setup_logging, stop_logging
+from metrics import LoopLagMonitor, Registry, SamplingProfiler
+from notifications import NotificationQueue
+import protocol
+import runtime
+from rules import NO_BOOST, RuleSet, RulesError
+
 # ============= CONFIG =============
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN', 'YOUR_BOT_TOKEN')
 WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '10000'))
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')  # enables /debug/profile
+
+# Logging, see logs.py
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')  # e.g. voice=WARNING,webhook=DEBUG
+LOG_SAMPLE = os.getenv('LOG_SAMPLE', 'award=0.01')
+
+DATA_DIR = os.getenv('DATA_DIR', 'data')
+
+# Lifecycle, see lifecycle.py
+SYNC_COMMANDS = os.getenv('SYNC_COMMANDS') == '1'  # force a command tree sync
+COMMANDS_HASH_FILE = os.path.join(DATA_DIR, 'commands.sha256')
+HANDOFF_FILE = os.path.join(DATA_DIR, 'handoff.json')
+HANDOFF_MAX_AGE = 300  # seconds, older voice session handoffs are ignored
+START_TIMEOUT = 30  # seconds a request waits for startup before 503
+DRAIN_TIMEOUT = 10  # seconds in-flight requests get on shutdown
+
+def env_ids(name, default=''):
+    """Comma separated integer list from the environment"""
+    return [int(part) for part in os.getenv(name, default).split(',') if part.strip()]
 
-# Voice channels
+# Voice channels, *_CHANNEL_IDS adds more reward channels (any guild)
 VP_CHANNEL_ID = int(os.getenv('VP_CHANNEL_ID', '1470057279511466045'))
 GEMS_CHANNEL_ID = int(os.getenv('GEMS_CHANNEL_ID', '1470057299631411444'))
+VP_CHANNELS = frozenset([VP_CHANNEL_ID, *env_ids('VP_CHANNEL_IDS')])
+GEMS_CHANNELS = frozenset([GEMS_CHANNEL_ID, *env_ids('GEMS_CHANNEL_IDS')])
 
-# Reward settings
+# Scaling
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None  # None = Discord's recommendation, all run in this process
+LEDGER_PARTITIONS = int(os.getenv('LEDGER_PARTITIONS', '1'))
+
+# Reward settings, defaults for when there is no rules file (see rules.py)
 VP_AMOUNT = 10
 VP_INTERVAL = 5  # 3 minutes (was 5)
+VP_FLUSH_INTERVAL = int(os.getenv('VP_FLUSH_INTERVAL', '60'))  # accrual is exact, this only batches credits
 GEMS_MULTIPLIER = 1.05
+RULES_FILE = os.getenv('RULES_FILE', 'rules.json')  # channels, roles and events, reloaded when it changes
+RULES_POLL = 15  # seconds between rules file checks and event boundary checks
+
+# Anti-AFK: VP only accrues while unmuted, undeafened and not alone
+AFK_GATING = os.getenv('AFK_GATING', '1') != '0'
+AFK_MIN_HUMANS = int(os.getenv('AFK_MIN_HUMANS', '2'))  # humans in the channel, counting the member
+
+# Shared-memory boost table for game servers on this host, see gemstable.py
+GEMS_SHM_PATH = os.getenv('GEMS_SHM_PATH')  # e.g. /dev/shm/vpbot-gems, unset = off
+GEMS_SHM_SLOTS = int(os.getenv('GEMS_SHM_SLOTS', '65536'))
+GEMS_LEASE = 120  # seconds a published boost stays valid without renewal
+
+# Change stream for game servers, see events.py
+STREAM_HISTORY = 100_000  # events a reconnecting client can resume from
+STREAM_KEEPALIVE = 15  # seconds between keepalive comments on an idle stream
+
+# Balance write-back to the game API, see gamesync.py
+API_BASE_URL = os.getenv('API_BASE_URL')
+API_TOKEN = os.getenv('API_TOKEN')  # sent as a bearer token
+GAME_SYNC_PATH = os.getenv('GAME_SYNC_PATH')  # e.g. /vp/sync, unset = off until the game API has the endpoint
+GAME_SYNC_INTERVAL = float(os.getenv('GAME_SYNC_INTERVAL', '5'))  # seconds between batches
+GAME_SYNC_BATCH = 500  # GrowIDs per request
+GAME_SYNC_OUTBOX_MAX = 100_000  # updates kept on disk while the game API is down, about 10 MB
+GAME_SYNC_OUTBOX = os.path.join(DATA_DIR, 'game_outbox.ndjson')
+
+# Link codes
+LINK_CODE_TTL = 300  # 5 minutes
+LINK_CODE_LENGTH = 6  # ASCII letters and digits, as the game generates them
+MAX_CODES_PER_GROWID = 3
+MAX_PENDING_CODES = 100_000
+
+# Admission control for the webhook server, see admission.py
+SOURCE_RATE = (int(os.getenv('SOURCE_RATE', '500')), 1.0)  # requests per client address
+TRUSTED_SOURCES = os.getenv('TRUSTED_SOURCES', '127.0.0.1,::1').split(',')  # game servers, no per-source limit
+TRUST_PROXY = os.getenv('TRUST_PROXY') == '1'  # behind a proxy that sets X-Forwarded-For
+LINK_RATE = (5, 60.0)  # link codes per GrowID
+SPEND_RATE = (int(os.getenv('SPEND_RATE', '20')), 1.0)  # spends per GrowID
+MAX_INFLIGHT = int(os.getenv('MAX_INFLIGHT', '256'))  # requests in flight before shedding with 429
+MAX_CONNECTIONS = int(os.getenv('MAX_CONNECTIONS', '256'))  # open change streams and sockets, together
+MAX_LAG = 0.25  # seconds of event loop lag before read traffic is shed
+SOCKET_MAX_INFLIGHT = 64  # pipelined async requests per socket connection
+MAX_BODY = 16 * 1024  # bytes, single requests
+MAX_BATCH_BODY = 8 * 1024 * 1024  # bytes, batch requests (MAX_BATCH_SIZE GrowIDs)
+
+# Batch webhooks
+MAX_BATCH_SIZE = 100_000
+OFFLOAD_BATCH = int(os.getenv('OFFLOAD_BATCH', '1000'))  # GrowIDs before a batch is answered from the CPU pool, 0 = never
+CPU_WORKERS = 1  # threads share the GIL, more would only contend
+NDJSON_CHUNK = 1000  # lines per streamed write
+PROFILE_CACHE_TTL = 60  # seconds a /profile embed is reused while nothing changed
+
+# Leaderboard, see leaderboard.py
+LEADERBOARD_SIZE = 10  # accounts per /leaderboard page
+LEADERBOARD_CACHE_TTL = 30  # seconds a page embed is reused
+
+log_bot = get_logger('bot')
+log_webhook = get_logger('webhook')
+log_link = get_logger('link')
+log_voice = get_logger('voice')
+log_vp = get_logger('vp')
+log_award = get_logger('award')  # one record per credit, sampled by default
 
 # ============= DATA STORAGE =============
-pending_links = {}  # code -> {growid, timestamp}
-linked_accounts = {}  # discord_id -> {growid, total_vp, linked_at, last_vp_time}
-reverse_links = {}  # growid_lower -> discord_id
+ledger = PartitionedLedger(DATA_DIR, LEDGER_PARTITIONS)
+pending_links = ExpiringStore(  # code -> growid, grouped by growid_lower
+    ttl=LINK_CODE_TTL,
+    max_per_group=MAX_CODES_PER_GROWID,
+    maxsize=MAX_PENDING_CODES
+)
+linked_accounts = ledger.accounts  # discord_id (int) -> Account
+reverse_links = ledger.reverse  # growid_lower -> discord_id (int)
+spend_results = TTLCache(maxsize=100_000, ttl=3600)  # (growid_lower, idempotency_key) -> response
+lifecycle = Lifecycle(start_timeout=START_TIMEOUT)  # ready once main() has finished starting up
 
 # ============= BOT SETUP =============
 intents = discord.Intents.default()
@@ -32,351 +147,1362 @@ intents.message_content = True
 intents.voice_states = True
 intents.members = True
 
-class RewardsBot(discord.Client):
+class RewardsBot(discord.AutoShardedClient):
     def __init__(self):
-        super().__init__(intents=intents)
+        super().__init__(intents=intents, shard_count=SHARD_COUNT)
         self.tree = app_commands.CommandTree(self)
         
     async def setup_hook(self):
+        # Syncing is slow and rate limited, skip it while definitions are unchanged
+        digest = commands_digest({
+            'application_id': self.application_id,
+            'commands': [command.to_dict(self.tree) for command in self.tree.get_commands()]
+        })
+        if not SYNC_COMMANDS and read_marker(COMMANDS_HASH_FILE) == digest:
+            log_bot.info("Commands unchanged, sync skipped")
+            return
         await self.tree.sync()
-        print("[BOT] Commands synced!")
+        write_marker(COMMANDS_HASH_FILE, digest)
+        log_bot.info("Commands synced!")
 
 bot = RewardsBot()
 
+# ============= REWARD RULES =============
+def default_rules():
+    """Rules from the *_CHANNEL_ID settings, used while there is no rules file"""
+    return RuleSet(
+        VP_INTERVAL,
+        [{'id': c, 'vp': VP_AMOUNT} for c in sorted(VP_CHANNELS, key=lambda c: c != VP_CHANNEL_ID)] +
+        [{'id': c, 'gems': GEMS_MULTIPLIER} for c in sorted(GEMS_CHANNELS, key=lambda c: c != GEMS_CHANNEL_ID)]
+    )
+
+def read_rules():
+    """(rules, file mtime), raises RulesError or OSError if the file is unusable"""
+    try:
+        mtime = os.stat(RULES_FILE).st_mtime
+    except FileNotFoundError:
+        return default_rules(), None
+    return RuleSet.load(RULES_FILE), mtime
+
+rules, rules_mtime = read_rules()
+published_event = None  # event boost that published gems multipliers include
+
 # Voice tracking
-user_voice_data = defaultdict(lambda: {'vp_start': None, 'gems_active': False})
+user_voice_data = {}  # discord_id (int) -> VoiceState, only while boosting
+role_boosts = {}  # discord_id (int) -> (vp, gems) role multipliers, only while in a reward channel
+gems_table = GemsTable(GEMS_SHM_PATH, GEMS_SHM_SLOTS) if GEMS_SHM_PATH else None
+change_stream = EventStream(STREAM_HISTORY)
+game_sync = GameSync(
+    API_BASE_URL,
+    GAME_SYNC_PATH,
+    GAME_SYNC_OUTBOX,
+    token=API_TOKEN,
+    interval=GAME_SYNC_INTERVAL,
+    max_batch=GAME_SYNC_BATCH,
+    max_outbox=GAME_SYNC_OUTBOX_MAX
+) if API_BASE_URL and GAME_SYNC_PATH else None
+sessions = SessionTracker(rules.interval)  # VP channel sessions and accrual
+eligibility = Eligibility(AFK_MIN_HUMANS)  # cached from voice events, pauses and resumes sessions
+leaderboard = Leaderboard()  # ranks by total VP, built once the ledger is loaded
+earnings = RollingEarnings()  # VP earned per day and week, carried across restarts by the handoff
+
+# ============= METRICS =============
+registry = Registry()
+webhook_latency = registry.histogram(
+    'vpbot_webhook_latency_seconds', 'Webhook handling time by route', ('route',))
+webhook_requests = registry.counter(
+    'vpbot_webhook_requests_total', 'Webhook requests by route and status', ('route', 'status'))
+socket_latency = registry.histogram(
+    'vpbot_socket_latency_seconds', 'Socket request handling time by op', ('op',))
+flush_duration = registry.histogram(
+    'vpbot_vp_flush_seconds', 'Duration of the VP accrual flush')
+loop_lag = LoopLagMonitor(registry.histogram(
+    'vpbot_event_loop_lag_seconds', 'How late the event loop wakes a sleeping task'))
+
+registry.gauge('vpbot_dm_queue_depth', 'DM notifications waiting', lambda: notifier.depth)
+registry.gauge('vpbot_dm_notifications_total', 'DM notifications by outcome',
+               lambda: notifier.metrics, ('outcome',), kind='counter')
+registry.gauge('vpbot_ledger_ops_total', 'Ledger operations by type',
+               lambda: ledger.ops, ('op',), kind='counter')
+registry.gauge('vpbot_linked_accounts', 'Linked accounts', lambda: len(linked_accounts))
+registry.gauge('vpbot_growid_index_bytes', 'Memory held by the GrowID index by part',
+               reverse_links.stats, ('part',))
+registry.gauge('vpbot_voice_sessions', 'Active VP sessions', lambda: len(sessions))
+registry.gauge('vpbot_voice_sessions_paused', 'VP sessions paused as ineligible', lambda: sessions.paused)
+registry.gauge('vpbot_pending_link_codes', 'Outstanding link codes', lambda: len(pending_links))
+registry.gauge('vpbot_vp_minted', 'VP awarded over the rolling window',
+               earnings.minted_now, ('window',))
+registry.gauge('vpbot_stream_subscribers', 'Connected change stream clients',
+               lambda: change_stream.subscribers)
+registry.gauge('vpbot_stream_events_total', 'Change stream events published',
+               lambda: change_stream.seq, kind='counter')
+if game_sync is not None:
+    registry.gauge('vpbot_game_sync_outbox', 'Balance batches waiting for the game API',
+                   lambda: game_sync.depth)
+    registry.gauge('vpbot_game_sync_total', 'Game API write-back by outcome',
+                   lambda: game_sync.metrics, ('outcome',), kind='counter')
+
+admission = Admission(
+    SOURCE_RATE,
+    MAX_INFLIGHT,
+    MAX_BODY,
+    body_limits={'/webhook/vp/check/batch': MAX_BATCH_BODY, '/webhook/gems/check/batch': MAX_BATCH_BODY},
+    growid_rates={'/webhook/link': LINK_RATE, '/webhook/vp/spend': SPEND_RATE},
+    priority=('/webhook/vp/spend',),
+    overloaded=lambda: loop_lag.last > MAX_LAG,
+    trusted=[source.strip() for source in TRUSTED_SOURCES if source.strip()],
+    trust_proxy=TRUST_PROXY,
+    max_connections=MAX_CONNECTIONS
+)
+registry.gauge('vpbot_admission_rejected_total', 'Webhook requests turned away by reason',
+               lambda: admission.rejected, ('reason',), kind='counter')
+registry.gauge('vpbot_webhook_inflight', 'Webhook requests in flight', lambda: admission.inflight)
+registry.gauge('vpbot_webhook_connections', 'Open change streams and sockets', lambda: admission.connections)
+registry.gauge('vpbot_runtime_info', 'Event loop and JSON codec in use',
+               lambda: {(runtime.LOOP, runtime.JSON): 1}, ('loop', 'json'))
+
+event_streams = set()  # SSE handler tasks, cancelled on shutdown
+open_sockets = set()  # WebSocketResponse, closed on shutdown
+profiler = None  # SamplingProfiler for the event loop thread, created on first use
+cpu_pool = ThreadPoolExecutor(CPU_WORKERS, thread_name_prefix='vpbot-cpu')  # off-loop CPU work, not the default executor fsyncs use
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    resource = request.match_info.route.resource
+    route = resource.canonical if resource is not None else 'unmatched'
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        # Long-lived routes would only measure the connection lifetime
+        if route not in ('/webhook/ws', '/webhook/events'):
+            webhook_latency.observe(time.perf_counter() - started, route)
+        webhook_requests.inc(route, status)
+
+async def handle_metrics(request):
+    return web.Response(
+        text=registry.render(),
+        headers={'Content-Type': 'text/plain; version=0.0.4'}
+    )
+
+async def handle_profile(request):
+    """Sample the event loop for ?seconds=N and return folded stacks"""
+    global profiler
+    if request.headers.get('Authorization') != f'Bearer {ADMIN_TOKEN}':
+        return web.Response(status=401, text='Unauthorized')
+    
+    seconds = min(float(request.query.get('seconds', '10')), 120.0)
+    if profiler is None:
+        profiler = SamplingProfiler(threading.get_ident())
+    if not profiler.start():
+        return web.Response(status=409, text='Profiler already running')
+    
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await asyncio.to_thread(profiler.stop)
+    
+    return web.Response(text=profiler.folded())
 
 # ============= WEBHOOK HANDLERS =============
-async def handle_link_request(request):
-    """Link request from game"""
+class BadRequest(Exception):
+    """Malformed webhook body, answered with 400"""
+
+async def read_json(request):
+    """JSON object body, raises BadRequest"""
     try:
-        data = await request.json()
-        growid = data.get('growid')
-        code = data.get('code')
-        
-        print(f"\n[WEBHOOK] 🔗 Link request")
-        print(f"[WEBHOOK] GrowID: {growid}")
-        print(f"[WEBHOOK] Code: {code}")
-        
-        if not growid or not code:
-            return web.json_response({
-                'success': False,
-                'error': 'Missing data'
-            })
-        
-        growid_lower = growid.lower()
-        
-        # Check if already linked
-        if growid_lower in reverse_links:
-            discord_id = reverse_links[growid_lower]
-            account = linked_accounts.get(discord_id)
-            
-            return web.json_response({
-                'success': False,
-                'error': 'already_linked',
-                'discord_id': discord_id,
-                'total_vp': account.get('total_vp', 0) if account else 0
-            })
-        
-        # Store pending link
-        pending_links[code.upper()] = {
-            'growid': growid,
-            'timestamp': datetime.now()
+        data = runtime.loads(await request.read())
+    except ValueError:
+        raise BadRequest('Invalid JSON') from None
+    if not isinstance(data, dict):
+        raise BadRequest('Expected a JSON object')
+    return data
+
+def webhook_error(e, what):
+    """Response for an exception raised in a handler, internals stay in the log"""
+    if isinstance(e, BadRequest):
+        return runtime.json_response({'success': False, 'error': str(e)}, status=400)
+    log_webhook.exception(f"{what} failed")
+    return runtime.json_response({'success': False, 'error': 'Internal error'}, status=500)
+
+def register_link_code(growid, code):
+    """Store a pending link code, shared by the HTTP and socket routes"""
+    if not isinstance(growid, str) or not isinstance(code, str) or not growid or not code:
+        return {
+            'success': False,
+            'error': 'Missing data'
         }
+    
+    if not linkable(growid):
+        return {
+            'success': False,
+            'error': 'Invalid GrowID'
+        }
+    
+    # Checked before anything is logged or stored, the store caps codes but not their size
+    if len(code) != LINK_CODE_LENGTH or not code.isascii() or not code.isalnum():
+        return {
+            'success': False,
+            'error': 'Invalid code'
+        }
+    
+    log_webhook.info("🔗 Link request", extra={'growid': growid, 'code': code})
+    
+    growid_lower = growid.lower()
+    
+    # Check if already linked
+    if growid_lower in reverse_links:
+        discord_id = reverse_links[growid_lower]
+        account = linked_accounts.get(discord_id)
         
-        print(f"[WEBHOOK] ✅ Stored: {code} -> {growid}")
-        
-        return web.json_response({
-            'success': True,
-            'message': 'Code registered'
-        })
+        return {
+            'success': False,
+            'error': 'already_linked',
+            'discord_id': str(discord_id),
+            'total_vp': account.total_vp if account else 0
+        }
+    
+    # Store pending link, oldest code of this GrowID is dropped past the cap
+    if not pending_links.put(code.upper(), growid, growid_lower):
+        return {
+            'success': False,
+            'error': 'Too many pending codes'
+        }
+    
+    log_webhook.info("✅ Link code stored", extra={'growid': growid, 'code': code})
+    
+    return {
+        'success': True,
+        'message': 'Code registered'
+    }
+
+async def handle_link_request(request):
+    """Link request from game"""
+    try:
+        data = await read_json(request)
+        return runtime.json_response(register_link_code(data.get('growid'), data.get('code')))
         
     except Exception as e:
-        print(f"[WEBHOOK ERROR] {e}")
-        return web.json_response({'success': False, 'error': str(e)}, status=500)
+        return webhook_error(e, "Link request")
+
+def vp_status(growid, settle=True):
+    """VP balance lookup shared by the single and batch routes
+
+    Batches settle on the loop first with `settle_batch()` and pass
+    settle=False, so the lookup only reads and may run in the CPU pool.
+    """
+    discord_id = reverse_links.lookup(growid)
+    
+    account = linked_accounts.get(discord_id)
+    
+    if account is None:
+        return {
+            'success': False,
+            'error': 'Not linked'
+        }
+    
+    if settle:
+        settle_vp(discord_id)
+    
+    return {
+        'success': True,
+        'growid': account.growid,
+        'total_vp': account.total_vp,
+        'discord_id': str(discord_id)
+    }
 
 async def handle_vp_check(request):
     """VP check from game"""
     try:
-        data = await request.json()
-        growid = data.get('growid')
-        
-        growid_lower = growid.lower() if growid else None
-        discord_id = reverse_links.get(growid_lower)
-        
-        if not discord_id or discord_id not in linked_accounts:
-            return web.json_response({
-                'success': False,
-                'error': 'Not linked'
-            })
-        
-        account = linked_accounts[discord_id]
-        
-        return web.json_response({
-            'success': True,
-            'growid': account['growid'],
-            'total_vp': account['total_vp'],
-            'discord_id': discord_id
-        })
+        data = await read_json(request)
+        return runtime.json_response(vp_status(data.get('growid')))
         
     except Exception as e:
-        return web.json_response({'success': False, 'error': str(e)}, status=500)
+        return webhook_error(e, "VP check")
+
+async def spend_vp(growid, amount, expected=None, key=None):
+    """Debit VP, returns (response, http_status)
+
+    Retries carrying the same idempotency `key` get the original result
+    instead of a second debit.
+    """
+    log_webhook.info("💸 VP spend request", extra={'growid': growid, 'amount': amount})
+    
+    if not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0:
+        return {
+            'success': False,
+            'error': 'Invalid amount'
+        }, 400
+    
+    growid_lower = fold(growid)
+    discord_id = reverse_links.get(growid_lower)
+    
+    if discord_id not in linked_accounts:
+        return {
+            'success': False,
+            'error': 'Not linked'
+        }, 200
+    
+    if key:
+        cache_key = (growid_lower, str(key))
+        prior = spend_results.get(cache_key)
+        if prior is not None:
+            if prior['spent'] != amount:
+                return {
+                    'success': False,
+                    'error': 'Idempotency key reused with a different amount'
+                }, 409
+            # The original debit may still be waiting on its group commit
+            await ledger.sync(discord_id)
+            return dict(prior, replayed=True), 200
+    
+    # Accrued VP is spendable even if the flush hasn't run yet
+    settle_vp(discord_id)
+    
+    # Check and deduct in one step, no await in between
+    success, balance = ledger.spend(discord_id, amount, expected)
+    
+    if not success:
+        return {
+            'success': False,
+            'error': 'Insufficient VP' if balance < amount else 'Balance changed',
+            'current': balance
+        }, 200
+    
+    result = {
+        'success': True,
+        'spent': amount,
+        'remaining': balance
+    }
+    if key:
+        spend_results.set(cache_key, result)
+    change_stream.publish('balance', {
+        'growid': linked_accounts[discord_id].growid,
+        'total_vp': balance,
+        'delta': -amount
+    })
+    leaderboard.update(discord_id, balance + amount, balance)
+    if game_sync is not None:
+        game_sync.record(linked_accounts[discord_id].growid, -amount, balance)
+    
+    await ledger.sync(discord_id)
+    
+    log_webhook.info("✅ VP spent", extra={'growid': growid, 'amount': amount, 'remaining': balance})
+    
+    return result, 200
 
 async def handle_vp_spend(request):
-    """Spend VP from game"""
+    """Spend VP from game, idempotency key in body or Idempotency-Key header"""
     try:
-        data = await request.json()
-        growid = data.get('growid')
-        amount = data.get('amount', 0)
-        
-        print(f"[WEBHOOK] 💸 VP Spend request")
-        print(f"[WEBHOOK] GrowID: {growid} | Amount: {amount}")
+        data = await read_json(request)
+        result, status = await spend_vp(
+            data.get('growid'),
+            data.get('amount', 0),
+            data.get('expected_vp'),
+            data.get('idempotency_key') or request.headers.get('Idempotency-Key')
+        )
+        return runtime.json_response(result, status=status)
         
-        growid_lower = growid.lower() if growid else None
-        discord_id = reverse_links.get(growid_lower)
+    except Exception as e:
+        return webhook_error(e, "VP spend")
+
+def gems_status(growid, amount):
+    """Gems boost lookup shared by the single and batch routes"""
+    discord_id = reverse_links.lookup(growid)
+    
+    # Check if in a gems channel, the multiplier stacks channel, roles and events.
+    # Unlinked GrowIDs, most gems checks, stop at the index miss
+    voice = None if discord_id is None else user_voice_data.get(discord_id)
+    if voice is not None and voice.gems_active:
+        if not isinstance(amount, (int, float)):
+            amount = 0
+        multiplier = gems_multiplier(voice)
+        return {
+            'success': True,
+            'bonus': int(amount * (multiplier - 1)),
+            'multiplier': multiplier,
+            'active': True
+        }
+    
+    return {
+        'success': True,
+        'bonus': 0,
+        'active': False
+    }
+
+async def handle_gems_check(request):
+    """Check gems boost status"""
+    try:
+        data = await read_json(request)
+        return runtime.json_response(gems_status(data.get('growid'), data.get('amount', 0)))
         
-        if not discord_id or discord_id not in linked_accounts:
-            return web.json_response({
+    except Exception as e:
+        return webhook_error(e, "Gems check")
+
+# ============= BATCH WEBHOOKS =============
+def read_batch(data):
+    """Validate the `growids` list of a batch request, None if invalid"""
+    growids = data.get('growids')
+    if not isinstance(growids, list) or len(growids) > MAX_BATCH_SIZE:
+        return None
+    return growids
+
+def wants_ndjson(request):
+    return request.query.get('stream') == '1' or 'application/x-ndjson' in request.headers.get('Accept', '')
+
+async def stream_ndjson(request, results):
+    """Write results as newline-delimited JSON, flushing in chunks"""
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+    
+    lines = []
+    for result in results:
+        lines.append(runtime.dumps(result))
+        if len(lines) >= NDJSON_CHUNK:
+            lines.append(b'')
+            await response.write(b'\n'.join(lines))
+            lines = []
+    if lines:
+        lines.append(b'')
+        await response.write(b'\n'.join(lines))
+    
+    await response.write_eof()
+    return response
+
+async def offload(fn, *args):
+    """Run CPU-bound `fn` in the CPU pool
+
+    The GIL still runs one thread at a time, but the loop gets it back every
+    switch interval (5 ms) instead of waiting for `fn` to finish.  `fn` may
+    only read shared state.
+    """
+    return await asyncio.get_running_loop().run_in_executor(cpu_pool, fn, *args)
+
+def settle_batch(growids):
+    """Credit what a batch's accounts accrued so far, in one credit pass on the loop"""
+    now = time.monotonic()
+    settled = []
+    for growid in growids:
+        discord_id = reverse_links.lookup(growid)
+        if discord_id in sessions.sessions:
+            periods = sessions.settle(discord_id, now)
+            if periods:
+                settled.append((discord_id, periods))
+    if settled:
+        credit_periods(settled, now)
+
+def vp_statuses(growids):
+    """Read-only VP lookups for a settled batch"""
+    return [vp_status(growid, settle=False) for growid in growids]
+
+def batch_body(build):
+    return runtime.dumps({'success': True, 'results': build()})
+
+async def batch_response(size, build):
+    """Batch response, built and encoded in the CPU pool past OFFLOAD_BATCH GrowIDs"""
+    if OFFLOAD_BATCH and size >= OFFLOAD_BATCH:
+        body = await offload(batch_body, build)
+    else:
+        body = batch_body(build)
+    return web.Response(body=body, content_type='application/json')
+
+async def handle_vp_check_batch(request):
+    """Bulk VP check: {"growids": [...]} -> results in request order"""
+    try:
+        growids = read_batch(await read_json(request))
+        if growids is None:
+            return runtime.json_response({
                 'success': False,
-                'error': 'Not linked'
-            })
+                'error': f'growids must be a list of at most {MAX_BATCH_SIZE}'
+            }, status=400)
         
-        account = linked_accounts[discord_id]
+        settle_batch(growids)
+        if wants_ndjson(request):
+            return await stream_ndjson(request, (vp_status(growid, settle=False) for growid in growids))
+        
+        return await batch_response(len(growids), lambda: vp_statuses(growids))
         
-        if account['total_vp'] < amount:
-            return web.json_response({
+    except Exception as e:
+        return webhook_error(e, "Batch VP check")
+
+async def handle_gems_check_batch(request):
+    """Bulk gems check: {"growids": [growid | {growid, amount}], "amount": default}"""
+    try:
+        data = await read_json(request)
+        growids = read_batch(data)
+        if growids is None:
+            return runtime.json_response({
                 'success': False,
-                'error': 'Insufficient VP',
-                'current': account['total_vp']
-            })
+                'error': f'growids must be a list of at most {MAX_BATCH_SIZE}'
+            }, status=400)
         
-        # Deduct VP
-        account['total_vp'] -= amount
+        default_amount = data.get('amount', 0)
+        results = (
+            gems_status(item.get('growid'), item.get('amount', default_amount))
+            if isinstance(item, dict) else gems_status(item, default_amount)
+            for item in growids
+        )
         
-        print(f"[WEBHOOK] ✅ Spent {amount} VP | Remaining: {account['total_vp']}")
+        if wants_ndjson(request):
+            return await stream_ndjson(request, results)
         
-        return web.json_response({
-            'success': True,
-            'spent': amount,
-            'remaining': account['total_vp']
-        })
+        return await batch_response(len(growids), lambda: list(results))
         
     except Exception as e:
-        return web.json_response({'success': False, 'error': str(e)}, status=500)
+        return webhook_error(e, "Batch gems check")
 
-async def handle_gems_check(request):
-    """Check gems boost status"""
+# ============= SOCKET CHANNEL =============
+def socket_batch(status, args):
+    growids = read_batch(args)
+    if growids is None:
+        return {
+            'success': False,
+            'error': f'growids must be a list of at most {MAX_BATCH_SIZE}'
+        }, 400
+    return {'success': True, 'results': [status(item) for item in growids]}, 200
+
+async def socket_vp_batch(args):
+    growids = read_batch(args)
+    if growids is not None:
+        settle_batch(growids)  # on the loop, the lookups below only read
+    return await socket_offloaded(lambda a: socket_batch(lambda g: vp_status(g, settle=False), a), args)
+
+def socket_gems_batch(args):
+    default_amount = args.get('amount', 0)
+    return socket_batch(
+        lambda item: gems_status(item.get('growid'), item.get('amount', default_amount))
+        if isinstance(item, dict) else gems_status(item, default_amount),
+        args
+    )
+
+async def socket_offloaded(handler, args):
+    """Large socket batches are answered from the CPU pool, like the HTTP routes"""
+    growids = args.get('growids')
+    if OFFLOAD_BATCH and isinstance(growids, list) and len(growids) >= OFFLOAD_BATCH:
+        return await offload(handler, args)
+    return handler(args)
+
+SOCKET_HANDLERS = {
+    protocol.OP_LINK: lambda args: (register_link_code(args.get('growid'), args.get('code')), 200),
+    protocol.OP_VP_CHECK: lambda args: (vp_status(args.get('growid')), 200),
+    protocol.OP_GEMS_CHECK: lambda args: (gems_status(args.get('growid'), args.get('amount', 0)), 200)
+}
+
+SOCKET_ASYNC_HANDLERS = {
+    protocol.OP_VP_SPEND: lambda args: spend_vp(
+        args.get('growid'),
+        args.get('amount', 0),
+        args.get('expected_vp'),
+        args.get('idempotency_key')
+    ),
+    protocol.OP_VP_CHECK_BATCH: socket_vp_batch,
+    protocol.OP_GEMS_CHECK_BATCH: lambda args: socket_offloaded(socket_gems_batch, args)
+}
+
+SOCKET_ROUTES = {
+    protocol.OP_LINK: '/webhook/link',
+    protocol.OP_VP_SPEND: '/webhook/vp/spend'
+}  # ops drawing on the per-GrowID buckets of these HTTP routes
+
+def admit_socket_op(op, args):
+    path = SOCKET_ROUTES.get(op)
+    return admission.take_growid(path, args.get('growid')) if path else 0
+
+async def handle_socket(request):
+    """Persistent pipelined channel for the game server"""
+    # A frame may carry a batch, capped like the batch routes' bodies
+    ws = web.WebSocketResponse(protocols=protocol.PROTOCOLS, heartbeat=30, max_msg_size=MAX_BATCH_BODY)
+    await ws.prepare(request)
+    
+    log_webhook.info("🔌 Socket connected", extra={'protocol': ws.ws_protocol or protocol.PROTOCOLS[0]})
+    open_sockets.add(ws)
     try:
-        data = await request.json()
-        growid = data.get('growid')
-        amount = data.get('amount', 0)
-        
-        growid_lower = growid.lower() if growid else None
-        discord_id = reverse_links.get(growid_lower)
+        await protocol.serve(ws, SOCKET_HANDLERS, SOCKET_ASYNC_HANDLERS, socket_latency.observe,
+                             admit=admit_socket_op, max_inflight=SOCKET_MAX_INFLIGHT)
+    finally:
+        open_sockets.discard(ws)
+    log_webhook.info("🔌 Socket closed")
+    
+    return ws
+
+async def close_streams(app):
+    """Close SSE streams and sockets on shutdown, runner.cleanup() would wait for them"""
+    log_webhook.info("🔌 Closing streams", extra={'streams': len(event_streams), 'sockets': len(open_sockets)})
+    for task in list(event_streams):
+        task.cancel()
+    # Sockets finish their in-flight spends once the close handshake ends the read loop
+    await asyncio.gather(*(
+        ws.close(code=WSCloseCode.GOING_AWAY, message=b'Server shutting down')
+        for ws in list(open_sockets)
+    ), return_exceptions=True)
+
+def create_webhook_app():
+    """Build the webhook application"""
+    app = web.Application(client_max_size=MAX_BATCH_BODY, middlewares=[
+        metrics_middleware,
+        admission.middleware(
+            exempt=('/', '/health', '/stats', '/metrics', '/debug/profile'),
+            untracked=('/webhook/ws', '/webhook/events')
+        ),
+        lifecycle.middleware(
+            ungated=('/', '/health', '/stats', '/metrics', '/debug/profile'),
+            untracked=('/webhook/ws', '/webhook/events')
+        )
+    ])
+    
+    app.router.add_post('/webhook/link', handle_link_request)
+    app.router.add_post('/webhook/vp/check', handle_vp_check)
+    app.router.add_post('/webhook/vp/spend', handle_vp_spend)
+    app.router.add_post('/webhook/gems/check', handle_gems_check)
+    app.router.add_post('/webhook/vp/check/batch', handle_vp_check_batch)
+    app.router.add_post('/webhook/gems/check/batch', handle_gems_check_batch)
+    app.router.add_get('/webhook/ws', handle_socket)
+    app.router.add_get('/webhook/events', handle_events)
+    app.router.add_get('/', lambda req: web.Response(text="VP Bot Webhook Running!"))
+    app.router.add_get('/health', handle_health)
+    app.router.add_get('/stats', lambda req: runtime.json_response({'notifications': notifier.stats()}))
+    app.router.add_get('/metrics', handle_metrics)
+    if ADMIN_TOKEN:
+        app.router.add_get('/debug/profile', handle_profile)
+    app.on_shutdown.append(close_streams)
+    return app
+
+async def handle_health(request):
+    """503 while starting or draining, so deploys only route to a ready process"""
+    if lifecycle.draining:
+        return web.Response(text="DRAINING", status=503)
+    if not lifecycle.ready:
+        return web.Response(text="STARTING", status=503)
+    return web.Response(text="OK")
+
+async def start_webhook_server():
+    """Start webhook server"""
+    runner = web.AppRunner(create_webhook_app(), shutdown_timeout=DRAIN_TIMEOUT)
+    await runner.setup()
+    site = web.TCPSite(runner, '0.0.0.0', WEBHOOK_PORT)
+    await site.start()
+    
+    log_webhook.info("🚀 Server running", extra={'port': WEBHOOK_PORT})
+    return runner
+
+# ============= CHANGE STREAM =============
+def gems_multiplier(voice, now=None):
+    """Combined gems multiplier of a boosting user, with running events"""
+    return rules.gems_now(voice.multiplier, rules.event_boost(time.time() if now is None else now))
+
+def publish_boost(discord_id, active):
+    """Push a boost transition or multiplier change to the change stream and shared table"""
+    account = linked_accounts.get(discord_id)
+    if account is None:
+        return
+    voice = user_voice_data.get(discord_id)
+    multiplier = gems_multiplier(voice) if active and voice is not None else 1.0
+    change_stream.publish('boost', {
+        'growid': account.growid,
+        'active': active,
+        'multiplier': multiplier
+    })
+    if gems_table is None:
+        return
+    if not active:
+        gems_table.revoke(account.growid)
+    else:
+        lease_boost(account, multiplier)
+
+def lease_boost(account, multiplier):
+    if not gems_table.publish(account.growid, multiplier, time.time() + GEMS_LEASE):
+        log_voice.warning("Gems table full", extra={'growid': account.growid})
+
+@tasks.loop(seconds=GEMS_LEASE // 2)
+async def renew_gems_leases():
+    """Keep published boosts alive, they lapse on their own if the bot stops"""
+    now = time.time()
+    for discord_id, voice in user_voice_data.items():
+        account = linked_accounts.get(discord_id)
+        if account is not None:
+            lease_boost(account, gems_multiplier(voice, now))
+
+async def handle_events(request):
+    """Server-sent events: boost transitions and balance changes"""
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache'
+    })
+    await response.prepare(request)
+    
+    last_id = request.headers.get('Last-Event-ID') or request.query.get('since')
+    seq = change_stream.resume_point(last_id)
+    change_stream.subscribers += 1
+    event_streams.add(asyncio.current_task())
+    try:
+        if seq is None:
+            seq = change_stream.seq
+            await response.write(change_stream.reset_frame())
         
-        if not discord_id:
-            return web.json_response({
-                'success': True,
-                'bonus': 0,
-                'active': False
+        while True:
+            if not await change_stream.wait(seq, STREAM_KEEPALIVE):
+                await response.write(b': keepalive\n\n')
+                continue
+            
+            chunk = change_stream.read(seq)
+            if chunk is None:
+                # Fell behind the history, the client has to reload
+                seq = change_stream.seq
+                await response.write(change_stream.reset_frame())
+                continue
+            seq = change_stream.seq
+            await response.write(chunk)
+    except ConnectionResetError:
+        pass
+    finally:
+        change_stream.subscribers -= 1
+        event_streams.discard(asyncio.current_task())
+    return response
+
+# ============= CLEANUP =============
+@tasks.loop(seconds=60)
+async def cleanup_expired_links():
+    """Clean expired codes"""
+    expired = pending_links.evict_expired()
+    
+    if expired:
+        log_link.info("Removed expired codes", extra={'count': expired})
+
+# ============= RULES RELOAD =============
+def apply_rules(new):
+    """Swap in new rules and move everyone in voice onto them"""
+    global rules
+    if new.interval != sessions.interval:
+        log_bot.warning("Rules interval change needs a restart", extra={
+            'running': sessions.interval,
+            'configured': new.interval
+        })
+        new.interval = sessions.interval
+    
+    # Unpaid time is paid at the old rates
+    now = time.monotonic()
+    credit_periods([(d, sessions.settle(d, now)) for d in list(sessions.sessions)], now)
+    
+    rules = new
+    static_embeds.clear()
+    if bot.is_ready():
+        reconcile_voice()
+    log_bot.info("📜 Rules loaded", extra={
+        'channels': len(rules.channels),
+        'roles': len(rules.roles),
+        'events': len(rules.events)
+    })
+
+@tasks.loop(seconds=RULES_POLL)
+async def watch_rules():
+    """Reload the rules file when it changes, republish boosts when an event starts or ends"""
+    global rules_mtime, published_event
+    try:
+        mtime = os.stat(RULES_FILE).st_mtime
+    except FileNotFoundError:
+        mtime = None
+    
+    if mtime != rules_mtime:
+        try:
+            new, rules_mtime = read_rules()
+        except (OSError, RulesError) as e:
+            rules_mtime = mtime  # don't retry until the file changes again
+            log_bot.error("Rules not reloaded, keeping the current ones", extra={'error': str(e)})
+        else:
+            apply_rules(new)
+            return
+    
+    event = rules.event_boost(time.time())
+    if event is not published_event:
+        changed = published_event is not None and event[1] != published_event[1]
+        published_event = event
+        if changed:
+            for discord_id in user_voice_data:
+                publish_boost(discord_id, True)
+            log_bot.info("🎉 Events changed", extra={'running': list(event[2]), 'boosting': len(user_voice_data)})
+
+# ============= EVENTS =============
+@bot.event
+async def on_ready():
+    log_bot.info("🎮 Logged in", extra={
+        'user': bot.user.name,
+        'vp_channels': rules.vp_channels,
+        'gems_channels': rules.gems_channels,
+        'shards': bot.shard_count,
+        'ledger_partitions': LEDGER_PARTITIONS,
+        'vp_interval': sessions.interval,
+        'webhook_port': WEBHOOK_PORT
+    })
+    
+    reconcile_voice()
+    notifier.start()
+    if not vp_task.is_running():
+        vp_task.start()
+    if not cleanup_expired_links.is_running():
+        cleanup_expired_links.start()
+    if gems_table is not None and not renew_gems_leases.is_running():
+        renew_gems_leases.start()
+    if not watch_rules.is_running():
+        watch_rules.start()
+    
+    log_bot.info("🚀 Ready!")
+
+@bot.event
+async def on_resumed():
+    # Voice updates may have been missed while disconnected
+    reconcile_voice()
+
+@bot.event
+async def on_voice_state_update(member, before, after):
+    """Voice channel tracking, one rule lookup per event"""
+    if member.bot:
+        return
+    
+    discord_id = member.id
+    now = time.monotonic()
+    rule = rules.channels.get(after.channel.id) if after.channel else None
+    
+    if rule is not None and rules.roles:
+        role_boosts[discord_id] = rules.role_boost(role.id for role in member.roles)
+    
+    # VP channels
+    if rule is not None and rule.vp:
+        session = sessions.sessions.get(discord_id)
+        if session is None:
+            log_voice.info("💰 Joined VP channel", extra={'user': member.name, 'discord_id': discord_id})
+        elif session.channel_id != rule.channel_id:
+            settle_vp(discord_id, now)  # time so far is paid at the old channel's rate
+        sessions.join(discord_id, rule.channel_id, now)
+        if AFK_GATING:
+            apply_eligibility(eligibility.update(discord_id, rule.channel_id, voice_active(after)), now)
+    elif discord_id in sessions:
+        # Whole periods not yet flushed are still owed
+        settle_vp(discord_id, now)
+        sessions.leave(discord_id, now)
+        if AFK_GATING:
+            apply_eligibility(eligibility.remove(discord_id), now)
+        log_voice.info("💰 Left VP channel", extra={'user': member.name, 'discord_id': discord_id})
+    
+    # Gems channels - active only while in one
+    multiplier = rules.gems_base(rule.channel_id, role_boosts.get(discord_id, NO_BOOST)) if rule else 1.0
+    voice = user_voice_data.get(discord_id)
+    if multiplier != 1.0:
+        if voice is None:
+            voice = user_voice_data[discord_id] = VoiceState()
+        if not voice.gems_active or voice.multiplier != multiplier:
+            activated = not voice.gems_active
+            voice.gems_active = True
+            voice.multiplier = multiplier
+            publish_boost(discord_id, True)
+            
+            if activated:
+                log_voice.info("💎 Gems boost active", extra={'user': member.name, 'discord_id': discord_id})
+                if discord_id in linked_accounts:
+                    notifier.notify(discord_id, 'gems', {'multiplier': gems_multiplier(voice)})
+    
+    elif voice is not None:
+        del user_voice_data[discord_id]
+        publish_boost(discord_id, False)
+        log_voice.info("💎 Gems boost deactivated", extra={'user': member.name, 'discord_id': discord_id})
+    
+    if rule is None:
+        role_boosts.pop(discord_id, None)
+
+@bot.event
+async def on_member_update(before, after):
+    """Role changes apply right away to members in a reward channel"""
+    if before.roles == after.roles or not rules.roles:
+        return
+    if after.id in role_boosts and after.voice is not None:
+        settle_vp(after.id)  # time so far is paid at the old rate
+        await on_voice_state_update(after, after.voice, after.voice)
+
+# ============= NOTIFICATIONS =============
+def merge_vp_earned(old, new):
+    """Fold several pending VP awards into one digest"""
+    return {
+        'amount': old['amount'] + new['amount'],
+        'count': old['count'] + new['count'],
+        'total_vp': new['total_vp'],
+        'growid': new['growid'],
+        'elapsed': new['elapsed']
+    }
+
+def build_vp_embed(payload):
+    amount = payload['amount']
+    description = f"You earned **{amount} VP** for staying in the voice channel!"
+    if payload['count'] > 1:
+        description = f"You earned **{amount} VP** over {payload['count']} intervals in the voice channel!"
+    
+    embed = discord.Embed(
+        title="💰 VP Earned!",
+        description=description,
+        color=discord.Color.gold()
+    )
+    embed.add_field(
+        name="Amount Earned",
+        value=f"**+{amount} VP**",
+        inline=True
+    )
+    embed.add_field(
+        name="Total VP",
+        value=f"**{payload['total_vp']:,} VP**",
+        inline=True
+    )
+    embed.add_field(
+        name="Time in Channel",
+        value=f"{int(payload['elapsed'] / 60)} minutes",
+        inline=True
+    )
+    embed.add_field(
+        name="GrowID",
+        value=f"`{payload['growid']}`",
+        inline=False
+    )
+    embed.set_footer(text="Stay in channel to keep earning!")
+    embed.timestamp = datetime.utcnow()
+    return embed
+
+def build_gems_embed(payload):
+    embed = discord.Embed(
+        title="💎 Gems Boost Activated!",
+        description="Your gems multiplier is now active!",
+        color=discord.Color.green()
+    )
+    embed.add_field(
+        name="Multiplier",
+        value=f"**{payload['multiplier']}x**",
+        inline=True
+    )
+    embed.add_field(
+        name="Duration",
+        value="While in channel",
+        inline=True
+    )
+    embed.set_footer(text="Leave channel to deactivate")
+    return embed
+
+EMBED_BUILDERS = {
+    'vp': build_vp_embed,
+    'gems': build_gems_embed
+}
+
+async def send_notification(discord_id, kind, payload):
+    """Deliver one queued DM"""
+    user = bot.get_user(discord_id) or await bot.fetch_user(discord_id)
+    await user.send(embed=EMBED_BUILDERS[kind](payload))
+
+notifier = NotificationQueue(send_notification, merge={'vp': merge_vp_earned})
+
+# ============= VP ACCRUAL =============
+def credit_periods(settled, now):
+    """Credit settled (discord_id, periods) pairs and queue DMs, returns accounts credited
+
+    Rates come from each session's channel rule, the member's roles and the
+    events running now.  Sessions must still be open.
+    """
+    event = rules.event_boost(time.time())
+    by_amount = {}
+    for discord_id, periods in settled:
+        if periods:
+            session = sessions.sessions.get(discord_id)
+            per_interval = rules.vp_per_interval(
+                session.channel_id if session else None,
+                role_boosts.get(discord_id, NO_BOOST),
+                event
+            )
+            if per_interval:
+                by_amount.setdefault((per_interval * periods, periods), []).append(discord_id)
+    
+    credited = 0
+    for (amount, periods), discord_ids in by_amount.items():
+        for discord_id, account in ledger.award_many(discord_ids, amount):
+            session = sessions.sessions.get(discord_id)
+            notifier.notify(discord_id, 'vp', {
+                'amount': amount,
+                'count': periods,
+                'total_vp': account.total_vp,
+                'growid': account.growid,
+                'elapsed': now - session.joined if session else periods * sessions.interval
             })
-        
-        # Check if in gems channel
-        gems_active = user_voice_data[discord_id]['gems_active']
-        
-        if gems_active:
-            bonus = int(amount * (GEMS_MULTIPLIER - 1))
-            return web.json_response({
-                'success': True,
-                'bonus': bonus,
-                'multiplier': GEMS_MULTIPLIER,
-                'active': True
+            change_stream.publish('balance', {
+                'growid': account.growid,
+                'total_vp': account.total_vp,
+                'delta': amount
             })
+            leaderboard.update(discord_id, account.total_vp - amount, account.total_vp)
+            earnings.add(discord_id, amount)
+            if game_sync is not None:
+                game_sync.record(account.growid, amount, account.total_vp)
+            log_award.info("✅ VP awarded", extra={
+                'discord_id': discord_id,
+                'amount': amount,
+                'total_vp': account.total_vp
+            })
+            credited += 1
+    return credited
+
+def apply_eligibility(changes, now):
+    """Pause or resume sessions, paying what paused ones are owed"""
+    owed = []
+    for discord_id, eligible in changes:
+        periods = sessions.set_eligible(discord_id, eligible, now)
+        if periods:
+            owed.append((discord_id, periods))
+    if owed:
+        credit_periods(owed, now)
+
+def settle_vp(discord_id, now=None):
+    """Credit VP accrued so far, before a balance is read or spent"""
+    now = time.monotonic() if now is None else now
+    periods = sessions.settle(discord_id, now)
+    if periods:
+        credit_periods([(discord_id, periods)], now)
+
+def reconcile_voice():
+    """Resync sessions, role boosts and gems boosts with who is actually in voice"""
+    now = time.monotonic()
+    
+    members = {}  # discord_id -> (member, channel_id) in any reward channel
+    for channel_id in rules.channels:
+        channel = bot.get_channel(channel_id)
+        if channel:
+            for member in channel.members:
+                if not member.bot:
+                    members[member.id] = (member, channel_id)
+    
+    present = {d: c for d, (_, c) in members.items() if rules.channels[c].vp}
+    # Pay sessions that end or move at their current rate first
+    credit_periods([
+        (discord_id, sessions.settle(discord_id, now))
+        for discord_id, session in sessions.sessions.items()
+        if present.get(discord_id) != session.channel_id
+    ], now)
+    started, ended = sessions.reconcile(present, now)
+    
+    if AFK_GATING:
+        eligibility.clear()
+        for discord_id, channel_id in present.items():
+            voice = members[discord_id][0].voice
+            eligibility.update(discord_id, channel_id, voice is None or voice_active(voice))
+        apply_eligibility([(d, eligibility.eligible(d)) for d in present], now)
+    
+    role_boosts.clear()
+    if rules.roles:
+        for discord_id, (member, _) in members.items():
+            role_boosts[discord_id] = rules.role_boost(role.id for role in member.roles)
+    
+    boosting = {}
+    for discord_id, (_, channel_id) in members.items():
+        multiplier = rules.gems_base(channel_id, role_boosts.get(discord_id, NO_BOOST))
+        if multiplier != 1.0:
+            boosting[discord_id] = multiplier
+    for discord_id in [d for d in user_voice_data if d not in boosting]:
+        del user_voice_data[discord_id]
+        publish_boost(discord_id, False)
+    for discord_id, multiplier in boosting.items():
+        voice = user_voice_data.get(discord_id)
+        if voice is None:
+            voice = user_voice_data[discord_id] = VoiceState()
+            voice.gems_active = True
+        elif voice.multiplier == multiplier:
+            continue
+        voice.multiplier = multiplier
+        publish_boost(discord_id, True)
+    
+    log_voice.info("🔄 Reconciled voice state", extra={
+        'joined': len(started),
+        'left': len(ended),
+        'boosting': len(boosting)
+    })
+
+@tasks.loop(seconds=VP_FLUSH_INTERVAL)
+async def vp_task():
+    """Coarse flush: credit every session that accrued a full interval"""
+    try:
+        # Critical section: no awaits between settling sessions and crediting them
+        with flush_duration.time():
+            now = time.monotonic()
+            settled = sessions.pop_due(now)
+            credited = credit_periods(settled, now) if settled else 0
         
-        return web.json_response({
-            'success': True,
-            'bonus': 0,
-            'active': False
-        })
-        
-    except Exception as e:
-        return web.json_response({'success': False, 'error': str(e)}, status=500)
+        if credited:
+            log_vp.info("✅ VP flush", extra={'credited': credited})
+    
+    except Exception:
+        log_vp.exception("VP flush failed")
+
+# ============= EMBEDS =============
+class FrozenEmbed(discord.Embed):
+    """Embed that serializes once, don't modify it after the first send"""
+    
+    _payload = None
+    
+    def to_dict(self):
+        if self._payload is None:
+            self._payload = super().to_dict()
+        return self._payload
+
+static_embeds = {}  # builder -> FrozenEmbed, clear() when the config changes
+EMBED_LINES = 10  # channels, roles or events listed per field
+DAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+profile_embeds = TTLCache(maxsize=10_000, ttl=PROFILE_CACHE_TTL)  # discord_id -> (stamp, FrozenEmbed)
+leaderboard_embeds = TTLCache(maxsize=1000, ttl=LEADERBOARD_CACHE_TTL)  # page -> FrozenEmbed
+
+def static_embed(builder):
+    """Embed that only depends on config, built on first use"""
+    embed = static_embeds.get(builder)
+    if embed is None:
+        embed = static_embeds[builder] = builder()
+    return embed
+
+def build_not_linked_embed():
+    embed = FrozenEmbed(
+        title="❌ Not Linked",
+        description="You haven't linked your account yet!",
+        color=discord.Color.red()
+    )
+    embed.add_field(
+        name="How to Link",
+        value="1. Type `/linkvp` in Growtopia\n"
+              "2. Use `/linkvp <code>` here",
+        inline=False
+    )
+    return embed
+
+def build_invalid_code_embed():
+    embed = FrozenEmbed(
+        title="❌ Invalid Code",
+        description="This code doesn't exist or has expired.",
+        color=discord.Color.red()
+    )
+    embed.add_field(
+        name="📝 Steps to Link",
+        value="1. Type `/linkvp` in Growtopia\n"
+              "2. Copy the 6-digit code\n"
+              "3. Use `/linkvp <code>` here within 5 minutes",
+        inline=False
+    )
+    return embed
 
-async def start_webhook_server():
-    """Start webhook server"""
-    app = web.Application()
+def describe_boost(vp, gems):
+    parts = [f"**{vp:g}x** VP" if vp != 1.0 else '', f"**{gems:g}x** gems" if gems != 1.0 else '']
+    return ", ".join(part for part in parts if part) or "no bonus"
+
+def describe_event(spec):
+    days = spec.get('days')
+    when = "Every day" if days is None or len(set(days)) == 7 else ", ".join(DAY_NAMES[d] for d in sorted(set(days)))
+    hours = f"{spec.get('start', '00:00')}-{spec.get('end', '24:00')}"
+    return f"**{spec.get('name', 'Event')}** • {when} {hours} • {describe_boost(spec.get('vp', 1.0), spec.get('gems', 1.0))}"
+
+def build_rewards_embed():
+    embed = FrozenEmbed(
+        title="🎁 Voice Rewards System",
+        description="Earn rewards by joining voice channels!",
+        color=discord.Color.gold()
+    )
     
-    app.router.add_post('/webhook/link', handle_link_request)
-    app.router.add_post('/webhook/vp/check', handle_vp_check)
-    app.router.add_post('/webhook/vp/spend', handle_vp_spend)
-    app.router.add_post('/webhook/gems/check', handle_gems_check)
-    app.router.add_get('/', lambda req: web.Response(text="VP Bot Webhook Running!"))
-    app.router.add_get('/health', lambda req: web.Response(text="OK"))
+    if rules.vp_channels:
+        embed.add_field(
+            name="💰 VP Channels",
+            value="\n".join(f"<#{c}> • **{rules.channels[c].vp} VP**" for c in rules.vp_channels[:EMBED_LINES]) + "\n"
+                  f"• Earn VP every **{sessions.interval // 60} minutes**\n"
+                  f"• Spend VP with `/vp` command in-game\n"
+                  f"• Get DM notifications when you earn VP",
+            inline=False
+        )
     
-    runner = web.AppRunner(app)
-    await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', WEBHOOK_PORT)
-    await site.start()
+    if rules.gems_channels:
+        embed.add_field(
+            name="💎 Gems Boost Channels",
+            value="\n".join(f"<#{c}> • **{rules.channels[c].gems}x gems**" for c in rules.gems_channels[:EMBED_LINES]) + "\n"
+                  f"• Active ONLY while in channel\n"
+                  f"• Automatically deactivates when you leave",
+            inline=False
+        )
+    
+    if rules.roles:
+        embed.add_field(
+            name="⭐ Role Bonuses",
+            value="\n".join(f"<@&{role_id}> • {describe_boost(vp, gems)}"
+                            for role_id, (vp, gems) in list(rules.roles.items())[:EMBED_LINES]),
+            inline=False
+        )
+    
+    if rules.events:
+        embed.add_field(
+            name="🎉 Events",
+            value="\n".join(describe_event(spec) for spec in rules.events[:EMBED_LINES]),
+            inline=False
+        )
+    
+    embed.add_field(
+        name="📝 How to Start",
+        value="1. Type `/linkvp` in Growtopia\n"
+              "2. Copy the 6-digit code\n"
+              "3. Use `/linkvp <code>` here\n"
+              "4. Join voice channels to earn!",
+        inline=False
+    )
     
-    print(f'\n[WEBHOOK] 🚀 Server running on port {WEBHOOK_PORT}')
+    embed.set_footer(text="Use /profile to check your stats")
+    return embed
 
-# ============= CLEANUP =============
-@tasks.loop(seconds=60)
-async def cleanup_expired_links():
-    """Clean expired codes"""
-    now = datetime.now()
-    expired = [code for code, data in pending_links.items() 
-               if (now - data['timestamp']).total_seconds() > 300]
+def build_help_embed():
+    embed = FrozenEmbed(
+        title="🤖 Bot Commands",
+        description="All available commands",
+        color=discord.Color.purple()
+    )
     
-    for code in expired:
-        del pending_links[code]
+    embed.add_field(
+        name="/linkvp <code>",
+        value="Link your Growtopia account",
+        inline=False
+    )
+    embed.add_field(
+        name="/profile",
+        value="View your stats and VP balance",
+        inline=False
+    )
+    embed.add_field(
+        name="/leaderboard [page]",
+        value="Top VP balances",
+        inline=False
+    )
+    embed.add_field(
+        name="/rank",
+        value="Your rank and recent earnings",
+        inline=False
+    )
+    embed.add_field(
+        name="/rewards",
+        value="View reward system information",
+        inline=False
+    )
+    embed.add_field(
+        name="/help",
+        value="Show this message",
+        inline=False
+    )
     
-    if expired:
-        print(f"[CLEANUP] Removed {len(expired)} expired codes")
+    embed.add_field(
+        name="🎮 In-Game Commands",
+        value="`/linkvp` - Get link code\n"
+              "`/vp` - Check and spend VP\n"
+              "`/vp <amount>` - Spend VP (coming soon)",
+        inline=False
+    )
+    return embed
 
-# ============= EVENTS =============
-@bot.event
-async def on_ready():
-    print(f'\n{"="*60}')
-    print(f'  🎮 DISCORD VP REWARDS BOT - PROFESSIONAL MODE')
-    print(f'{"="*60}')
-    print(f'[BOT] ✅ Logged in as {bot.user.name}')
-    print(f'[BOT] 💰 VP Channel: {VP_CHANNEL_ID}')
-    print(f'[BOT] 💎 Gems Channel: {GEMS_CHANNEL_ID}')
-    print(f'[BOT] ⏱️  VP Interval: {VP_INTERVAL}s ({VP_INTERVAL//60} min)')
-    print(f'[BOT] 🔗 Webhook: Port {WEBHOOK_PORT}')
-    print(f'{"="*60}\n')
+VP_STATUS = {
+    True: "✅ Earning VP",
+    False: "⏸️ Paused (muted, deafened or alone)",
+    None: "❌ Not in channel"
+}
+
+def profile_embed(user, account):
+    """Profile embed, reused until the balance, voice state or avatar changes"""
+    discord_id = user.id
+    session = sessions.sessions.get(discord_id)
+    earning = None if session is None else session.eligible  # None = not in a VP channel
+    voice = user_voice_data.get(discord_id)
+    boosting = voice is not None and voice.gems_active
+    avatar = user.display_avatar.url
     
-    if not vp_task.is_running():
-        vp_task.start()
-    if not cleanup_expired_links.is_running():
-        cleanup_expired_links.start()
+    stamp = (account.growid, account.total_vp, account.last_vp_time, earning, boosting, avatar)
+    cached = profile_embeds.get(discord_id)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    
+    embed = FrozenEmbed(
+        title="📊 Your Profile",
+        description=f"Stats for {user.mention}",
+        color=discord.Color.blue()
+    )
+    embed.set_thumbnail(url=avatar)
+    embed.add_field(name="GrowID", value=f"`{account.growid}`", inline=False)
+    embed.add_field(name="Total VP", value=f"**{account.total_vp:,} VP**", inline=True)
+    embed.add_field(
+        name="Linked Since",
+        value=f"<t:{int(account.linked_at)}:R>",
+        inline=True
+    )
+    embed.add_field(name="VP Status", value=VP_STATUS[earning], inline=True)
+    embed.add_field(name="Gems Boost", value="✅ Active" if boosting else "❌ Not active", inline=True)
+    
+    if account.last_vp_time:
+        embed.add_field(
+            name="Last VP",
+            value=f"<t:{int(account.last_vp_time)}:R>",
+            inline=True
+        )
     
-    print('[BOT] 🚀 Ready!\n')
+    embed.set_footer(text="Use VP with /vp command in-game")
+    embed.timestamp = datetime.utcnow()
+    
+    profile_embeds.set(discord_id, (stamp, embed))
+    return embed
 
-@bot.event
-async def on_voice_state_update(member, before, after):
-    """Voice channel tracking"""
-    if member.bot:
-        return
+def ensure_leaderboard():
+    """Leaderboard is built at startup, this covers a bot started without main()"""
+    if not leaderboard.built:
+        leaderboard.build(linked_accounts)
+
+def leaderboard_embed(page):
+    """Top balances page, shared by everyone for LEADERBOARD_CACHE_TTL"""
+    embed = leaderboard_embeds.get(page)
+    if embed is not None:
+        return embed
     
-    discord_id = str(member.id)
-    now = datetime.now()
-    
-    # VP Channel
-    if after.channel and after.channel.id == VP_CHANNEL_ID:
-        if user_voice_data[discord_id]['vp_start'] is None:
-            user_voice_data[discord_id]['vp_start'] = now
-            print(f"[VOICE] 💰 {member.name} joined VP channel")
-    elif before.channel and before.channel.id == VP_CHANNEL_ID:
-        user_voice_data[discord_id]['vp_start'] = None
-        print(f"[VOICE] 💰 {member.name} left VP channel")
-    
-    # Gems Channel - Active only when in channel
-    if after.channel and after.channel.id == GEMS_CHANNEL_ID:
-        if not user_voice_data[discord_id]['gems_active']:
-            user_voice_data[discord_id]['gems_active'] = True
-            print(f"[VOICE] 💎 {member.name} joined Gems channel - BOOST ACTIVE")
-            
-            if discord_id in linked_accounts:
-                try:
-                    embed = discord.Embed(
-                        title="💎 Gems Boost Activated!",
-                        description="Your gems multiplier is now active!",
-                        color=discord.Color.green()
-                    )
-                    embed.add_field(
-                        name="Multiplier",
-                        value=f"**{GEMS_MULTIPLIER}x**",
-                        inline=True
-                    )
-                    embed.add_field(
-                        name="Duration",
-                        value="While in channel",
-                        inline=True
-                    )
-                    embed.set_footer(text="Leave channel to deactivate")
-                    
-                    await member.send(embed=embed)
-                except:
-                    pass
-                    
-    elif before.channel and before.channel.id == GEMS_CHANNEL_ID:
-        user_voice_data[discord_id]['gems_active'] = False
-        print(f"[VOICE] 💎 {member.name} left Gems channel - BOOST DEACTIVATED")
-
-# ============= VP TASK =============
-@tasks.loop(seconds=VP_INTERVAL)
-async def vp_task():
-    """Award VP every interval"""
-    try:
-        channel = bot.get_channel(VP_CHANNEL_ID)
-        if not channel:
-            return
-        
-        now = datetime.now()
-        
-        for member in channel.members:
-            if member.bot:
-                continue
-            
-            discord_id = str(member.id)
-            
-            if discord_id not in linked_accounts:
-                continue
-            
-            start_time = user_voice_data[discord_id]['vp_start']
-            
-            if start_time:
-                elapsed = (now - start_time).total_seconds()
-                
-                if elapsed >= VP_INTERVAL:
-                    # Award VP
-                    account = linked_accounts[discord_id]
-                    account['total_vp'] += VP_AMOUNT
-                    account['last_vp_time'] = now
-                    
-                    print(f"[VP] ✅ Awarded {VP_AMOUNT} VP to {member.name} ({account['growid']})")
-                    
-                    # Send professional DM
-                    try:
-                        embed = discord.Embed(
-                            title="💰 VP Earned!",
-                            description=f"You earned **{VP_AMOUNT} VP** for staying in the voice channel!",
-                            color=discord.Color.gold()
-                        )
-                        embed.add_field(
-                            name="Amount Earned",
-                            value=f"**+{VP_AMOUNT} VP**",
-                            inline=True
-                        )
-                        embed.add_field(
-                            name="Total VP",
-                            value=f"**{account['total_vp']:,} VP**",
-                            inline=True
-                        )
-                        embed.add_field(
-                            name="Time in Channel",
-                            value=f"{int(elapsed / 60)} minutes",
-                            inline=True
-                        )
-                        embed.add_field(
-                            name="GrowID",
-                            value=f"`{account['growid']}`",
-                            inline=False
-                        )
-                        embed.set_footer(text="Stay in channel to keep earning!")
-                        embed.timestamp = datetime.utcnow()
-                        
-                        await member.send(embed=embed)
-                    except Exception as e:
-                        print(f"[VP] ⚠️ Could not DM {member.name}: {e}")
-                    
-                    # Reset timer
-                    user_voice_data[discord_id]['vp_start'] = now
+    ensure_leaderboard()
+    pages = max(1, -(-len(leaderboard) // LEADERBOARD_SIZE))
+    entries = leaderboard.top(LEADERBOARD_SIZE, (page - 1) * LEADERBOARD_SIZE)
+    lines = []
+    for rank, discord_id, total_vp in entries:
+        account = linked_accounts.get(discord_id)
+        growid = account.growid if account else '?'
+        lines.append(f"**#{rank}** `{growid}` - {total_vp:,} VP")
     
-    except Exception as e:
-        print(f"[VP ERROR] {e}")
+    embed = FrozenEmbed(
+        title="🏆 VP Leaderboard",
+        description="\n".join(lines) or ("Nobody here yet!" if page == 1 else "No players on this page."),
+        color=discord.Color.gold()
+    )
+    embed.set_footer(text=f"Page {page}/{pages} • {len(leaderboard):,} players")
+    embed.timestamp = datetime.utcnow()
+    
+    leaderboard_embeds.set(page, embed)
+    return embed
+
+def rank_embed(user, account):
+    ensure_leaderboard()
+    discord_id = user.id
+    rank = leaderboard.rank(account.total_vp)
+    above = leaderboard.next_above(account.total_vp)
+    
+    embed = discord.Embed(
+        title="🏅 Your Rank",
+        description=f"Stats for {user.mention}",
+        color=discord.Color.gold()
+    )
+    embed.add_field(name="Rank", value=f"**#{rank:,}** of {len(leaderboard):,}", inline=True)
+    embed.add_field(name="Total VP", value=f"**{account.total_vp:,} VP**", inline=True)
+    embed.add_field(
+        name="Next Rank",
+        value=f"{above - account.total_vp:,} VP to go" if above is not None else "👑 You're on top!",
+        inline=True
+    )
+    embed.add_field(name="Last 24h", value=f"{earnings.earned(discord_id, 'day'):,} VP", inline=True)
+    embed.add_field(name="Last 7 days", value=f"{earnings.earned(discord_id, 'week'):,} VP", inline=True)
+    embed.set_footer(text="Use /leaderboard to see the top players")
+    return embed
 
 # ============= COMMANDS =============
 @bot.tree.command(name='linkvp', description='🔗 Link your Growtopia account')
@@ -386,9 +1512,9 @@ async def linkvp(interaction: discord.Interaction, code: str):
     await interaction.response.defer(ephemeral=True)
     
     code = code.upper().strip()
-    discord_id = str(interaction.user.id)
+    discord_id = interaction.user.id
     
-    print(f"\n[LINK] 🔗 {interaction.user.name} | Code: {code}")
+    log_link.info("🔗 Link attempt", extra={'user': interaction.user.name, 'code': code})
     
     # Already linked?
     if discord_id in linked_accounts:
@@ -399,37 +1525,25 @@ async def linkvp(interaction: discord.Interaction, code: str):
             description="Your Discord account is already linked!",
             color=discord.Color.orange()
         )
-        embed.add_field(name="GrowID", value=f"`{account['growid']}`", inline=False)
-        embed.add_field(name="Total VP", value=f"**{account['total_vp']:,}**", inline=True)
+        embed.add_field(name="GrowID", value=f"`{account.growid}`", inline=False)
+        embed.add_field(name="Total VP", value=f"**{account.total_vp:,}**", inline=True)
         embed.add_field(
             name="Linked Since",
-            value=f"<t:{int(account['linked_at'].timestamp())}:R>",
+            value=f"<t:{int(account.linked_at)}:R>",
             inline=True
         )
         
         await interaction.followup.send(embed=embed, ephemeral=True)
         return
     
-    # Check code
-    if code not in pending_links:
-        embed = discord.Embed(
-            title="❌ Invalid Code",
-            description="This code doesn't exist or has expired.",
-            color=discord.Color.red()
-        )
-        embed.add_field(
-            name="📝 Steps to Link",
-            value="1. Type `/linkvp` in Growtopia\n"
-                  "2. Copy the 6-digit code\n"
-                  "3. Use `/linkvp <code>` here within 5 minutes",
-            inline=False
-        )
+    # Check code, lookups enforce the TTL themselves
+    growid = pending_links.get(code)
+    if growid is None:
+        embed = static_embed(build_invalid_code_embed)
         
         await interaction.followup.send(embed=embed, ephemeral=True)
         return
     
-    pending = pending_links[code]
-    growid = pending['growid']
     growid_lower = growid.lower()
     
     # Check if GrowID already linked
@@ -443,16 +1557,14 @@ async def linkvp(interaction: discord.Interaction, code: str):
         return
     
     # Link!
-    linked_accounts[discord_id] = {
-        'growid': growid,
-        'total_vp': 0,
-        'linked_at': datetime.now(),
-        'last_vp_time': None
-    }
-    reverse_links[growid_lower] = discord_id
-    del pending_links[code]
+    ledger.link(discord_id, growid)
+    leaderboard.add(discord_id, 0)
+    pending_links.pop(code)
+    if discord_id in user_voice_data:
+        publish_boost(discord_id, True)
+    await ledger.sync(discord_id)
     
-    print(f"[LINK] ✅ Success! {growid} <-> {discord_id}")
+    log_link.info("✅ Linked", extra={'growid': growid, 'discord_id': discord_id})
     
     embed = discord.Embed(
         title="✅ Account Linked Successfully!",
@@ -461,18 +1573,22 @@ async def linkvp(interaction: discord.Interaction, code: str):
     )
     embed.add_field(name="Discord", value=interaction.user.mention, inline=False)
     embed.add_field(name="GrowID", value=f"`{growid}`", inline=False)
-    embed.add_field(
-        name="💰 VP Rewards",
-        value=f"Join <#{VP_CHANNEL_ID}>\n"
-              f"Earn **{VP_AMOUNT} VP** every **{VP_INTERVAL // 60} minutes**",
-        inline=False
-    )
-    embed.add_field(
-        name="💎 Gems Boost",
-        value=f"Join <#{GEMS_CHANNEL_ID}>\n"
-              f"Get **{GEMS_MULTIPLIER}x gems** while in channel",
-        inline=False
-    )
+    if rules.vp_channels:
+        rule = rules.channels[rules.vp_channels[0]]
+        embed.add_field(
+            name="💰 VP Rewards",
+            value=f"Join <#{rule.channel_id}>\n"
+                  f"Earn **{rule.vp} VP** every **{sessions.interval // 60} minutes**",
+            inline=False
+        )
+    if rules.gems_channels:
+        rule = rules.channels[rules.gems_channels[0]]
+        embed.add_field(
+            name="💎 Gems Boost",
+            value=f"Join <#{rule.channel_id}>\n"
+                  f"Get **{rule.gems}x gems** while in channel",
+            inline=False
+        )
     embed.set_footer(text="Use /profile to check your stats anytime!")
     embed.timestamp = datetime.utcnow()
     
@@ -483,158 +1599,148 @@ async def profile(interaction: discord.Interaction):
     """View profile"""
     await interaction.response.defer(ephemeral=True)
     
-    discord_id = str(interaction.user.id)
+    discord_id = interaction.user.id
     
     if discord_id not in linked_accounts:
-        embed = discord.Embed(
-            title="❌ Not Linked",
-            description="You haven't linked your account yet!",
-            color=discord.Color.red()
-        )
-        embed.add_field(
-            name="How to Link",
-            value="1. Type `/linkvp` in Growtopia\n"
-                  "2. Use `/linkvp <code>` here",
-            inline=False
-        )
-        
-        await interaction.followup.send(embed=embed, ephemeral=True)
+        await interaction.followup.send(embed=static_embed(build_not_linked_embed), ephemeral=True)
         return
     
-    account = linked_accounts[discord_id]
+    settle_vp(discord_id)
+    embed = profile_embed(interaction.user, linked_accounts[discord_id])
     
-    # Check voice status
-    vp_status = "❌ Not in channel"
-    gems_status = "❌ Not active"
-    
-    vp_channel = bot.get_channel(VP_CHANNEL_ID)
-    if vp_channel:
-        for member in vp_channel.members:
-            if str(member.id) == discord_id:
-                vp_status = "✅ Earning VP"
-                break
-    
-    if user_voice_data[discord_id]['gems_active']:
-        gems_status = "✅ Active"
-    
-    embed = discord.Embed(
-        title="📊 Your Profile",
-        description=f"Stats for {interaction.user.mention}",
-        color=discord.Color.blue()
-    )
-    embed.set_thumbnail(url=interaction.user.display_avatar.url)
-    embed.add_field(name="GrowID", value=f"`{account['growid']}`", inline=False)
-    embed.add_field(name="Total VP", value=f"**{account['total_vp']:,} VP**", inline=True)
-    embed.add_field(
-        name="Linked Since",
-        value=f"<t:{int(account['linked_at'].timestamp())}:R>",
-        inline=True
-    )
-    embed.add_field(name="VP Status", value=vp_status, inline=True)
-    embed.add_field(name="Gems Boost", value=gems_status, inline=True)
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+@bot.tree.command(name='leaderboard', description='🏆 Top VP balances')
+@app_commands.describe(page='Page number, 10 players per page')
+async def leaderboard_cmd(interaction: discord.Interaction, page: app_commands.Range[int, 1, 10_000] = 1):
+    """Leaderboard"""
+    await interaction.response.send_message(embed=leaderboard_embed(page))
+
+@bot.tree.command(name='rank', description='🏅 Check your rank and recent earnings')
+async def rank(interaction: discord.Interaction):
+    """View rank"""
+    discord_id = interaction.user.id
     
-    if account.get('last_vp_time'):
-        embed.add_field(
-            name="Last VP",
-            value=f"<t:{int(account['last_vp_time'].timestamp())}:R>",
-            inline=True
-        )
+    if discord_id not in linked_accounts:
+        await interaction.response.send_message(embed=static_embed(build_not_linked_embed), ephemeral=True)
+        return
     
-    embed.set_footer(text="Use VP with /vp command in-game")
-    embed.timestamp = datetime.utcnow()
+    settle_vp(discord_id)
+    embed = rank_embed(interaction.user, linked_accounts[discord_id])
     
-    await interaction.followup.send(embed=embed, ephemeral=True)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.tree.command(name='rewards', description='🎁 View reward system info')
 async def rewards(interaction: discord.Interaction):
     """Rewards info"""
-    embed = discord.Embed(
-        title="🎁 Voice Rewards System",
-        description="Earn rewards by joining voice channels!",
-        color=discord.Color.gold()
-    )
-    
-    embed.add_field(
-        name="💰 VP Channel",
-        value=f"<#{VP_CHANNEL_ID}>\n"
-              f"• Earn **{VP_AMOUNT} VP** every **{VP_INTERVAL // 60} minutes**\n"
-              f"• Spend VP with `/vp` command in-game\n"
-              f"• Get DM notifications when you earn VP",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="💎 Gems Boost Channel",
-        value=f"<#{GEMS_CHANNEL_ID}>\n"
-              f"• Get **{GEMS_MULTIPLIER}x gems** multiplier\n"
-              f"• Active ONLY while in channel\n"
-              f"• Automatically deactivates when you leave",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="📝 How to Start",
-        value="1. Type `/linkvp` in Growtopia\n"
-              "2. Copy the 6-digit code\n"
-              "3. Use `/linkvp <code>` here\n"
-              "4. Join voice channels to earn!",
-        inline=False
-    )
-    
-    embed.set_footer(text="Use /profile to check your stats")
-    
-    await interaction.response.send_message(embed=embed)
+    await interaction.response.send_message(embed=static_embed(build_rewards_embed))
 
 @bot.tree.command(name='help', description='❓ Show all commands')
 async def help_cmd(interaction: discord.Interaction):
     """Help menu"""
-    embed = discord.Embed(
-        title="🤖 Bot Commands",
-        description="All available commands",
-        color=discord.Color.purple()
-    )
+    await interaction.response.send_message(embed=static_embed(build_help_embed))
+
+# ============= LIFECYCLE =============
+def save_handoff():
+    """Credit what is owed and hand open voice sessions to the next process"""
+    now = time.monotonic()
+    credit_periods(sessions.pop_due(now), now)
+    state = {
+        'saved_at': time.time(),
+        'sessions': {str(d): list(s) for d, s in sessions.export(now).items()},
+        'earnings': earnings.export()
+    }
+    tmp = HANDOFF_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp, HANDOFF_FILE)
+    log_bot.info("💾 Handoff saved", extra={'sessions': len(state['sessions']), 'earning_hours': len(state['earnings'])})
+
+def restore_handoff():
+    """Resume sessions from the previous process, reconcile drops whoever left"""
+    try:
+        with open(HANDOFF_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        os.remove(HANDOFF_FILE)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError):
+        log_bot.exception("Unreadable handoff ignored")
+        return
     
-    embed.add_field(
-        name="/linkvp <code>",
-        value="Link your Growtopia account",
-        inline=False
-    )
-    embed.add_field(
-        name="/profile",
-        value="View your stats and VP balance",
-        inline=False
-    )
-    embed.add_field(
-        name="/rewards",
-        value="View reward system information",
-        inline=False
-    )
-    embed.add_field(
-        name="/help",
-        value="Show this message",
-        inline=False
-    )
+    # Earnings buckets are wall-clock hours, they stay valid however old the handoff is
+    earnings.restore(state.get('earnings', {}))
     
-    embed.add_field(
-        name="🎮 In-Game Commands",
-        value="`/linkvp` - Get link code\n"
-              "`/vp` - Check and spend VP\n"
-              "`/vp <amount>` - Spend VP (coming soon)",
-        inline=False
-    )
+    age = time.time() - state.get('saved_at', 0)
+    if age > HANDOFF_MAX_AGE:
+        log_bot.info("Stale handoff ignored", extra={'age': round(age)})
+        return
+    restored = {int(d): (c, unpaid) for d, (c, unpaid) in state['sessions'].items()}
+    sessions.restore(restored, time.monotonic())
+    log_bot.info("♻️ Handoff restored", extra={'sessions': len(restored), 'age': round(age, 1)})
+
+async def shutdown(runner, client=None):
+    """Drain webhooks, disconnect, then persist everything"""
+    log_bot.info("Shutting down...", extra={'inflight': lifecycle.inflight})
+    if not await lifecycle.drain(DRAIN_TIMEOUT):
+        log_bot.warning("Drain timed out", extra={'inflight': lifecycle.inflight})
+    await runner.cleanup()
+    await bot.close()
+    if client is not None:
+        await asyncio.gather(client, return_exceptions=True)
     
-    await interaction.response.send_message(embed=embed)
+    if lifecycle.ready:
+        save_handoff()
+    await notifier.stop()
+    if game_sync is not None:
+        await game_sync.stop()
+    await ledger.close()
+    if gems_table is not None:
+        gems_table.close()
+    cpu_pool.shutdown()
+    await loop_lag.stop()
 
 # ============= MAIN =============
 async def main():
-    await start_webhook_server()
-    await bot.start(DISCORD_TOKEN)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows, Ctrl+C still raises KeyboardInterrupt
+    
+    # Bind the port first, requests wait at the gate until the ledger is loaded
+    log_bot.info("⚙️ Runtime", extra={'loop': runtime.LOOP, 'json': runtime.JSON})
+    loop_lag.start()
+    runner = await start_webhook_server()
+    client = None
+    try:
+        await asyncio.to_thread(ledger.load)
+        await asyncio.to_thread(leaderboard.build, linked_accounts)
+        await ledger.start()
+        if game_sync is not None:
+            await game_sync.start()
+        restore_handoff()
+        lifecycle.mark_ready()
+        
+        client = asyncio.create_task(bot.start(DISCORD_TOKEN))
+        stopping = asyncio.create_task(stop.wait())
+        await asyncio.wait((client, stopping), return_when=asyncio.FIRST_COMPLETED)
+        stopping.cancel()
+        if client.done():
+            client.result()  # re-raise a login or gateway failure
+    finally:
+        await shutdown(runner, client)
 
 if __name__ == '__main__':
     if DISCORD_TOKEN == 'YOUR_BOT_TOKEN':
         print("[ERROR] Set DISCORD_TOKEN!")
     else:
+        setup_logging(LOG_LEVEL, LOG_LEVELS, LOG_SAMPLE)
         try:
-            asyncio.run(main())
+            runtime.run(main())
         except KeyboardInterrupt:
-            print("\n[BOT] Shutting down...")
+            pass
+        finally:
+            stop_logging()
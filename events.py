@@ -0,0 +1,76 @@
+"""Change stream pushed to game servers as Server-Sent Events.
+
+Boost transitions and balance changes are published once, serialized
+straight into an SSE frame and kept in a bounded history.  Each subscriber
+is just a cursor into that history, so a slow client never holds up
+publishers or other clients.
+
+Event ids are `<epoch>:<seq>`.  `seq` increases by one per event and
+`epoch` changes whenever the bot restarts.  A client reconnecting with
+`Last-Event-ID` (or `?since=`) resumes right after that event; if the id
+is from another epoch or already fell out of the history it gets a `reset`
+event instead and should reload state through the batch check routes, then
+apply the events that follow.
+"""
+import asyncio
+import json
+import secrets
+
+
+class EventStream:
+    def __init__(self, history=100_000):
+        self.history = history
+        self.epoch = secrets.token_hex(4)
+        self.seq = 0  # seq of the latest event
+        self._frames = []  # SSE frames, _frames[i] has seq _base + i + 1
+        self._base = 0
+        self._changed = asyncio.Event()
+        self.subscribers = 0
+
+    def publish(self, kind, data):
+        self.seq += 1
+        self._frames.append(self._frame(self.seq, kind, data))
+
+        # Trim in bulk so publishing stays O(1) amortized
+        if len(self._frames) >= 2 * self.history:
+            drop = len(self._frames) - self.history
+            del self._frames[:drop]
+            self._base += drop
+
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def resume_point(self, last_id):
+        """seq to continue after, or None if the client needs a reset"""
+        if not last_id:
+            return None
+        epoch, _, seq = last_id.partition(':')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq < self._base or seq > self.seq:
+            return None
+        return seq
+
+    def read(self, seq):
+        """Frames after `seq` as one chunk, None if they are gone"""
+        if seq < self._base:
+            return None
+        return b''.join(self._frames[seq - self._base:])
+
+    def reset_frame(self):
+        return self._frame(self.seq, 'reset', {'seq': self.seq})
+
+    async def wait(self, seq, timeout):
+        """Wait for an event after `seq`, False on timeout"""
+        if self.seq > seq:
+            return True
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _frame(self, seq, kind, data):
+        payload = json.dumps(data, separators=(',', ':'))
+        return f'id: {self.epoch}:{seq}\nevent: {kind}\ndata: {payload}\n\n'.encode('utf-8')
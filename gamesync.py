@@ -0,0 +1,324 @@
+"""Balance write-back to the game API.
+
+Awards and spends are recorded as per-GrowID deltas and coalesced in
+memory.  Every `interval` seconds (or sooner once `max_batch` GrowIDs are
+waiting) they are cut into a batch, appended to an on-disk outbox and then
+pushed, one batch at a time and in order, over a single pooled keep-alive
+session:
+
+    POST <base_url><path>
+    Idempotency-Key: <batch id>
+    {"batch": "<batch id>", "updates": [{"growid": "...", "delta": 10, "total_vp": 120}]}
+
+A 2xx response acknowledges the batch; the ack is appended to the outbox
+too.  Any other 4xx but 408, 425 and 429 means the API will never take it
+(bad payload, wrong path, bad token), so the batch is moved to
+`<outbox>.rejected` and logged.  Anything else, timeouts and connection
+errors included, is retried with jittered exponential backoff.  The batch
+id doesn't change between attempts, so the API can drop replays.
+
+While batches wait behind the one being retried, new deltas are merged
+into them per GrowID rather than cut into more batches, so an outage grows
+the outbox by GrowIDs changed, not by changes.  It is capped at
+`max_outbox` updates; past that, GrowIDs not already waiting are kept in
+memory until the outbox drains.
+
+On start, batches without an ack are loaded back from the outbox and sent
+first.  `stop()` cuts whatever is still in memory into the outbox, so a
+restart loses nothing unless the outbox is full; a crash can lose the last `interval` of deltas, but
+every update carries the new balance, so the next update for that GrowID
+corrects the game's view.
+"""
+import asyncio
+import json
+import os
+import random
+import secrets
+import time
+from collections import deque
+
+import aiohttp
+
+from logs import get_logger
+
+RETRIED = (408, 425, 429)  # 4xx statuses worth sending again, any other 4xx is rejected
+COMPACT_EVERY = 1000  # acks between outbox rewrites
+
+log = get_logger('gamesync')
+
+
+class GameSync:
+    def __init__(self, base_url, path, outbox_path, token=None, interval=5.0,
+                 max_batch=500, max_outbox=100_000, timeout=10.0, max_backoff=60.0, connections=4):
+        self.url = base_url.rstrip('/') + path
+        self.outbox_path = outbox_path
+        self.token = token
+        self.interval = interval
+        self.max_batch = max_batch
+        self.max_outbox = max_outbox  # updates on disk
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.connections = connections
+
+        self._deltas = {}  # growid -> [delta, total_vp] not cut into a batch yet
+        self._batches = deque()  # (batch id, updates) in the outbox, not acked yet
+        self._outbox = None
+        self._acked_since_compact = 0
+        self._full = False  # outbox at max_outbox, logged once
+        self._session = None
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._deadline = None  # monotonic time stop() gives up pushing
+        self.metrics = {
+            'recorded': 0,
+            'batches': 0,
+            'pushed': 0,
+            'updates_pushed': 0,
+            'retried': 0,
+            'rejected': 0,
+            'dropped': 0
+        }
+
+    @property
+    def depth(self):
+        """Batches waiting in the outbox"""
+        return len(self._batches)
+
+    def record(self, growid, delta, total_vp):
+        """Note a balance change, never awaits"""
+        entry = self._deltas.get(growid)
+        if entry is None:
+            self._deltas[growid] = [delta, total_vp]
+            if len(self._deltas) >= self.max_batch:
+                self._wakeup.set()
+        else:
+            entry[0] += delta
+            entry[1] = total_vp
+        self.metrics['recorded'] += 1
+
+    # ============= LIFECYCLE =============
+    async def start(self):
+        if self._task is not None:
+            return
+        await asyncio.to_thread(self._load)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={'Authorization': f'Bearer {self.token}'} if self.token else None
+        )
+        self._task = asyncio.create_task(self._run())
+        log.info("🔁 Game sync started", extra={'url': self.url, 'outbox': len(self._batches)})
+
+    async def stop(self, timeout=5.0):
+        """Persist what's left, then give the outbox `timeout` seconds to drain"""
+        if self._task is None:
+            return
+        self._deadline = time.monotonic() + timeout
+        self._closing = True
+        self._wakeup.set()
+        await self._task  # not cancelled, a cut must reach the outbox
+        self._task = None
+        await self._cut()
+        if self._deltas:
+            self.metrics['dropped'] += len(self._deltas)
+            log.error("Game sync outbox full, deltas dropped", extra={'growids': len(self._deltas)})
+        await self._session.close()
+        await asyncio.to_thread(self._close)
+        log.info("🔁 Game sync stopped", extra={'outbox': len(self._batches)})
+
+    # ============= WORKER =============
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._cut()
+                while self._batches:
+                    if not await self._push(*self._batches[0]):
+                        break  # stopping, the rest stays in the outbox
+            except Exception:
+                log.exception("Game sync failed")
+            if self._closing:
+                return
+
+    async def _cut(self):
+        """Move recorded deltas into durable batches"""
+        if not self._deltas:
+            return
+        if len(self._batches) > 1:
+            # The head may have reached the API already, the rest never has
+            head = self._batches.popleft()
+            waiting = {}
+            for _, updates in self._batches:
+                for update in updates:
+                    entry = waiting.setdefault(update['growid'], [0, 0])
+                    entry[0] += update['delta']
+                    entry[1] = update['total_vp']
+            self._take(waiting, self.max_outbox - len(head[1]))
+            self._batches = deque([head, *self._split(waiting)])
+            await asyncio.to_thread(self._rewrite)
+            return
+        queued = sum(len(updates) for _, updates in self._batches)
+        for batch in self._split(self._take({}, self.max_outbox - queued)):
+            self._batches.append(batch)  # before the write, stop() rewrites the outbox from here
+            await self._append({'id': batch[0], 'updates': batch[1]})
+            self.metrics['batches'] += 1
+
+    def _take(self, into, limit):
+        """Fold recorded deltas into `into` while it holds fewer than `limit` GrowIDs"""
+        left = {}
+        for growid, entry in self._deltas.items():
+            held = into.get(growid)
+            if held is not None:
+                held[0] += entry[0]
+                held[1] = entry[1]
+            elif len(into) < limit:
+                into[growid] = entry
+            else:
+                left[growid] = entry
+        self._deltas = left
+        if left and not self._full:
+            log.warning("Game sync outbox full, holding deltas in memory", extra={
+                'max_outbox': self.max_outbox,
+                'growids': len(left)
+            })
+        self._full = bool(left)
+        return into
+
+    def _split(self, deltas):
+        """growid -> [delta, total_vp] as new batches of at most max_batch updates"""
+        updates = [
+            {'growid': growid, 'delta': delta, 'total_vp': total_vp}
+            for growid, (delta, total_vp) in deltas.items() if delta
+        ]
+        return [
+            (secrets.token_hex(8), updates[start:start + self.max_batch])
+            for start in range(0, len(updates), self.max_batch)
+        ]
+
+    async def _push(self, batch_id, updates):
+        """Send the oldest batch until it is acked or rejected, False if stopping"""
+        attempt = 0
+        body = json.dumps({'batch': batch_id, 'updates': updates})
+        while True:
+            timeout = None
+            if self._closing:
+                remaining = self._deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                timeout = aiohttp.ClientTimeout(total=min(self.timeout, remaining))
+            started = time.perf_counter()
+            try:
+                async with self._session.post(self.url, data=body, timeout=timeout, headers={
+                    'Content-Type': 'application/json',
+                    'Idempotency-Key': batch_id
+                }) as resp:
+                    status = resp.status
+                    error = None if status < 300 else (await resp.text())[:200]
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status, error = None, repr(e)
+
+            if status is not None and status < 300:
+                await self._ack(batch_id)
+                self.metrics['pushed'] += 1
+                self.metrics['updates_pushed'] += len(updates)
+                log.info("🔁 Batch pushed", extra={
+                    'batch': batch_id,
+                    'updates': len(updates),
+                    'elapsed': round(time.perf_counter() - started, 3)
+                })
+                return True
+
+            if status is not None and 400 <= status < 500 and status not in RETRIED:
+                await asyncio.to_thread(self._write_rejected, batch_id, updates, status, error)
+                await self._ack(batch_id)
+                self.metrics['rejected'] += 1
+                log.error("Batch rejected by the game API", extra={
+                    'batch': batch_id,
+                    'updates': len(updates),
+                    'status': status,
+                    'error': error
+                })
+                return True
+
+            attempt += 1
+            self.metrics['retried'] += 1
+            delay = min(self.max_backoff, 2 ** min(attempt, 16) * 0.5) * random.uniform(0.5, 1.0)
+            log.warning("Batch push failed, retrying", extra={
+                'batch': batch_id,
+                'status': status,
+                'error': error,
+                'attempt': attempt,
+                'retry_in': round(delay, 2)
+            })
+            retry_at = time.monotonic() + delay
+            while not self._closing and (wait := retry_at - time.monotonic()) > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self._cut()  # merged into the waiting batches, the outbox is what survives
+            if self._closing:
+                return False
+
+    # ============= OUTBOX =============
+    def _load(self):
+        """Unacked batches from a previous run, in order"""
+        os.makedirs(os.path.dirname(self.outbox_path) or '.', exist_ok=True)
+        pending = {}
+        try:
+            with open(self.outbox_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break  # torn write at the tail
+                    record = json.loads(line)
+                    if 'ack' in record:
+                        pending.pop(record['ack'], None)
+                    else:
+                        pending[record['id']] = record['updates']
+        except FileNotFoundError:
+            pass
+        self._batches = deque(pending.items())
+        self._rewrite()
+
+    async def _append(self, record):
+        await asyncio.to_thread(self._write, (json.dumps(record) + '\n').encode('utf-8'))
+
+    async def _ack(self, batch_id):
+        self._batches.popleft()
+        await self._append({'ack': batch_id})
+        self._acked_since_compact += 1
+        if not self._batches or self._acked_since_compact >= COMPACT_EVERY:
+            await asyncio.to_thread(self._rewrite)
+
+    def _write(self, data):
+        self._outbox.write(data)
+        self._outbox.flush()
+        os.fsync(self._outbox.fileno())
+
+    def _rewrite(self):
+        """Replace the outbox with only the unacked batches"""
+        tmp = self.outbox_path + '.tmp'
+        with open(tmp, 'wb') as f:
+            for batch_id, updates in self._batches:
+                f.write((json.dumps({'id': batch_id, 'updates': updates}) + '\n').encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        if self._outbox is not None:
+            self._outbox.close()
+        os.replace(tmp, self.outbox_path)
+        self._outbox = open(self.outbox_path, 'ab')
+        self._acked_since_compact = 0
+
+    def _close(self):
+        self._rewrite()
+        self._outbox.close()
+
+    def _write_rejected(self, batch_id, updates, status, error):
+        with open(self.outbox_path + '.rejected', 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'id': batch_id, 'status': status, 'error': error, 'updates': updates}) + '\n')
@@ -0,0 +1,192 @@
+"""Gems boosts published in shared memory for game servers on the same host.
+
+The bot writes active boosts into a memory-mapped file (put it on
+/dev/shm); a co-located game server maps the same file and reads a boost
+with plain memory loads instead of calling /webhook/gems/check.  The HTTP
+route stays the fallback for remote game servers.
+
+Layout, little endian:
+
+    header   64 bytes   magic "VPGEMS\\0\\1", u32 capacity, u32 closed
+    slot     32 bytes   u64 seq, u64 key, f64 multiplier, f64 expires
+             x capacity (a power of two)
+
+`key` is FNV-1a 64 of the lowercased GrowID in UTF-8 (0 is mapped to 1, 0
+marks an empty slot).  Slots are an open-addressing table with linear
+probing from `key & (capacity - 1)`; a probe stops at an empty slot.  A
+boost counts only while `multiplier > 0` and `expires` (Unix time) is in
+the future; the bot renews leases while it runs, so boosts lapse on their
+own if it dies.
+
+Each slot is guarded by a seqlock.  There is a single writer, which makes
+`seq` odd, writes the slot, then makes it even again.  Readers:
+
+    do { s1 = seq; body = slot; s2 = seq; } while (s1 != s2 || s1 & 1);
+
+(with acquire loads / a read barrier between the steps in C).  When
+`closed` is set the bot has shut down or replaced the file: reopen it.
+"""
+import mmap
+import os
+import struct
+
+MAGIC = b'VPGEMS\x00\x01'
+HEADER = struct.Struct('<8sII')
+HEADER_SIZE = 64
+CLOSED_OFFSET = 12
+SEQ = struct.Struct('<Q')
+BODY = struct.Struct('<Qdd')  # key, multiplier, expires
+SLOT_SIZE = 32
+
+FNV_OFFSET = 0xcbf29ce484222325
+FNV_PRIME = 0x100000001b3
+
+
+def growid_key(growid):
+    """FNV-1a 64 of the lowercased GrowID, never 0"""
+    h = FNV_OFFSET
+    for byte in growid.lower().encode('utf-8'):
+        h = ((h ^ byte) * FNV_PRIME) & 0xFFFFFFFFFFFFFFFF
+    return h or 1
+
+
+class GemsTable:
+    """Single-writer side of the table, `GemsTable.open()` for readers"""
+
+    def __init__(self, path, capacity=65536):
+        if capacity & (capacity - 1):
+            raise ValueError('capacity must be a power of two')
+        self.path = path
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self._keys = [0] * capacity  # writer's copy of the key column
+        self._live = [False] * capacity  # slot holds a boost that was not revoked
+        self._index = {}  # key -> slot, for every key occupying a slot
+        self._writer = True
+
+        # Build in a fresh file and swap it in, readers of an older file
+        # keep their mapping until they see `closed`
+        tmp = f'{path}.{os.getpid()}.tmp'
+        size = HEADER_SIZE + capacity * SLOT_SIZE
+        with open(tmp, 'w+b') as f:
+            f.truncate(size)
+            self._mm = mmap.mmap(f.fileno(), size)
+        HEADER.pack_into(self._mm, 0, MAGIC, capacity, 0)
+        self._mark_closed(path)
+        os.replace(tmp, path)
+
+    @classmethod
+    def open(cls, path):
+        """Read-only view of a table published by another process"""
+        table = cls.__new__(cls)
+        with open(path, 'rb') as f:
+            table._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, capacity, _ = HEADER.unpack_from(table._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a gems table')
+        table.path = path
+        table.capacity = capacity
+        table._mask = capacity - 1
+        table._writer = False
+        return table
+
+    @property
+    def closed(self):
+        return HEADER.unpack_from(self._mm, 0)[2] != 0
+
+    # ============= WRITER =============
+    def publish(self, growid, multiplier, expires):
+        """Set or renew a boost, False if the table is full"""
+        key = growid_key(growid)
+        slot = self._index.get(key)
+        if slot is None:
+            slot = self._claim(key)
+            if slot is None:
+                return False
+        self._write(slot, key, multiplier, expires)
+        self._live[slot] = True
+        return True
+
+    def revoke(self, growid):
+        slot = self._index.get(growid_key(growid))
+        if slot is not None and self._live[slot]:
+            self._write(slot, self._keys[slot], 0.0, 0.0)
+            self._live[slot] = False
+
+    def revoke_all(self):
+        for slot, live in enumerate(self._live):
+            if live:
+                self._write(slot, self._keys[slot], 0.0, 0.0)
+                self._live[slot] = False
+
+    def close(self):
+        """Revoke everything, flag the file closed and unmap it"""
+        if self._writer:
+            self.revoke_all()
+            struct.pack_into('<I', self._mm, CLOSED_OFFSET, 1)
+        self._mm.close()
+
+    def _claim(self, key):
+        # The key isn't in the table, so the first empty or revoked slot on
+        # its probe path is free: readers looking for the old occupant
+        # simply stop finding it
+        slot = key & self._mask
+        for _ in range(self.capacity):
+            if not self._live[slot]:
+                old = self._keys[slot]
+                if old:
+                    del self._index[old]
+                self._keys[slot] = key
+                self._index[key] = slot
+                return slot
+            slot = (slot + 1) & self._mask
+        return None
+
+    def _write(self, slot, key, multiplier, expires):
+        offset = HEADER_SIZE + slot * SLOT_SIZE
+        mm = self._mm
+        seq = SEQ.unpack_from(mm, offset)[0]
+        SEQ.pack_into(mm, offset, seq + 1)
+        BODY.pack_into(mm, offset + 8, key, multiplier, expires)
+        SEQ.pack_into(mm, offset, seq + 2)
+
+    @staticmethod
+    def _mark_closed(path):
+        """Tell readers of a previous file to reopen"""
+        try:
+            with open(path, 'r+b') as f:
+                old = mmap.mmap(f.fileno(), HEADER_SIZE)
+                if old[:8] == MAGIC:
+                    struct.pack_into('<I', old, CLOSED_OFFSET, 1)
+                old.close()
+        except (OSError, ValueError):
+            pass
+
+    # ============= READER =============
+    def entry(self, growid):
+        """(multiplier, expires) as last written for a GrowID, or None"""
+        key = growid_key(growid)
+        mm = self._mm
+        slot = key & self._mask
+        for _ in range(self.capacity):
+            offset = HEADER_SIZE + slot * SLOT_SIZE
+            while True:
+                seq = SEQ.unpack_from(mm, offset)[0]
+                if seq & 1:
+                    continue
+                found, multiplier, expires = BODY.unpack_from(mm, offset + 8)
+                if SEQ.unpack_from(mm, offset)[0] == seq:
+                    break
+            if found == 0:
+                return None
+            if found == key:
+                return multiplier, expires
+            slot = (slot + 1) & self._mask
+        return None
+
+    def lookup(self, growid, now):
+        """Active multiplier for a GrowID, or None"""
+        entry = self.entry(growid)
+        if entry is None or entry[0] <= 0 or entry[1] <= now:
+            return None
+        return entry[0]
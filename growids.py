@@ -0,0 +1,68 @@
+"""GrowID validation, case folding and the GrowID -> Discord id index.
+
+GrowIDs match case-insensitively, so every map is keyed by the lowercased
+GrowID.  `fold()` is the one place that key is made: it rejects anything
+that can't be a GrowID (not a string, empty, longer than MAX_LENGTH)
+before any lowercasing or map lookup, so a junk or oversized value from a
+request costs a type and length check.  New links must also pass
+`valid()`; GrowIDs already in the ledger are indexed as they are.
+
+`GrowIDIndex` is a plain dict keyed by folded GrowIDs, so misses stay a
+single hash probe.  That's cheaper in CPython than any filter placed in
+front of it, Bloom filters included (see benchmarks/bench_growids.py).  A
+GrowID that is already lowercase shares the account's string instead of
+holding a copy, and the index keeps count of what it holds for metrics.
+"""
+import sys
+
+MAX_LENGTH = 32  # longest GrowID accepted anywhere
+
+
+def fold(growid):
+    """Index key for a GrowID, None if it can't be one"""
+    if type(growid) is str and 0 < len(growid) <= MAX_LENGTH:
+        return growid.lower()
+    return None
+
+
+def linkable(growid):
+    """True for a GrowID that may be linked: ASCII letters and digits"""
+    return fold(growid) is not None and growid.isascii() and growid.isalnum()
+
+
+class GrowIDIndex(dict):
+    """folded GrowID -> discord_id (int)"""
+
+    def __init__(self):
+        super().__init__()
+        self.key_bytes = 0  # strings held only by the index
+        self.shared = 0  # keys that are the account's own string
+
+    def add(self, growid, discord_id):
+        key = growid.lower()
+        if key not in self:
+            if key == growid:
+                key = growid  # already lowercase, don't keep a second copy
+                self.shared += 1
+            else:
+                self.key_bytes += sys.getsizeof(key)
+        self[key] = discord_id
+        return key
+
+    def clear(self):
+        super().clear()
+        self.key_bytes = 0
+        self.shared = 0
+
+    def lookup(self, growid):
+        """discord_id linked to a GrowID as sent by a client, None if none"""
+        if type(growid) is str and 0 < len(growid) <= MAX_LENGTH:
+            return self.get(growid.lower())
+        return None
+
+    def stats(self):
+        """Bytes held, by part"""
+        return {
+            'table': sys.getsizeof(self),
+            'keys': self.key_bytes
+        }
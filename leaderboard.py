@@ -0,0 +1,256 @@
+"""VP leaderboard and rolling earnings.
+
+Balances are kept in an order-statistics index that is updated as VP is
+awarded and spent, so ranks and top-N pages never sort the account table.
+Each account is one int key, `total_vp << 64 | discord_id`, in a
+`RankIndex`: sorted buckets of keys plus a Fenwick tree over bucket sizes.
+Insert, remove, rank and select are O(log n) (bisect plus a bounded list
+insert).
+
+Daily and weekly earnings come from hourly buckets; totals are adjusted as
+buckets enter and leave the window, so reading them is O(1).
+"""
+import bisect
+import time
+
+ID_BITS = 64
+ID_MASK = (1 << ID_BITS) - 1
+
+
+class RankIndex:
+    """Sorted multiset of ints with positional access"""
+
+    def __init__(self, load=1000):
+        self.load = load
+        self._buckets = []  # sorted lists, each at most 2 * load long
+        self._maxes = []  # last key of each bucket
+        self._tree = []  # Fenwick tree over bucket lengths
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def build(self, keys):
+        keys = sorted(keys)
+        self._buckets = [keys[i:i + self.load] for i in range(0, len(keys), self.load)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._len = len(keys)
+        self._rebuild_tree()
+
+    def add(self, key):
+        buckets = self._buckets
+        if not buckets:
+            buckets.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            self._rebuild_tree()
+            return
+
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(buckets):
+            i -= 1
+            buckets[i].append(key)
+            self._maxes[i] = key
+        else:
+            bisect.insort(buckets[i], key)
+        self._len += 1
+        self._fenwick_add(i, 1)
+
+        if len(buckets[i]) > 2 * self.load:
+            bucket = buckets[i]
+            buckets[i:i + 1] = [bucket[:self.load], bucket[self.load:]]
+            self._maxes[i:i + 1] = [bucket[self.load - 1], bucket[-1]]
+            self._rebuild_tree()
+
+    def remove(self, key):
+        """Remove one occurrence, False if the key isn't present"""
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._buckets):
+            return False
+        bucket = self._buckets[i]
+        j = bisect.bisect_left(bucket, key)
+        if j == len(bucket) or bucket[j] != key:
+            return False
+
+        del bucket[j]
+        self._len -= 1
+        if not bucket:
+            del self._buckets[i]
+            del self._maxes[i]
+            self._rebuild_tree()
+            return True
+        self._maxes[i] = bucket[-1]
+        self._fenwick_add(i, -1)
+        return True
+
+    def count_below(self, key):
+        """Number of keys < key"""
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._buckets):
+            return self._len
+        return self._prefix(i) + bisect.bisect_left(self._buckets[i], key)
+
+    def at(self, position):
+        """Key at a 0-based position in ascending order"""
+        if position < 0:
+            position += self._len
+        if not 0 <= position < self._len:
+            raise IndexError(position)
+
+        # Fenwick descent: last bucket whose prefix length is <= position
+        tree = self._tree
+        i = 0
+        step = 1 << (len(tree).bit_length() - 1) if tree else 0
+        while step:
+            if i + step <= len(tree) and tree[i + step - 1] <= position:
+                i += step
+                position -= tree[i - 1]
+            step >>= 1
+        return self._buckets[i][position]
+
+    def _rebuild_tree(self):
+        tree = [len(bucket) for bucket in self._buckets]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _fenwick_add(self, i, delta):
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i |= i + 1
+
+    def _prefix(self, i):
+        """Total length of buckets [0, i)"""
+        total = 0
+        tree = self._tree
+        while i > 0:
+            total += tree[i - 1]
+            i &= i - 1
+        return total
+
+
+class Leaderboard:
+    """Ranks by total VP, ties share a rank"""
+
+    def __init__(self):
+        self.index = RankIndex()
+        self.built = False
+
+    def __len__(self):
+        return len(self.index)
+
+    def build(self, accounts):
+        """Load every account, updates before this are ignored"""
+        self.index.build(a.total_vp << ID_BITS | d for d, a in accounts.items())
+        self.built = True
+
+    def add(self, discord_id, total_vp):
+        if self.built:
+            self.index.add(total_vp << ID_BITS | discord_id)
+
+    def update(self, discord_id, old_vp, new_vp):
+        if self.built and old_vp != new_vp:
+            self.index.remove(old_vp << ID_BITS | discord_id)
+            self.index.add(new_vp << ID_BITS | discord_id)
+
+    def rank(self, total_vp):
+        """1 + number of accounts with a higher balance"""
+        return len(self.index) - self.index.count_below((total_vp + 1) << ID_BITS) + 1
+
+    def next_above(self, total_vp):
+        """Smallest balance above `total_vp`, None at the top"""
+        position = self.index.count_below((total_vp + 1) << ID_BITS)
+        if position == len(self.index):
+            return None
+        return self.index.at(position) >> ID_BITS
+
+    def top(self, count, offset=0):
+        """[(rank, discord_id, total_vp)] from the highest balance down"""
+        entries = []
+        for position in range(len(self.index) - 1 - offset, max(-1, len(self.index) - 1 - offset - count), -1):
+            key = self.index.at(position)
+            total_vp = key >> ID_BITS
+            entries.append((self.rank(total_vp), key & ID_MASK, total_vp))
+        return entries
+
+
+class RollingEarnings:
+    """Per-account VP earned in the last day and week, in hourly buckets"""
+
+    BUCKET = 3600
+    WINDOWS = {'day': 24, 'week': 168}  # window -> buckets
+
+    def __init__(self):
+        self._buckets = {}  # hour -> {discord_id: amount}
+        self.totals = {name: {} for name in self.WINDOWS}  # window -> {discord_id: amount}
+        self.minted = dict.fromkeys(self.WINDOWS, 0)  # window -> VP earned by everyone
+        self._hour = None
+
+    def add(self, discord_id, amount, now=None):
+        self._advance(int((time.time() if now is None else now) // self.BUCKET))
+        bucket = self._buckets.setdefault(self._hour, {})
+        bucket[discord_id] = bucket.get(discord_id, 0) + amount
+        for name, totals in self.totals.items():
+            totals[discord_id] = totals.get(discord_id, 0) + amount
+            self.minted[name] += amount
+
+    def earned(self, discord_id, window, now=None):
+        self._advance(int((time.time() if now is None else now) // self.BUCKET))
+        return self.totals[window].get(discord_id, 0)
+
+    def minted_now(self, now=None):
+        """{window: VP earned by everyone}"""
+        self._advance(int((time.time() if now is None else now) // self.BUCKET))
+        return self.minted
+
+    def export(self):
+        """Buckets still inside the week, JSON-ready, for restore() after a restart"""
+        return {str(hour): {str(d): amount for d, amount in bucket.items()} for hour, bucket in self._buckets.items()}
+
+    def restore(self, buckets, now=None):
+        """Merge exported buckets back in, skipping what slid out of every window"""
+        hour_now = int((time.time() if now is None else now) // self.BUCKET)
+        self._advance(hour_now)
+        for hour, bucket in buckets.items():
+            hour = int(hour)
+            age = hour_now - hour
+            if not 0 <= age < max(self.WINDOWS.values()):
+                continue
+            target = self._buckets.setdefault(hour, {})
+            for discord_id, amount in bucket.items():
+                discord_id = int(discord_id)
+                target[discord_id] = target.get(discord_id, 0) + amount
+                for name, size in self.WINDOWS.items():
+                    if age < size:
+                        totals = self.totals[name]
+                        totals[discord_id] = totals.get(discord_id, 0) + amount
+                        self.minted[name] += amount
+
+    def _advance(self, hour):
+        """Drop buckets that slid out of each window"""
+        previous = self._hour
+        if previous is not None and hour <= previous:
+            return
+        self._hour = hour
+        if previous is None:
+            return
+        for old_hour in list(self._buckets):
+            bucket = self._buckets[old_hour]
+            for name, size in self.WINDOWS.items():
+                if previous - old_hour < size <= hour - old_hour:
+                    self._expire(name, bucket)
+            if hour - old_hour >= max(self.WINDOWS.values()):
+                del self._buckets[old_hour]
+
+    def _expire(self, window, bucket):
+        totals = self.totals[window]
+        for discord_id, amount in bucket.items():
+            left = totals[discord_id] - amount
+            if left:
+                totals[discord_id] = left
+            else:
+                del totals[discord_id]
+            self.minted[window] -= amount
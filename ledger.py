@@ -0,0 +1,530 @@
+"""Durable VP ledger: append-only write-ahead log + compacted snapshots.
+
+Every award/spend/link is appended to the current WAL segment and made
+durable by a background flusher that group-commits (one write + fsync per
+batch).  Periodically the state is compacted into a snapshot and older WAL
+segments are dropped.  On startup the snapshot is loaded and newer segments
+are replayed.
+
+PartitionedLedger splits accounts by Discord ID over several independent
+Ledgers (own WAL, snapshot and flusher each) that share one in-memory view.
+
+WAL records are one tab separated line each:
+
+    L <discord_id> <growid> <ts>     link
+    A <discord_id> <amount> <ts>     award
+    S <discord_id> <amount>          spend
+"""
+import asyncio
+import json
+import os
+import time
+
+from growids import GrowIDIndex
+from logs import get_logger
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows, no writer lock
+
+SNAPSHOT_FILE = 'snapshot.json'
+WAL_PREFIX = 'wal.'
+FLUSH_RETRY = 1.0  # seconds between attempts while WAL writes fail
+READONLY_ATTEMPTS = 5  # readonly loads, each one restarted by the owner compacting
+
+log = get_logger('ledger')
+
+
+class Account:
+    """Linked account, timestamps are epoch seconds (last_vp_time 0 = never)"""
+
+    __slots__ = ('growid', 'total_vp', 'linked_at', 'last_vp_time')
+
+    def __init__(self, growid, total_vp=0, linked_at=0.0, last_vp_time=0.0):
+        self.growid = growid
+        self.total_vp = total_vp
+        self.linked_at = linked_at
+        self.last_vp_time = last_vp_time
+
+
+class Ledger:
+    def __init__(self, data_dir, commit_interval=0.05, snapshot_every=100_000,
+                 accounts=None, reverse=None, partition=(0, 1)):
+        self.data_dir = data_dir
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        self.partition = partition  # (index, count), snapshots keep only owned IDs
+
+        self.accounts = {} if accounts is None else accounts  # discord_id (int) -> Account
+        self.reverse = GrowIDIndex() if reverse is None else reverse  # growid_lower -> discord_id (int)
+        self.ops = {'link': 0, 'award': 0, 'spend': 0, 'spend_rejected': 0, 'commit': 0, 'snapshot': 0}
+        self.loaded = False
+
+        self._gen = 0
+        self._loaded_snapshot = None  # (inode, mtime) of the snapshot file load() read
+        self._wal = None
+        self._buffer = []
+        self._waiters = []
+        self._events_since_snapshot = 0
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._snapshot_lock = asyncio.Lock()  # one snapshot at a time, they must land in gen order
+        self._writing = False
+        self._flusher = None
+        self._closing = False
+        self._snapshotting = False
+
+    # ============= REPLAY =============
+    def load(self, readonly=False):
+        """Load snapshot and replay WAL segments (blocking, call before start)
+
+        `readonly` leaves the directory untouched, for inspecting a ledger
+        another process owns; check `compacted()` afterwards.
+        """
+        if not readonly:
+            os.makedirs(self.data_dir, exist_ok=True)
+        started = time.perf_counter()
+
+        snap_gen = -1
+        snap_path = os.path.join(self.data_dir, SNAPSHOT_FILE)
+        self._loaded_snapshot = None
+        if os.path.exists(snap_path):
+            with open(snap_path, 'r', encoding='utf-8') as f:
+                st = os.fstat(f.fileno())
+                self._loaded_snapshot = (st.st_ino, st.st_mtime_ns)
+                snap = json.load(f)
+            snap_gen = snap['gen']
+            for discord_id, (growid, total_vp, linked_at, last_vp) in snap['accounts'].items():
+                discord_id = int(discord_id)
+                self.accounts[discord_id] = Account(growid, total_vp, linked_at, last_vp or 0.0)
+                self.reverse.add(growid, discord_id)
+
+        events = 0
+        for gen in self._segments():
+            if gen <= snap_gen:
+                continue
+            events += self._replay(os.path.join(self.data_dir, f'{WAL_PREFIX}{gen}'))
+            self._gen = gen
+
+        self._gen = max(self._gen, snap_gen) + 1
+        self._events_since_snapshot = events
+        if not readonly:
+            self._wal = open(self._wal_path(self._gen), 'ab', buffering=0)
+
+        self.loaded = True
+        elapsed = time.perf_counter() - started
+        log.info("📂 Loaded ledger", extra={
+            'data_dir': self.data_dir,
+            'accounts': len(self.accounts),
+            'events': events,
+            'elapsed': round(elapsed, 3)
+        })
+
+    def compacted(self):
+        """True if a newer snapshot replaced the loaded one, WAL segments
+        replayed after it was read may have been deleted before they were"""
+        try:
+            st = os.stat(os.path.join(self.data_dir, SNAPSHOT_FILE))
+        except FileNotFoundError:
+            return self._loaded_snapshot is not None
+        return (st.st_ino, st.st_mtime_ns) != self._loaded_snapshot
+
+    def _segments(self):
+        gens = []
+        for name in os.listdir(self.data_dir):
+            if name.startswith(WAL_PREFIX) and name[len(WAL_PREFIX):].isdigit():
+                gens.append(int(name[len(WAL_PREFIX):]))
+        return sorted(gens)
+
+    def _replay(self, path):
+        accounts = self.accounts
+        reverse = self.reverse
+        last_vp = {}
+        count = 0
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # torn write at the tail
+                parts = line[:-1].split('\t')
+                op = parts[0]
+                discord_id = int(parts[1])
+                if op == 'A':
+                    account = accounts.get(discord_id)
+                    if account is not None:
+                        account.total_vp += int(parts[2])
+                        last_vp[discord_id] = parts[3]
+                elif op == 'S':
+                    account = accounts.get(discord_id)
+                    if account is not None:
+                        account.total_vp -= int(parts[2])
+                elif op == 'L':
+                    accounts[discord_id] = Account(parts[2], 0, float(parts[3]))
+                    reverse.add(parts[2], discord_id)
+                count += 1
+
+        # Parsing once per account keeps replay cost per event small
+        for discord_id, ts in last_vp.items():
+            account = accounts.get(discord_id)
+            if account is not None:
+                account.last_vp_time = float(ts)
+        return count
+
+    # ============= MUTATIONS =============
+    def link(self, discord_id, growid):
+        now = time.time()
+        account = self.accounts[discord_id] = Account(growid, 0, now)
+        self.ops['link'] += 1
+        self.reverse.add(growid, discord_id)
+        self._append(f'L\t{discord_id}\t{growid}\t{now:.3f}\n')
+        return account
+
+    def award(self, discord_id, amount):
+        account = self.accounts.get(discord_id)
+        if account is None:
+            return None
+        now = time.time()
+        account.total_vp += amount
+        account.last_vp_time = now
+        self.ops['award'] += 1
+        self._append(f'A\t{discord_id}\t{amount}\t{now:.3f}\n')
+        return account
+
+    def award_many(self, discord_ids, amount):
+        """Credit several accounts as one batch, returns [(discord_id, account)]"""
+        accounts = self.accounts
+        now = time.time()
+        ts = f'{now:.3f}'
+        awarded = []
+        records = []
+        for discord_id in discord_ids:
+            account = accounts.get(discord_id)
+            if account is None:
+                continue
+            account.total_vp += amount
+            account.last_vp_time = now
+            records.append(f'A\t{discord_id}\t{amount}\t{ts}\n')
+            awarded.append((discord_id, account))
+        if records:
+            self.ops['award'] += len(records)
+            self._append(''.join(records), len(records))
+        return awarded
+
+    def spend(self, discord_id, amount, expected=None):
+        """Compare-and-swap debit, returns (success, balance)
+
+        Fails without touching the balance if it is below `amount` or, when
+        `expected` is given, if it no longer equals `expected`.
+        """
+        account = self.accounts.get(discord_id)
+        if account is None:
+            return False, 0
+        balance = account.total_vp
+        if balance < amount or (expected is not None and balance != expected):
+            self.ops['spend_rejected'] += 1
+            return False, balance
+        account.total_vp = balance - amount
+        self.ops['spend'] += 1
+        self._append(f'S\t{discord_id}\t{amount}\n')
+        return True, balance - amount
+
+    def _append(self, record, count=1):
+        self._buffer.append(record)
+        self._events_since_snapshot += count
+        self._wakeup.set()
+
+    # ============= GROUP COMMIT =============
+    async def sync(self):
+        """Wait until everything appended so far is on disk"""
+        if self._flusher is None or not (self._buffer or self._writing):
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._wakeup.set()
+        await future
+
+    async def start(self):
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flusher is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        await self._flush()
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    async def _flush_loop(self):
+        while not self._closing:
+            await self._wakeup.wait()
+            if not self._closing:
+                # Let concurrent writers pile into the same batch
+                await asyncio.sleep(self.commit_interval)
+            try:
+                await self._flush()
+                if self._events_since_snapshot >= self.snapshot_every and not self._snapshotting:
+                    await self.snapshot()
+            except Exception:
+                log.exception("Ledger flush failed")
+                await asyncio.sleep(FLUSH_RETRY)
+                self._wakeup.set()  # the failed batch is still buffered
+
+    async def _flush(self):
+        async with self._flush_lock:
+            self._wakeup.clear()
+            records = self._buffer
+            waiters = self._waiters
+            data = ''.join(records).encode('utf-8')
+            self._buffer = []
+            self._waiters = []
+            if data:
+                self._writing = True
+                try:
+                    await asyncio.to_thread(self._write, self._wal, data)
+                    self.ops['commit'] += 1
+                except Exception:
+                    # Written first on the next attempt, nothing after it is acknowledged before
+                    self._buffer[:0] = records
+                    self._waiters[:0] = waiters
+                    raise
+                finally:
+                    self._writing = False
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+    @staticmethod
+    def _write(wal, data):
+        """Append and fsync, a failed append is cut off again so it can be retried"""
+        offset = wal.seek(0, os.SEEK_END)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[wal.write(view):]
+            os.fsync(wal.fileno())
+        except OSError:
+            wal.truncate(offset)
+            raise
+
+    # ============= COMPACTION =============
+    async def snapshot(self):
+        """Compact current state into a snapshot and drop old WAL segments"""
+        async with self._snapshot_lock:
+            self._snapshotting = True
+            try:
+                await self._snapshot()
+            finally:
+                self._snapshotting = False
+
+    async def _snapshot(self):
+        async with self._flush_lock:
+            # Unflushed records belong to the old segment; rotating and
+            # copying state without awaiting keeps the cut consistent
+            records = self._buffer
+            waiters = self._waiters
+            tail = ''.join(records).encode('utf-8')
+            self._buffer = []
+            self._waiters = []
+
+            old_gen = self._gen
+            old_wal = self._wal
+            self._gen += 1
+            self._wal = open(self._wal_path(self._gen), 'ab', buffering=0)
+            self._events_since_snapshot = 0
+
+            index, count = self.partition
+            rows = {
+                discord_id: [a.growid, a.total_vp, a.linked_at, a.last_vp_time or None]
+                for discord_id, a in self.accounts.items()
+                if count == 1 or discord_id % count == index
+            }
+
+            # Under the lock, the new segment can't get ahead of the tail
+            try:
+                await asyncio.to_thread(self._close_segment, old_wal, tail)
+            except Exception:
+                # The new segment is still empty, the tail goes there first instead
+                self._buffer[:0] = records
+                self._waiters[:0] = waiters
+                self._wakeup.set()
+                raise
+
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+        await asyncio.to_thread(self._write_snapshot, old_gen, rows)
+        self.ops['snapshot'] += 1
+        log.info("📸 Snapshot", extra={'data_dir': self.data_dir, 'gen': old_gen, 'accounts': len(rows)})
+
+    @classmethod
+    def _close_segment(cls, wal, tail):
+        try:
+            if tail:
+                cls._write(wal, tail)
+        finally:
+            wal.close()
+
+    def _write_snapshot(self, gen, rows):
+        path = os.path.join(self.data_dir, SNAPSHOT_FILE)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'gen': gen, 'accounts': rows}, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+        for old in self._segments():
+            if old <= gen:
+                os.remove(self._wal_path(old))
+
+    def _wal_path(self, gen):
+        return os.path.join(self.data_dir, f'{WAL_PREFIX}{gen}')
+
+
+class PartitionedLedger:
+    """Ledger partitioned by Discord ID, same interface as Ledger
+
+    Each partition commits and snapshots independently, so fsyncs and
+    compaction of different partitions overlap instead of queueing behind
+    one file.  A single partition uses `data_dir` itself, which keeps
+    existing unpartitioned data readable.
+    """
+
+    COUNT_FILE = 'PARTITIONS'
+    LOCK_FILE = 'LOCK'
+
+    def __init__(self, data_dir, partitions=1, **kwargs):
+        self.data_dir = data_dir
+        self.accounts = {}
+        self.reverse = GrowIDIndex()
+        self._lock = None  # open LOCK file holding the writer lock
+
+        if partitions == 1:
+            dirs = [data_dir]
+        else:
+            dirs = [os.path.join(data_dir, f'part-{i}') for i in range(partitions)]
+        self.partitions = [
+            Ledger(d, accounts=self.accounts, reverse=self.reverse,
+                   partition=(i, partitions), **kwargs)
+            for i, d in enumerate(dirs)
+        ]
+
+    @property
+    def ops(self):
+        totals = dict.fromkeys(self.partitions[0].ops, 0)
+        for partition in self.partitions:
+            for op, count in partition.ops.items():
+                totals[op] += count
+        return totals
+
+    @property
+    def loaded(self):
+        return all(p.loaded for p in self.partitions)
+
+    def owner(self, discord_id):
+        return self.partitions[discord_id % len(self.partitions)]
+
+    def load(self, readonly=False):
+        if not readonly:
+            os.makedirs(self.data_dir, exist_ok=True)
+            self._acquire()
+        path = os.path.join(self.data_dir, self.COUNT_FILE)
+        count = len(self.partitions)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                stored = int(f.read().strip())
+            if stored != count:
+                # An account's events must stay in one partition to replay in order
+                raise RuntimeError(f'ledger has {stored} partitions, configured for {count}')
+        elif not readonly:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(str(count))
+
+        if not readonly:
+            for partition in self.partitions:
+                partition.load()
+            return
+
+        # The owner may compact while a large ledger is read, load again if it did
+        for attempt in range(1, READONLY_ATTEMPTS + 1):
+            try:
+                for partition in self.partitions:
+                    partition.load(readonly=True)
+                if not any(p.compacted() for p in self.partitions):
+                    return
+            except FileNotFoundError:
+                pass  # a segment was deleted between listing and opening it
+            log.info("Ledger compacted while loading, loading again", extra={
+                'data_dir': self.data_dir,
+                'attempt': attempt
+            })
+            self.accounts.clear()
+            self.reverse.clear()
+        raise RuntimeError(f'{self.data_dir} kept being compacted while it was read, try again')
+
+    async def start(self):
+        for partition in self.partitions:
+            await partition.start()
+
+    async def close(self):
+        await asyncio.gather(*(p.close() for p in self.partitions))
+        if self._lock is not None:
+            self._lock.close()  # releases the flock
+            self._lock = None
+
+    def _acquire(self):
+        """Exclusive lock on data_dir, two writers would interleave WAL records
+        and the next snapshot of one would erase the other's"""
+        if fcntl is None or self._lock is not None:
+            return
+        lock = open(os.path.join(self.data_dir, self.LOCK_FILE), 'a+', encoding='utf-8')
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.seek(0)
+            holder = lock.read().strip() or 'unknown'
+            lock.close()
+            raise RuntimeError(f'{self.data_dir} is in use by another process (pid {holder})') from None
+        lock.truncate(0)
+        lock.write(str(os.getpid()))
+        lock.flush()
+        self._lock = lock
+
+    async def sync(self, discord_id=None):
+        """Wait for durability of one account's partition, or all of them"""
+        if discord_id is not None:
+            await self.owner(discord_id).sync()
+        else:
+            await asyncio.gather(*(p.sync() for p in self.partitions))
+
+    async def snapshot(self):
+        await asyncio.gather(*(p.snapshot() for p in self.partitions))
+
+    def link(self, discord_id, growid):
+        return self.owner(discord_id).link(discord_id, growid)
+
+    def award(self, discord_id, amount):
+        return self.owner(discord_id).award(discord_id, amount)
+
+    def spend(self, discord_id, amount, expected=None):
+        return self.owner(discord_id).spend(discord_id, amount, expected)
+
+    def award_many(self, discord_ids, amount):
+        count = len(self.partitions)
+        if count == 1:
+            return self.partitions[0].award_many(discord_ids, amount)
+
+        groups = [[] for _ in range(count)]
+        for discord_id in discord_ids:
+            groups[discord_id % count].append(discord_id)
+        awarded = []
+        for partition, ids in zip(self.partitions, groups):
+            if ids:
+                awarded.extend(partition.award_many(ids, amount))
+        return awarded
@@ -0,0 +1,98 @@
+"""Startup gating, command sync skipping and graceful shutdown.
+
+The webhook server binds first, so the platform sees the port right away,
+but requests wait at the gate until state is loaded.  On shutdown the gate
+turns new requests away with 503 while the ones already running finish.
+"""
+import asyncio
+import hashlib
+import json
+import os
+
+from aiohttp import web
+
+
+class Lifecycle:
+    def __init__(self, start_timeout=30):
+        self._ready = asyncio.Event()  # set by mark_ready() once startup has finished
+        self.start_timeout = start_timeout
+        self.draining = False
+        self.inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def mark_ready(self):
+        self._ready.set()
+
+    async def wait_ready(self, timeout):
+        if self.ready:
+            return True
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def middleware(self, ungated=(), untracked=()):
+        """Queue requests until ready, refuse them while draining
+
+        Paths in `ungated` always pass (health checks, metrics).  Paths in
+        `untracked` are gated but long-lived, so draining doesn't wait on them.
+        """
+        @web.middleware
+        async def gate(request, handler):
+            path = request.path
+            if path in ungated:
+                return await handler(request)
+            if self.draining:
+                return web.json_response({'success': False, 'error': 'Shutting down'}, status=503)
+            if not await self.wait_ready(self.start_timeout):
+                return web.json_response({'success': False, 'error': 'Starting up'}, status=503)
+            if path in untracked:
+                return await handler(request)
+
+            self.inflight += 1
+            self._idle.clear()
+            try:
+                return await handler(request)
+            finally:
+                self.inflight -= 1
+                if not self.inflight:
+                    self._idle.set()
+
+        return gate
+
+    async def drain(self, timeout):
+        """Stop taking requests and wait for running ones, False on timeout"""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+# ============= COMMAND SYNC =============
+def commands_digest(payload):
+    """Stable hash of command definitions as sent to Discord"""
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def read_marker(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def write_marker(path, value):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(value)
+    os.replace(tmp, path)
@@ -0,0 +1,117 @@
+"""Non-blocking structured logging.
+
+Records are handed to a queue on the event loop thread without being
+formatted; a background listener thread renders them as one JSON object
+per line and does the (possibly blocking) stdout write.
+
+Loggers are named `vpbot.<category>`.  Levels are set per category and
+high-volume categories can be sampled:
+
+    LOG_LEVEL=INFO
+    LOG_LEVELS=voice=WARNING,webhook=DEBUG
+    LOG_SAMPLE=award=0.01       # keep 1% of INFO-and-below award records
+
+Fields passed through `extra={...}` become top-level JSON keys.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+ROOT = 'vpbot'
+
+# Attributes every LogRecord has; anything else came from `extra`
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+def get_logger(category):
+    return logging.getLogger(f'{ROOT}.{category}')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'cat': record.name[len(ROOT) + 1:] or ROOT,
+            'msg': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps every Nth record at or below INFO, warnings always pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self.seen = 0
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        if not self.every:
+            return False
+        self.seen += 1
+        return self.seen % self.every == 0
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread"""
+
+    def prepare(self, record):
+        return record
+
+
+def parse_spec(spec):
+    """'a=1,b=2' -> {'a': '1', 'b': '2'}"""
+    pairs = {}
+    for part in spec.split(','):
+        if '=' in part:
+            key, value = part.split('=', 1)
+            pairs[key.strip()] = value.strip()
+    return pairs
+
+
+_listener = None
+
+
+def setup_logging(level='INFO', levels='', sample='', stream=None):
+    """Install the queue handler and start the writer thread"""
+    global _listener
+    stop_logging()
+
+    root = logging.getLogger(ROOT)
+    root.handlers.clear()
+    root.setLevel(level.upper())
+    root.propagate = False
+
+    for category, category_level in parse_spec(levels).items():
+        get_logger(category).setLevel(category_level.upper())
+    for category, rate in parse_spec(sample).items():
+        logger = get_logger(category)
+        logger.filters = [f for f in logger.filters if not isinstance(f, SamplingFilter)]
+        logger.addFilter(SamplingFilter(float(rate)))
+
+    records = queue.SimpleQueue()
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    root.addHandler(DeferredQueueHandler(records))
+
+    _listener = logging.handlers.QueueListener(records, writer, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
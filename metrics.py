@@ -0,0 +1,218 @@
+"""Prometheus-style metrics, event loop lag monitor and sampling profiler.
+
+Hot paths only bump plain counters and histogram buckets; anything that
+already keeps its own numbers (ledger, DM queue) is read by a callback at
+scrape time.  `Registry.render()` produces the text exposition format.
+"""
+import asyncio
+import bisect
+import collections
+import sys
+import threading
+import time
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = collections.defaultdict(int)  # label values tuple -> count
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] += amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in self.values.items():
+            yield f'{self.name}{_labels(self.labels, labels)} {value}'
+
+
+class Gauge:
+    """Value read from `fn` at scrape time, a number or {label values: number}
+
+    `kind='counter'` exposes a total kept elsewhere as a counter.
+    """
+
+    def __init__(self, name, help, fn, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = labels
+        self.kind = kind
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} {self.kind}'
+        value = self.fn()
+        if isinstance(value, dict):
+            for labels, v in value.items():
+                labels = labels if isinstance(labels, tuple) else (labels,)
+                yield f'{self.name}{_labels(self.labels, labels)} {v}'
+        else:
+            yield f'{self.name} {value}'
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values tuple -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                names = self.labels + ('le',)
+                yield f'{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {series[-1]}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {cumulative}'
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, fn, labels=(), kind='gauge'):
+        return self.register(Gauge(name, help, fn, labels, kind))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f'# {metric.name} failed: {e}')
+        lines.append('')
+        return '\n'.join(lines)
+
+
+# ============= EVENT LOOP LAG =============
+class LoopLagMonitor:
+    """Measures how late the loop wakes a task that sleeps `interval`"""
+
+    def __init__(self, histogram, interval=0.5):
+        self.histogram = histogram
+        self.interval = interval
+        self.last = 0.0
+        self.max = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.last = lag
+            self.max = max(self.max, lag)
+            self.histogram.observe(lag)
+
+
+# ============= SAMPLING PROFILER =============
+class SamplingProfiler:
+    """Samples the stack of one thread from a background thread
+
+    Switched on and off at runtime; results are folded stacks
+    (`frame;frame;frame count`) ready for flamegraph tools.
+    """
+
+    def __init__(self, thread_id, interval=0.005, max_depth=48):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return False
+        self.samples.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def folded(self, limit=200):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.samples.most_common(limit))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
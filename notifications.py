@@ -0,0 +1,126 @@
+"""Asynchronous DM notification queue.
+
+Reward code calls `notify()` which never awaits: the notification is put on
+a bounded queue and delivered by a small worker pool.  While a user already
+has a notification of the same kind waiting, new ones are merged into it, so
+a slow DM route turns several "VP Earned" messages into a single digest.
+
+Delivery respects Discord's rate limits with one token bucket per DM route
+(per user) plus a global bucket shared by all workers.
+"""
+import asyncio
+
+from logs import get_logger
+from ratelimit import TokenBucket
+
+# Discord allows roughly 5 messages / 5s per channel and 50 requests/s globally
+ROUTE_RATE = (5, 5.0)
+GLOBAL_RATE = (50, 1.0)
+MAX_RETRIES = 3
+
+log = get_logger('dm')
+
+
+def keep_latest(old, new):
+    return new
+
+
+class NotificationQueue:
+    def __init__(self, send, maxsize=10_000, workers=4, merge=None):
+        self._send = send  # async send(user_id, kind, payload)
+        self._merge = merge or {}  # kind -> merge(old_payload, new_payload)
+        self._queue = asyncio.Queue(maxsize)
+        self._pending = {}  # (user_id, kind) -> payload waiting for delivery
+        self._routes = {}  # user_id -> TokenBucket
+        self._global = TokenBucket(*GLOBAL_RATE)
+        self._num_workers = workers
+        self._workers = []
+
+        self.metrics = {
+            'enqueued': 0,
+            'coalesced': 0,
+            'dropped': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0
+        }
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return dict(self.metrics, depth=self.depth, pending=len(self._pending))
+
+    def notify(self, user_id, kind, payload):
+        """Queue a notification, returns False if it had to be dropped"""
+        key = (user_id, kind)
+        if key in self._pending:
+            merge = self._merge.get(kind, keep_latest)
+            self._pending[key] = merge(self._pending[key], payload)
+            self.metrics['coalesced'] += 1
+            return True
+
+        try:
+            self._queue.put_nowait(key)
+        except asyncio.QueueFull:
+            self.metrics['dropped'] += 1
+            return False
+
+        self._pending[key] = payload
+        self.metrics['enqueued'] += 1
+        return True
+
+    # ============= WORKERS =============
+    def start(self):
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._num_workers)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            try:
+                await self._deliver(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics['failed'] += 1
+                log.warning("⚠️ Could not DM", extra={'user_id': key[0], 'kind': key[1], 'error': str(e)})
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, key):
+        user_id, kind = key
+        route = self._route(user_id)
+        await route.acquire()
+        await self._global.acquire()
+
+        # Anything merged in while waiting for the buckets goes out too
+        payload = self._pending.pop(key)
+
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                await self._send(user_id, kind, payload)
+                self.metrics['sent'] += 1
+                return
+            except Exception as e:
+                if getattr(e, 'status', None) != 429 or attempt == MAX_RETRIES:
+                    raise
+                self.metrics['retried'] += 1
+                await asyncio.sleep(getattr(e, 'retry_after', None) or route.delay() or 1.0)
+
+    def _route(self, user_id):
+        bucket = self._routes.get(user_id)
+        if bucket is None:
+            if len(self._routes) > 10_000:
+                # Idle buckets are full again and carry no state worth keeping
+                self._routes = {uid: b for uid, b in self._routes.items() if not b.full}
+            bucket = self._routes[user_id] = TokenBucket(*ROUTE_RATE)
+        return bucket
@@ -0,0 +1,137 @@
+"""Persistent binary channel for game-to-bot requests.
+
+The game server keeps one WebSocket open on /webhook/ws and pipelines
+requests over it instead of paying for an HTTP request and JSON body per
+call.  Every frame holds one message:
+
+    request:  [request_id, op, args]
+    response: [request_id, status, result]
+
+`args` and `result` carry the same fields as the JSON routes.  Requests on a
+connection are handled concurrently, so responses may arrive out of order
+and are matched by `request_id`.
+
+The encoding follows the negotiated WebSocket subprotocol: `vpbot.msgpack`
+(preferred, needs msgpack) or `vpbot.json`.
+"""
+import asyncio
+import math
+import time
+
+from aiohttp import WSMsgType
+
+import runtime
+from logs import get_logger
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+log = get_logger('webhook')
+
+OP_LINK = 1
+OP_VP_CHECK = 2
+OP_VP_SPEND = 3
+OP_GEMS_CHECK = 4
+OP_VP_CHECK_BATCH = 5
+OP_GEMS_CHECK_BATCH = 6
+
+CODECS = {}
+if msgpack is not None:
+    CODECS['vpbot.msgpack'] = (
+        lambda obj: msgpack.packb(obj, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False)
+    )
+CODECS['vpbot.json'] = (runtime.dumps, runtime.loads)
+PROTOCOLS = tuple(CODECS)
+
+
+def codec_for(protocol):
+    """(encode, decode) for a negotiated subprotocol, preferred one by default"""
+    return CODECS.get(protocol) or CODECS[PROTOCOLS[0]]
+
+
+async def serve(ws, handlers, async_handlers, observe=None, admit=None, max_inflight=64):
+    """Answer requests on an open WebSocket until it closes
+
+    `handlers` map ops to plain functions and are answered inline;
+    `async_handlers` map ops to coroutines and run as tasks so slow requests
+    don't hold up the rest of the pipeline.  Both return (result, status).
+    `observe(seconds, op)` is called with each request's handling time.
+
+    `admit(op, args)` returns the seconds a request must wait, 0 to let it
+    through, and at most `max_inflight` async requests run per connection;
+    anything else is answered with 429 right away.
+    """
+    encode, decode = codec_for(ws.ws_protocol)
+    running = set()
+
+    async def reply(request_id, status, result):
+        if not ws.closed:
+            await ws.send_bytes(encode([request_id, status, result]))
+
+    async def run(request_id, op, handler, args):
+        started = time.perf_counter()
+        try:
+            result, status = await handler(args)
+        except Exception:
+            log.exception("Socket request failed", extra={'op': op})
+            result, status = {'success': False, 'error': 'Internal error'}, 500
+        if observe is not None:
+            observe(time.perf_counter() - started, op)
+        try:
+            await reply(request_id, status, result)
+        except ConnectionError:
+            pass
+
+    async for msg in ws:
+        if msg.type not in (WSMsgType.BINARY, WSMsgType.TEXT):
+            continue
+
+        try:
+            request_id, op, args = decode(msg.data)
+            if not isinstance(args, dict):
+                raise ValueError
+        except Exception:
+            await reply(0, 400, {'success': False, 'error': 'Bad frame'})
+            continue
+
+        if admit is not None:
+            wait = admit(op, args)
+            if wait:
+                await reply(request_id, 429, {
+                    'success': False,
+                    'error': 'Rate limited',
+                    'retry_after': max(1, math.ceil(wait))
+                })
+                continue
+
+        handler = handlers.get(op)
+        if handler is not None:
+            started = time.perf_counter()
+            try:
+                result, status = handler(args)
+            except Exception:
+                log.exception("Socket request failed", extra={'op': op})
+                result, status = {'success': False, 'error': 'Internal error'}, 500
+            if observe is not None:
+                observe(time.perf_counter() - started, op)
+            await reply(request_id, status, result)
+            continue
+
+        handler = async_handlers.get(op)
+        if handler is None:
+            await reply(request_id, 404, {'success': False, 'error': 'Unknown op'})
+            continue
+        if len(running) >= max_inflight:
+            await reply(request_id, 429, {'success': False, 'error': 'Server busy', 'retry_after': 1})
+            continue
+
+        task = asyncio.create_task(run(request_id, op, handler, args))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    # Let in-flight spends finish before the handler returns
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
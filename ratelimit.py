@@ -0,0 +1,72 @@
+"""Token bucket rate limiting."""
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """`rate` tokens per `per` seconds, bursting up to `rate`"""
+
+    __slots__ = ('capacity', 'fill_rate', 'tokens', 'updated')
+
+    def __init__(self, rate, per):
+        self.capacity = float(rate)
+        self.fill_rate = rate / per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    def try_acquire(self, now=None):
+        """Take a token if one is available"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def delay(self, now=None):
+        """Seconds until a token is available"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.fill_rate
+
+    @property
+    def full(self):
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        while not self.try_acquire():
+            await asyncio.sleep(self.delay())
+
+
+class BucketTable:
+    """One TokenBucket per key, least recently used keys dropped past `maxsize`"""
+
+    def __init__(self, rate, per, maxsize=100_000):
+        self.rate = rate
+        self.per = per
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key, now=None):
+        """Take a token for `key`, returns 0 or the seconds until one is available"""
+        now = time.monotonic() if now is None else now
+        buckets = self._buckets
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(self.rate, self.per)
+            if len(buckets) > self.maxsize:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(key)
+        if bucket.try_acquire(now):
+            return 0.0
+        return bucket.delay(now)
@@ -2,4 +2,4 @@
 # Render start script
 
 echo "Starting Discord bot..."
-python discord_bot.py
+exec python discord_bot.py  # so SIGTERM reaches the bot
@@ -0,0 +1,232 @@
+"""Reward rules: which voice channels pay VP or boost gems, and how much.
+
+Rules are loaded from a JSON file and compiled into lookup tables, so a
+voice event or an award costs a few dict lookups however many rules exist:
+
+- channel id -> ChannelRule(vp per interval, gems multiplier)
+- role id -> (vp, gems) multipliers
+- minute of the week -> combined (vp, gems) multipliers of the events
+  running then
+
+    {
+      "interval": 180,
+      "stack": "multiply",
+      "timezone": "UTC",
+      "channels": [
+        {"id": 1470057279511466045, "vp": 10},
+        {"id": 1470057299631411444, "gems": 1.05}
+      ],
+      "roles": [{"id": 1470000000000000000, "vp": 1.5, "gems": 1.1}],
+      "events": [
+        {"name": "Weekend rush", "days": [5, 6], "start": "18:00", "end": "23:00", "vp": 2}
+      ]
+    }
+
+A channel's `vp` is paid every `interval` seconds and its `gems` is the
+boost multiplier while in it.  Role and event multipliers stack on the
+channel's rule: all of them multiplied together with "stack": "multiply",
+or only the largest with "max".  Days run from 0 (Monday) to 6 and default
+to every day; an event whose end is before its start runs past midnight.
+"""
+import json
+import math
+from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+MINUTES_PER_WEEK = 7 * 24 * 60
+NO_BOOST = (1.0, 1.0)  # (vp, gems) multipliers
+STACKING = {
+    'multiply': math.prod,
+    'max': lambda values: max(values, default=1.0)
+}
+
+
+class RulesError(ValueError):
+    """Invalid rules, the message says where"""
+
+
+class ChannelRule:
+    __slots__ = ('channel_id', 'vp', 'gems')
+
+    def __init__(self, channel_id, vp=0, gems=1.0):
+        self.channel_id = channel_id
+        self.vp = vp  # VP per interval, 0 = no VP here
+        self.gems = gems  # gems multiplier, 1.0 = no boost here
+
+
+class RuleSet:
+    def __init__(self, interval, channels, roles=(), events=(), stack='multiply', timezone='UTC'):
+        if not isinstance(interval, int) or isinstance(interval, bool) or interval <= 0:
+            raise RulesError('interval must be a positive number of seconds')
+        if stack not in STACKING:
+            raise RulesError(f"stack must be one of {', '.join(STACKING)}")
+        try:
+            self.timezone = ZoneInfo(timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise RulesError(f'unknown timezone {timezone!r}') from None
+
+        self.interval = interval
+        self._stack = STACKING[stack]
+
+        self.channels = {}  # channel id -> ChannelRule, duplicate ids are merged
+        for i, spec in enumerate(channels):
+            channel_id = snowflake(spec, f'channels[{i}]')
+            rule = self.channels.setdefault(channel_id, ChannelRule(channel_id))
+            if 'vp' in spec:
+                rule.vp = amount(spec['vp'], f'channels[{i}].vp')
+            if 'gems' in spec:
+                rule.gems = multiplier(spec['gems'], f'channels[{i}].gems')
+        self.vp_channels = [c for c, rule in self.channels.items() if rule.vp]
+        self.gems_channels = [c for c, rule in self.channels.items() if rule.gems != 1.0]
+
+        self.roles = {}  # role id -> (vp, gems)
+        for i, spec in enumerate(roles):
+            self.roles[snowflake(spec, f'roles[{i}]')] = (
+                multiplier(spec.get('vp', 1.0), f'roles[{i}].vp'),
+                multiplier(spec.get('gems', 1.0), f'roles[{i}].gems')
+            )
+
+        self.events = list(events)
+        self._week = self._compile_week([compile_event(spec, f'events[{i}]') for i, spec in enumerate(events)])
+        self._minute = None  # minute the cached event boost is for
+        self._event = (*NO_BOOST, ())
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            raise RulesError('rules must be a JSON object')
+        for key in ('channels', 'roles', 'events'):
+            if not isinstance(data.get(key, []), list):
+                raise RulesError(f'{key} must be a list')
+            if not all(isinstance(spec, dict) for spec in data.get(key, [])):
+                raise RulesError(f'{key} entries must be objects')
+        return cls(
+            data.get('interval', 180),
+            data.get('channels', []),
+            data.get('roles', []),
+            data.get('events', []),
+            data.get('stack', 'multiply'),
+            data.get('timezone', 'UTC')
+        )
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                return cls.from_dict(json.load(f))
+            except ValueError as e:
+                raise RulesError(f'{path}: {e}') from None
+
+    def _compile_week(self, events):
+        """Combined multipliers for every minute of the week, shared tuples"""
+        week = [(*NO_BOOST, ())] * MINUTES_PER_WEEK
+        combined = {}  # indexes of the running events -> entry
+        for minute in range(MINUTES_PER_WEEK if events else 0):
+            running = tuple(i for i, event in enumerate(events) if event[3][minute])
+            if running:
+                entry = combined.get(running)
+                if entry is None:
+                    entry = combined[running] = (
+                        self._stack([events[i][1] for i in running]),
+                        self._stack([events[i][2] for i in running]),
+                        tuple(events[i][0] for i in running)
+                    )
+                week[minute] = entry
+        return week
+
+    # ============= LOOKUPS =============
+    def role_boost(self, role_ids):
+        """(vp, gems) multipliers for a member's roles"""
+        roles = self.roles
+        if not roles:
+            return NO_BOOST
+        boosts = [roles[role_id] for role_id in role_ids if role_id in roles]
+        if not boosts:
+            return NO_BOOST
+        return (self._stack([vp for vp, _ in boosts]), self._stack([gems for _, gems in boosts]))
+
+    def event_boost(self, now):
+        """(vp, gems, event names) running at unix time `now`, cached per minute"""
+        minute = int(now // 60)
+        if minute != self._minute:
+            local = datetime.fromtimestamp(minute * 60, self.timezone)
+            self._event = self._week[local.weekday() * 1440 + local.hour * 60 + local.minute]
+            self._minute = minute
+        return self._event
+
+    def vp_per_interval(self, channel_id, role_boost, event):
+        """Whole VP paid per interval, 0 if the channel doesn't pay VP"""
+        rule = self.channels.get(channel_id)
+        if rule is None or not rule.vp:
+            return 0
+        return round(rule.vp * self._stack((role_boost[0], event[0])))
+
+    def gems_base(self, channel_id, role_boost):
+        """Channel and role gems multiplier, 1.0 if the channel doesn't boost"""
+        rule = self.channels.get(channel_id)
+        if rule is None or rule.gems == 1.0:
+            return 1.0
+        return round(self._stack((rule.gems, role_boost[1])), 4)
+
+    def gems_now(self, base, event):
+        """`gems_base()` with the running events stacked on"""
+        if event[1] == 1.0:
+            return base
+        return round(self._stack((base, event[1])), 4)
+
+
+# ============= VALIDATION =============
+def snowflake(spec, where):
+    value = spec.get('id')
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+        raise RulesError(f'{where}.id must be a Discord id')
+    return value
+
+
+def amount(value, where):
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise RulesError(f'{where} must be a whole number of VP')
+    return value
+
+
+def multiplier(value, where):
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0 < value <= 100:
+        raise RulesError(f'{where} must be a multiplier between 0 and 100')
+    return float(value)
+
+
+def parse_time(value, where):
+    """'HH:MM' -> minutes after midnight"""
+    try:
+        hours, minutes = value.split(':')
+        hours, minutes = int(hours), int(minutes)
+    except (AttributeError, ValueError):
+        raise RulesError(f'{where} must be HH:MM') from None
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 1440:
+        raise RulesError(f'{where} must be HH:MM')
+    return hours * 60 + minutes
+
+
+def compile_event(spec, where):
+    """(name, vp, gems, minute mask of the week)"""
+    name = str(spec.get('name') or where)
+    days = spec.get('days', list(range(7)))
+    if not isinstance(days, list) or not all(isinstance(d, int) and 0 <= d <= 6 for d in days):
+        raise RulesError(f'{where}.days must be a list of 0 (Monday) to 6')
+    start = parse_time(spec.get('start', '00:00'), f'{where}.start')
+    end = parse_time(spec.get('end', '24:00'), f'{where}.end')
+    if end <= start:
+        end += 1440  # runs past midnight
+
+    mask = bytearray(MINUTES_PER_WEEK)
+    for day in set(days):
+        for minute in range(day * 1440 + start, day * 1440 + end):
+            mask[minute % MINUTES_PER_WEEK] = 1
+    return (
+        name,
+        multiplier(spec.get('vp', 1.0), f'{where}.vp'),
+        multiplier(spec.get('gems', 1.0), f'{where}.gems'),
+        mask
+    )
@@ -0,0 +1,54 @@
+"""Event loop and JSON codec for the process.
+
+With RUNTIME=auto (the default) the bot runs on uvloop and encodes and
+decodes webhook JSON with orjson when they are installed, and falls back to
+asyncio and the json module when they aren't.  RUNTIME=stdlib always uses
+the standard library, for comparison or if an optional package misbehaves.
+
+orjson differs from json in ways webhook payloads never hit: it rejects
+integers past 64 bits and writes NaN as null.
+"""
+import asyncio
+import json
+import os
+
+from aiohttp import web
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+MODE = os.getenv('RUNTIME', 'auto')
+if MODE not in ('auto', 'stdlib'):
+    raise ValueError(f'RUNTIME must be auto or stdlib, not {MODE!r}')
+
+if orjson is not None and MODE == 'auto':
+    dumps = orjson.dumps  # -> bytes
+    loads = orjson.loads
+    JSON = 'orjson'
+else:
+    def dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+    loads = json.loads
+    JSON = 'json'
+
+LOOP = 'uvloop' if uvloop is not None and MODE == 'auto' else 'asyncio'
+
+
+def json_response(data, status=200, headers=None):
+    """web.json_response() with the runtime's encoder"""
+    return web.Response(body=dumps(data), status=status, headers=headers, content_type='application/json')
+
+
+def run(main):
+    """asyncio.run() on the runtime's event loop"""
+    if LOOP == 'uvloop':
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+            return runner.run(main)
+    return asyncio.run(main)
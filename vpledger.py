@@ -0,0 +1,339 @@
+"""VP ledger maintenance: bulk import, export and reconciliation.
+
+    python vpledger.py import balances.csv [--mode set|add] [--rejects rejects.ndjson]
+    python vpledger.py export accounts.ndjson
+    python vpledger.py reconcile game_export.csv [--out diff.ndjson]
+
+Input files are CSV with a header row or NDJSON, optionally gzipped, one
+record per line, with the fields `growid`, `discord_id` and `total_vp`
+(`vp` is accepted too).  Files are read in chunks that a process pool
+parses, validates and normalizes; at most two chunks per worker are in
+flight, so memory stays flat however large the dump is.
+
+`import` writes through the ledger's WAL and compacts it into a snapshot
+when done.  Stop the bot first, the ledger has a single writer; a lock on
+the data directory makes `import` fail while the bot runs.  `export` and
+`reconcile` only read the ledger and can run next to the bot; if the bot
+compacts while they load it, they load it again.
+
+Uses DATA_DIR and LEDGER_PARTITIONS like the bot does.
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ledger import PartitionedLedger
+from logs import setup_logging, stop_logging
+
+DATA_DIR = os.getenv('DATA_DIR', 'data')
+LEDGER_PARTITIONS = int(os.getenv('LEDGER_PARTITIONS', '1'))
+
+GROWID_RE = re.compile(r'[A-Za-z0-9]{1,32}')
+CHUNK_LINES = 50_000
+SYNC_EVERY = 200_000  # rows imported between WAL syncs, bounds the write buffer
+
+
+# ============= PARSING (runs in worker processes) =============
+def parse_int(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return int(value) if value.strip() else None
+    if isinstance(value, bool):
+        raise ValueError('not an integer')
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    raise ValueError('not an integer')
+
+
+def normalize(record):
+    """(discord_id, growid, total_vp) from a raw record, raises ValueError"""
+    growid = str(record.get('growid') or '').strip()
+    if not GROWID_RE.fullmatch(growid):
+        raise ValueError('invalid growid')
+    discord_id = parse_int(record.get('discord_id'))
+    if discord_id is not None and discord_id <= 0:
+        raise ValueError('invalid discord_id')
+    total_vp = parse_int(record.get('total_vp', record.get('vp')))
+    if total_vp is not None and total_vp < 0:
+        raise ValueError('negative total_vp')
+    return discord_id, growid, total_vp
+
+
+def parse_chunk(fmt, header, first_line, lines):
+    """Returns (rows, rejects), rejects are (line number, reason, raw line)"""
+    rows = []
+    rejects = []
+    reader = csv.reader(lines) if fmt == 'csv' else None  # one record per line, stays in step
+    for number, line in enumerate(lines, first_line):
+        try:
+            if reader is not None:
+                fields = next(reader)
+                if not fields:
+                    continue
+                record = dict(zip(header, fields))
+            else:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('not an object')
+            rows.append(normalize(record))
+        except (ValueError, csv.Error) as e:
+            rejects.append((number, str(e) or 'unparsable', line.rstrip('\n')))
+    return rows, rejects
+
+
+# ============= STREAMING =============
+def open_text(path, mode='r'):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer if 'r' in mode else sys.stdout.buffer,
+                                encoding='utf-8', newline='')
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def detect_format(path, fmt):
+    if fmt:
+        return fmt
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'csv' if name.endswith('.csv') else 'ndjson'
+
+
+def read_chunks(path, fmt, chunk_lines):
+    """(fmt, header, first line number, lines) per chunk"""
+    with open_text(path) as f:
+        header = None
+        first_line = 1
+        if fmt == 'csv':
+            header = [name.strip() for name in next(csv.reader([f.readline()]))]
+            first_line = 2
+        while True:
+            lines = list(itertools.islice(f, chunk_lines))
+            if not lines:
+                return
+            yield fmt, header, first_line, lines
+            first_line += len(lines)
+
+
+def parsed(path, fmt, workers, chunk_lines):
+    """Parse results in file order, with a bounded number of chunks in flight"""
+    chunks = read_chunks(path, detect_format(path, fmt), chunk_lines)
+    if workers <= 0:
+        for chunk in chunks:
+            yield parse_chunk(*chunk)
+        return
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(parse_chunk, *chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class RejectLog:
+    def __init__(self, path):
+        self.count = 0
+        self._file = open_text(path, 'w') if path else None
+
+    def write(self, kind, **fields):
+        self.count += 1
+        if self._file is not None:
+            self._file.write(json.dumps({'kind': kind, **fields}) + '\n')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+# ============= COMMANDS =============
+async def run_import(args):
+    # One snapshot at the end instead of one per 100k events
+    ledger = PartitionedLedger(args.data_dir, args.partitions, snapshot_every=float('inf'))
+    ledger.load()
+    await ledger.start()
+    accounts = ledger.accounts
+    reverse = ledger.reverse
+    rejects = RejectLog(args.rejects)
+    counts = dict.fromkeys(('linked', 'updated', 'unchanged'), 0)
+    since_sync = 0
+
+    for rows, bad in parsed(args.file, args.format, args.workers, args.chunk):
+        for number, reason, line in bad:
+            rejects.write('invalid', line=number, reason=reason, raw=line)
+
+        for discord_id, growid, total_vp in rows:
+            growid_lower = growid.lower()
+            owner = reverse.get(growid_lower)
+            if discord_id is None:
+                discord_id = owner
+                if discord_id is None:
+                    rejects.write('unknown_growid', growid=growid)
+                    continue
+
+            account = accounts.get(discord_id)
+            if account is None:
+                if owner is not None:
+                    rejects.write('growid_taken', growid=growid, discord_id=discord_id, linked_to=owner)
+                    continue
+                account = ledger.link(discord_id, growid)
+                counts['linked'] += 1
+                linked = True
+            elif account.growid.lower() != growid_lower:
+                rejects.write('discord_id_taken', growid=growid, discord_id=discord_id,
+                              linked_to=account.growid)
+                continue
+            else:
+                linked = False
+
+            delta = 0
+            if total_vp is not None:
+                delta = total_vp if args.mode == 'add' else total_vp - account.total_vp
+            if delta > 0:
+                ledger.award(discord_id, delta)
+            elif delta < 0:
+                ledger.spend(discord_id, -delta)
+            if not linked:
+                counts['updated' if delta else 'unchanged'] += 1
+
+        since_sync += len(rows)
+        if since_sync >= SYNC_EVERY:
+            await ledger.sync()
+            since_sync = 0
+
+    await ledger.sync()
+    await ledger.snapshot()
+    await ledger.close()
+    rejects.close()
+    return {**counts, 'rejected': rejects.count, 'accounts': len(accounts)}
+
+
+async def run_export(args):
+    ledger = PartitionedLedger(args.data_dir, args.partitions)
+    ledger.load(readonly=True)
+    fmt = detect_format(args.file, args.format)
+    fields = ('discord_id', 'growid', 'total_vp', 'linked_at', 'last_vp_time')
+
+    with open_text(args.file, 'w') as f:
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            for discord_id, a in ledger.accounts.items():
+                writer.writerow((discord_id, a.growid, a.total_vp, a.linked_at, a.last_vp_time))
+        else:
+            for discord_id, a in ledger.accounts.items():
+                f.write(json.dumps(dict(zip(fields, (discord_id, a.growid, a.total_vp,
+                                                     a.linked_at, a.last_vp_time)))) + '\n')
+    return {'accounts': len(ledger.accounts)}
+
+
+async def run_reconcile(args):
+    """Diff the bot's links and balances against a game-side export"""
+    ledger = PartitionedLedger(args.data_dir, args.partitions)
+    ledger.load(readonly=True)
+    accounts = ledger.accounts
+    reverse = ledger.reverse
+    diff = RejectLog(args.out or '-')
+    seen = set()  # discord_ids matched by the export
+    counts = dict.fromkeys(('rows', 'matched', 'not_linked', 'discord_mismatch', 'vp_mismatch',
+                            'invalid', 'missing_in_game'), 0)
+
+    for rows, bad in parsed(args.file, args.format, args.workers, args.chunk):
+        for number, reason, line in bad:
+            counts['invalid'] += 1
+            diff.write('invalid', line=number, reason=reason, raw=line)
+
+        for discord_id, growid, total_vp in rows:
+            counts['rows'] += 1
+            owner = reverse.get(growid.lower())
+            if owner is None:
+                if discord_id is not None:
+                    counts['not_linked'] += 1
+                    diff.write('not_linked', growid=growid, game_discord_id=discord_id)
+                continue
+            seen.add(owner)
+
+            if discord_id is not None and discord_id != owner:
+                counts['discord_mismatch'] += 1
+                diff.write('discord_mismatch', growid=growid, bot_discord_id=owner,
+                           game_discord_id=discord_id)
+                continue
+            bot_vp = accounts[owner].total_vp
+            if total_vp is not None and total_vp != bot_vp:
+                counts['vp_mismatch'] += 1
+                diff.write('vp_mismatch', growid=growid, discord_id=owner,
+                           bot_vp=bot_vp, game_vp=total_vp, delta=bot_vp - total_vp)
+                continue
+            counts['matched'] += 1
+
+    for discord_id, account in accounts.items():
+        if discord_id not in seen:
+            counts['missing_in_game'] += 1
+            diff.write('missing_in_game', growid=account.growid, discord_id=discord_id,
+                       bot_vp=account.total_vp)
+    diff.close()
+    return counts
+
+
+COMMANDS = {
+    'import': run_import,
+    'export': run_export,
+    'reconcile': run_reconcile
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='VP ledger import, export and reconciliation')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--partitions', type=int, default=LEDGER_PARTITIONS)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='parser processes, 0 parses inline')
+    parser.add_argument('--chunk', type=int, default=CHUNK_LINES, help='lines per chunk')
+    parser.add_argument('--format', choices=('csv', 'ndjson'),
+                        help='default: from the file extension')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('import', help='load balances into the ledger (bot stopped)')
+    p.add_argument('file', help="CSV or NDJSON, '-' for stdin")
+    p.add_argument('--mode', choices=('set', 'add'), default='set',
+                   help='set balances to total_vp, or add total_vp to them')
+    p.add_argument('--rejects', help='write rejected rows here as NDJSON')
+
+    p = commands.add_parser('export', help='dump every linked account')
+    p.add_argument('file', help="CSV or NDJSON, '-' for stdout")
+
+    p = commands.add_parser('reconcile', help='diff the ledger against a game export')
+    p.add_argument('file', help="CSV or NDJSON, '-' for stdin")
+    p.add_argument('--out', help='diff as NDJSON, default stdout')
+
+    args = parser.parse_args(argv)
+    setup_logging('INFO', stream=sys.stderr)
+    started = time.perf_counter()
+    try:
+        summary = asyncio.run(COMMANDS[args.command](args))
+    except RuntimeError as e:
+        parser.exit(1, f'vpledger: {e}\n')  # e.g. the bot holds the ledger lock
+    finally:
+        stop_logging()
+    summary['elapsed'] = round(time.perf_counter() - started, 2)
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()